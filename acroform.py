@@ -0,0 +1,202 @@
+"""
+AcroForm engine for the CCEW PDF generator
+
+Fills the template's native form fields instead of drawing text at measured
+coordinates. Field names follow the layout registry
+(field_coordinates.iter_layout_fields), e.g. 'install_suburb', 'tests.polarity',
+'installation_type.residential', 'meters.1.tariff'. ACROFORM_FIELD_NAMES maps
+any of those onto differently named fields in a template.
+
+Note: the shipped CCEWfillableform(unlocked).pdf carries no AcroForm fields, so
+generate_ccew_pdf falls back to the overlay engine for it. build_fillable_template
+creates a fielded copy of a template from the layout table.
+
+Note: widgets and the /AcroForm dictionary go through PdfWriter._add_object
+and PdfWriter._root_object, private pypdf APIs that are stable in the
+pypdf==4.0.1 pinned in requirements.txt; recheck them before upgrading pypdf.
+"""
+
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import (
+    ArrayObject, BooleanObject, DictionaryObject, FloatObject, NameObject,
+    NumberObject, TextStringObject,
+)
+
+from field_coordinates import PAGE_COUNT, iter_layout_fields, iter_page_ops
+from overlay_stream import overlay_fragments
+
+# Layout field name -> template field name, for templates that use their own names
+ACROFORM_FIELD_NAMES = {}
+
+CHECKBOX_ON = '/Yes'
+
+# Widget geometry used both to build fields and to place flattened values
+FIELD_PADDING = 2
+FIELD_HEIGHT = 13
+TEXT_FIELD_WIDTH = 110
+CHECKBOX_WIDTH = 10
+DESCENT = 0.22
+
+
+def field_values(form_data):
+    """Return {template field name: DrawOp} for every filled field on every page"""
+    names = ACROFORM_FIELD_NAMES
+    return {
+        names.get(op.field, op.field): op
+        for page_num in range(PAGE_COUNT)
+        for op in iter_page_ops(form_data, page_num)
+    }
+
+
+def _qualified_name(annot):
+    parts = []
+    while annot is not None:
+        if '/T' in annot:
+            parts.append(annot['/T'])
+        parent = annot.get('/Parent')
+        annot = parent.get_object() if parent is not None else None
+    return '.'.join(reversed(parts))
+
+
+def _inherited(annot, key):
+    while annot is not None:
+        if key in annot:
+            return annot[key]
+        parent = annot.get('/Parent')
+        annot = parent.get_object() if parent is not None else None
+    return None
+
+
+def _on_state(annot):
+    """Name of a checkbox widget's 'on' appearance state"""
+    appearances = annot.get('/AP')
+    if appearances is not None:
+        for state in appearances.get_object().get('/N', {}):
+            if state != '/Off':
+                return state
+    return CHECKBOX_ON
+
+
+def _baseline(rect, size):
+    """Text origin that vertically centres a size-pt string in a widget rect"""
+    x1, y1 = min(rect[0], rect[2]), min(rect[1], rect[3])
+    height = abs(rect[3] - rect[1])
+    return x1 + FIELD_PADDING, y1 + (height - size) / 2 + DESCENT * size
+
+
+def fill_page(page, writer, values, flatten=False):
+    """
+    Fill every widget on a writer-owned page in a single pass over its annotations
+
+    With flatten=True the values are painted into the page content at each
+    widget's position and the widgets are removed (non-widget annotations are
+    kept). Returns the number of fields filled.
+    """
+    if '/Annots' not in page:
+        return 0
+    kept = ArrayObject()
+    content = []
+    filled = 0
+    for ref in page['/Annots']:
+        annot = ref.get_object()
+        if annot.get('/Subtype') != '/Widget':
+            kept.append(ref)
+            continue
+        op = values.get(_qualified_name(annot))
+        if op is not None:
+            filled += 1
+            if flatten:
+                if op.box:
+                    content.append(overlay_fragments.box(op.box))
+                x, y = _baseline([float(v) for v in annot['/Rect']], op.font[1])
+                content.append(overlay_fragments.text(x, y, op.text, op.font))
+            else:
+                field = annot if '/T' in annot else annot['/Parent'].get_object()
+                if _inherited(annot, '/FT') == '/Btn':
+                    state = NameObject(_on_state(annot))
+                    field[NameObject('/V')] = state
+                    annot[NameObject('/AS')] = state
+                else:
+                    field[NameObject('/V')] = TextStringObject(op.text)
+        if not flatten:
+            kept.append(ref)
+
+    if kept:
+        page[NameObject('/Annots')] = kept
+    else:
+        del page['/Annots']
+    if content:
+        overlay_fragments.append(page, writer, overlay_fragments.prologue + b''.join(content))
+    return filled
+
+
+def fill_acroform(writer, pages, form_data, flatten=False):
+    """Fill all pages of a writer holding a fielded template; returns fields filled"""
+    values = field_values(form_data)
+    filled = sum(fill_page(page, writer, values, flatten) for page in pages)
+    acroform = writer._root_object.get('/AcroForm')
+    if flatten:
+        if acroform is not None:
+            del writer._root_object['/AcroForm']
+    elif acroform is not None:
+        # Let viewers regenerate appearances for the new values
+        acroform.get_object()[NameObject('/NeedAppearances')] = BooleanObject(True)
+    return filled
+
+
+def add_layout_fields(writer, pages):
+    """Add a widget for every slot in the layout table to writer-owned pages"""
+    fields = ArrayObject()
+    for page_num, slot in iter_layout_fields():
+        if page_num >= len(pages):
+            continue
+        size = slot.font[1]
+        width = CHECKBOX_WIDTH if slot.checkbox else TEXT_FIELD_WIDTH
+        x1 = slot.x - FIELD_PADDING
+        y1 = slot.y - (FIELD_HEIGHT - size) / 2 - DESCENT * size
+        widget = DictionaryObject({
+            NameObject('/Type'): NameObject('/Annot'),
+            NameObject('/Subtype'): NameObject('/Widget'),
+            NameObject('/T'): TextStringObject(ACROFORM_FIELD_NAMES.get(slot.field, slot.field)),
+            NameObject('/Rect'): ArrayObject(
+                [FloatObject(x1), FloatObject(y1), FloatObject(x1 + width), FloatObject(y1 + FIELD_HEIGHT)]
+            ),
+            NameObject('/F'): NumberObject(4),
+            NameObject('/FT'): NameObject('/Btn' if slot.checkbox else '/Tx'),
+            NameObject('/DA'): TextStringObject(f'/Helv {size} Tf 0 g'),
+        })
+        if slot.checkbox:
+            widget[NameObject('/AS')] = NameObject('/Off')
+        page = pages[page_num]
+        widget[NameObject('/P')] = page.indirect_reference
+        ref = writer._add_object(widget)
+        if '/Annots' not in page:
+            page[NameObject('/Annots')] = ArrayObject()
+        page['/Annots'].append(ref)
+        fields.append(ref)
+
+    helv = DictionaryObject({
+        NameObject('/Type'): NameObject('/Font'),
+        NameObject('/Subtype'): NameObject('/Type1'),
+        NameObject('/BaseFont'): NameObject('/Helvetica'),
+        NameObject('/Encoding'): NameObject('/WinAnsiEncoding'),
+    })
+    writer._root_object[NameObject('/AcroForm')] = DictionaryObject({
+        NameObject('/Fields'): fields,
+        NameObject('/DA'): TextStringObject('/Helv 9 Tf 0 g'),
+        NameObject('/DR'): DictionaryObject({
+            NameObject('/Font'): DictionaryObject({NameObject('/Helv'): writer._add_object(helv)}),
+        }),
+        NameObject('/NeedAppearances'): BooleanObject(True),
+    })
+    return len(fields)
+
+
+def build_fillable_template(template_path, output_path):
+    """Write a copy of template_path with an AcroForm field for every layout slot"""
+    writer = PdfWriter()
+    pages = [writer.add_page(page) for page in PdfReader(template_path).pages]
+    count = add_layout_fields(writer, pages)
+    with open(output_path, 'wb') as f:
+        writer.write(f)
+    return count
@@ -0,0 +1,122 @@
+"""
+Benchmark parse_simpro_request's body parsing: the old path vs simpro_body
+
+The corpus has the body shapes Make.com sends, each with SimPro jobs of
+increasing width (custom fields):
+
+    plain     JSON, application/json
+    text      JSON, text/plain (request.json refuses it)
+    double    double-encoded JSON string, text/plain
+
+Each body is parsed from a fresh flask Request by
+- legacy: request.json, then on failure the manual unescape and json.loads;
+- json:   simpro_body.parse_body with the json module only;
+- orjson: simpro_body.parse_body with orjson (if installed).
+The cost of building the Request and reading its body is measured and
+subtracted.
+
+Usage: python benchmark_body_parsing.py [iterations] [corpus dir]
+With a corpus dir, every *.json file in it (captured request bodies) is
+added to the corpus as text/plain.
+"""
+
+import glob
+import io
+import json
+import os
+import sys
+import time
+
+from flask import Request
+from werkzeug.test import EnvironBuilder
+
+import simpro_body
+
+WIDTHS = (10, 100, 400)
+
+
+def legacy_parse(request):
+    """parse_simpro_request's parsing before simpro_body"""
+    try:
+        return request.json
+    except Exception:
+        raw_data = request.data.decode('utf-8')
+        if raw_data.startswith('"') and raw_data.endswith('"'):
+            raw_data = raw_data[1:-1].replace('\\"', '"').replace('\\\\', '\\')
+        return json.loads(raw_data)
+
+
+def job(width):
+    return {
+        'job_id': 3015,
+        'site_name': 'Test Building',
+        'technician_name': 'Bob Builder',
+        'custom_fields_array': [{'CustomField': {'ID': i, 'Name': f'Field {i}', 'Type': 'Text'},
+                                 'Value': f'value {i}'} for i in range(width)],
+    }
+
+
+def corpus(directory=None):
+    bodies = []
+    for width in WIDTHS:
+        plain = json.dumps(job(width))
+        bodies.append((f'plain/{width}', plain, 'application/json'))
+        bodies.append((f'text/{width}', plain, 'text/plain'))
+        bodies.append((f'double/{width}', json.dumps(plain), 'text/plain'))
+    if directory:
+        for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+            with open(path, encoding='utf-8') as f:
+                bodies.append((os.path.basename(path), f.read(), 'text/plain'))
+    return bodies
+
+
+def time_parser(parse, body, content_type, iterations, rounds=5):
+    """Best of rounds, in microseconds per parse"""
+    environ = EnvironBuilder(method='POST', data=body, content_type=content_type).get_environ()
+    data = body.encode('utf-8')
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            environ['wsgi.input'] = io.BytesIO(data)
+            parse(Request(environ))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / iterations * 1e6
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    bodies = corpus(sys.argv[2] if len(sys.argv) > 2 else None)
+    orjson = simpro_body.orjson
+
+    def parse_with(module):
+        def parse(request):
+            simpro_body.orjson = module
+            return simpro_body.parse_body(request.get_data())
+        return parse
+
+    parsers = [('legacy', legacy_parse), ('json', parse_with(None))]
+    if orjson is not None:
+        parsers.append(('orjson', parse_with(orjson)))
+
+    print(f"Best of 5 x {iterations} parses per body, microseconds per parse (Request setup subtracted)\n")
+    print(f"{'body':<12} {'bytes':>7}" + ''.join(f"{label:>10}" for label, _ in parsers))
+    totals = {label: 0.0 for label, _ in parsers}
+    for name, body, content_type in bodies:
+        baseline = time_parser(Request.get_data, body, content_type, iterations)
+        row = f"{name:<12} {len(body):>7}"
+        for label, parse in parsers:
+            us = time_parser(parse, body, content_type, iterations) - baseline
+            totals[label] += us
+            row += f"{us:>10.1f}"
+        print(row)
+    simpro_body.orjson = orjson
+
+    print(f"\n{'total':<20}" + ''.join(f"{totals[label]:>10.1f}" for label, _ in parsers))
+    for label, _ in parsers[1:]:
+        print(f"{label}: {totals['legacy'] / totals[label]:.1f}x faster than legacy over the corpus")
+
+
+if __name__ == '__main__':
+    main()
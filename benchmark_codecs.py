@@ -0,0 +1,89 @@
+"""
+Report stored size and decode time of session blobs for each session codec
+
+The corpus is the simpro_data/prefilled_data/mobile_data blobs of an
+existing sessions database (--db), or a synthetic set of SimPro payloads
+with wide, repetitive custom-field arrays.
+
+Usage: python benchmark_codecs.py [--db ccew_sessions.db] [--rows 200]
+"""
+
+import argparse
+import sqlite3
+import time
+
+from session_codec import CODECS, check_codec, decode, encode
+
+
+def synthetic_corpus(rows, fields=120):
+    """SimPro-shaped payloads: job details plus a wide CustomField array"""
+    corpus = []
+    for n in range(rows):
+        custom_fields = [{
+            'CustomField': {
+                'ID': 100 + i,
+                'Name': f'Custom Field {i}',
+                'Type': 'Text',
+                'IsMandatory': i % 7 == 0,
+                'ListItems': [],
+            },
+            'Value': f'value {n}-{i}' if i % 3 else '',
+        } for i in range(fields)]
+        simpro_data = {
+            'job_id': 3000 + n,
+            'site_name': f'Site {n}',
+            'technician_name': 'Bob Builder',
+            'customer_company_name': 'Acme Pty Ltd',
+            'custom_fields_array': custom_fields,
+        }
+        prefilled_data = {'serial_no': str(3000 + n), 'install_suburb': 'Sydney', 'install_state': 'NSW'}
+        corpus.extend([simpro_data, prefilled_data, {}])
+    return corpus
+
+
+def db_corpus(path, rows):
+    db = sqlite3.connect(path)
+    try:
+        query = '''
+            SELECT COALESCE(p.simpro_data, s.simpro_data), s.prefilled_data, s.mobile_data
+            FROM sessions s LEFT JOIN session_payloads p ON p.session_id = s.session_id
+            ORDER BY s.created_at DESC LIMIT ?
+        '''
+        return [decode(blob) for row in db.execute(query, (rows,)) for blob in row if blob is not None]
+    finally:
+        db.close()
+
+
+def report(corpus, repeat=5):
+    rows = len(corpus) // 3 or 1
+    baseline = None
+    print(f"{'codec':<8} {'bytes/row':>10} {'ratio':>7} {'encode us/row':>14} {'decode us/row':>14}")
+    for codec in CODECS:
+        try:
+            check_codec(codec)
+        except ValueError as e:
+            print(f"{codec:<8} skipped: {e}")
+            continue
+        start = time.perf_counter()
+        for _ in range(repeat):
+            stored = [encode(value, codec) for value in corpus]
+        encode_us = (time.perf_counter() - start) / repeat / rows * 1e6
+        size = sum(len(blob.encode('utf-8') if isinstance(blob, str) else blob) for blob in stored)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for blob in stored:
+                decode(blob)
+        decode_us = (time.perf_counter() - start) / repeat / rows * 1e6
+        baseline = baseline or size
+        print(f"{codec:<8} {size / rows:10.0f} {baseline / size:6.1f}x {encode_us:14.1f} {decode_us:14.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', help='sessions database to sample (default: synthetic corpus)')
+    parser.add_argument('--rows', type=int, default=200, help='sessions to sample (default: %(default)s)')
+    args = parser.parse_args()
+
+    corpus = db_corpus(args.db, args.rows) if args.db else synthetic_corpus(args.rows)
+    print(f"{len(corpus) // 3} sessions from {args.db or 'synthetic corpus'}\n")
+    report(corpus)
@@ -0,0 +1,80 @@
+"""
+Micro-benchmark custom field lookup in generate_ccew
+
+Compares the old per-lookup linear scan with custom_field_values() for
+payloads of increasing width. Each request does the 15 lookups
+generate_ccew makes.
+
+Usage: python benchmark_custom_fields.py [iterations]
+"""
+
+import sys
+import time
+
+from simpro_fields import custom_field_values
+
+LOOKUPS = 15
+
+
+def legacy_normalize(custom_fields_raw):
+    """The normalization generate_ccew did before custom_field_values"""
+    custom_fields_array = []
+    if isinstance(custom_fields_raw, dict):
+        for key, value in custom_fields_raw.items():
+            if isinstance(value, dict) and 'Name' in value:
+                custom_fields_array.append(value)
+    elif isinstance(custom_fields_raw, list):
+        for item in custom_fields_raw:
+            if isinstance(item, dict):
+                if 'CustomField' in item and 'Value' in item:
+                    custom_field = item['CustomField']
+                    custom_fields_array.append({
+                        'Name': custom_field.get('Name', ''),
+                        'Value': item.get('Value', '')
+                    })
+                elif 'Name' in item:
+                    custom_fields_array.append(item)
+    return custom_fields_array
+
+
+def legacy_get_custom_field(custom_fields_array, field_name):
+    """The linear lookup generate_ccew did for each field"""
+    for field in custom_fields_array:
+        if field.get('Name') == field_name:
+            return field.get('Value', '')
+    return ''
+
+
+def wide_payload(width):
+    """Nested CustomField entries, like SimPro's job custom fields"""
+    return [{'CustomField': {'ID': i, 'Name': f'Field {i}', 'Type': 'Text'}, 'Value': f'value {i}'}
+            for i in range(width)]
+
+
+def bench(fn, raw, names, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(raw, names)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def legacy_request(raw, names):
+    custom_fields_array = legacy_normalize(raw)
+    return [legacy_get_custom_field(custom_fields_array, name) for name in names]
+
+
+def indexed_request(raw, names):
+    values = custom_field_values(raw)
+    return [values.get(name, '') for name in names]
+
+
+if __name__ == '__main__':
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    print(f"{'fields':>7} {'legacy us/req':>14} {'indexed us/req':>15} {'speedup':>8}")
+    for width in (10, 50, 200, 1000, 5000):
+        raw = wide_payload(width)
+        # Spread the looked-up names across the array, like real jobs
+        names = [f'Field {i * width // LOOKUPS}' for i in range(LOOKUPS)]
+        legacy = bench(legacy_request, raw, names, iterations)
+        indexed = bench(indexed_request, raw, names, iterations)
+        print(f"{width:7d} {legacy:14.1f} {indexed:15.1f} {legacy / indexed:7.1f}x")
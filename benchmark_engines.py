@@ -0,0 +1,89 @@
+"""
+Benchmark the PDF engines behind generate_ccew_pdf
+
+Times every overlay engine against the shipped template, and the AcroForm
+engine (flattened and editable) against a fielded copy of the template built
+from the layout table.
+
+Usage: python benchmark_engines.py [iterations]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from acroform import build_fillable_template
+from pdf_generator import DEFAULT_TEMPLATE_PATH, generate_ccew_pdf
+
+SAMPLE_FORM = {
+    'serial_no': '3015',
+    'property_name': 'Test Building',
+    'install_street_number': '123',
+    'install_street_name': 'Test Street',
+    'nearest_cross_street': 'Cross Road',
+    'install_suburb': 'Sydney',
+    'install_postcode': '2000',
+    'nmi': 'NMI123456',
+    'customer_first_name': 'John',
+    'customer_last_name': 'Smith',
+    'customer_street_number': '456',
+    'customer_street_name': 'Customer Road',
+    'customer_suburb': 'Sydney',
+    'customer_state': 'NSW',
+    'customer_postcode': '2000',
+    'installation_type': 'residential',
+    'work_new_work': 'on',
+    'equipment': {
+        'switchboard_checked': True,
+        'switchboard_rating': '100A',
+        'switchboard_number': '1',
+        'switchboard_particulars': 'Main switchboard',
+    },
+    'meters': [
+        {'type_i': True, 'meter_no': 'M123456', 'no_dials': '5', 'tariff': '11'},
+        {'type_e': True, 'meter_no': 'M654321', 'reading': '01234'},
+    ],
+    'estimated_load_increase': '15',
+    'load_within_capacity': 'yes',
+    'work_connected_to_supply': 'yes',
+    'installer_first_name': 'Bob',
+    'installer_last_name': 'Builder',
+    'installer_street_number': '177',
+    'installer_street_name': 'Bringelly Rd',
+    'installer_suburb': 'Leppington',
+    'installer_state': 'NSW',
+    'installer_postcode': '2179',
+    'installer_contractor_license': 'L123456',
+    'tests': {'earthing_system': True, 'rcd_operational': True, 'polarity': True},
+    'test_date': '2025-11-11',
+    'tester_first_name': 'Bob',
+    'tester_last_name': 'Builder',
+    'tester_contractor_license': 'L123456',
+    'energy_provider': 'Ausgrid',
+    'signature': 'Bob Builder',
+}
+
+
+def bench(label, iterations, **kwargs):
+    generate_ccew_pdf(SAMPLE_FORM, **kwargs)  # warm the template cache
+    start = time.perf_counter()
+    for _ in range(iterations):
+        generate_ccew_pdf(SAMPLE_FORM, **kwargs)
+    elapsed = (time.perf_counter() - start) / iterations
+    print(f"{label:<24} {elapsed * 1000:8.2f} ms/pdf  {1 / elapsed:7.1f} pdf/s")
+
+
+if __name__ == '__main__':
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fielded = os.path.join(tmp, 'CCEW_FIELDED.pdf')
+        count = build_fillable_template(DEFAULT_TEMPLATE_PATH, fielded)
+        print(f"Built fielded template with {count} fields, {iterations} iterations each\n")
+
+        bench('overlay: reportlab', iterations, engine='reportlab')
+        bench('overlay: merge', iterations, engine='merge')
+        bench('overlay: stream', iterations, engine='stream')
+        bench('acroform: flattened', iterations, engine='acroform', template_path=fielded)
+        bench('acroform: editable', iterations, engine='acroform', template_path=fielded, flatten=False)
@@ -0,0 +1,87 @@
+"""
+Measure generate_ccew latency with the old print dumps vs level-gated logging
+
+Each mode runs in its own process with stdout written to a temporary file,
+posting a SimPro job with a wide custom field array to /api/ccew/generate
+through the Flask test client:
+
+    legacy  the pre-logging print dumps (headers, raw body, parsed custom fields)
+    info    CCEW_LOG_LEVEL=INFO, the default: one structured line per request
+    debug   CCEW_LOG_LEVEL=DEBUG: payload dumps for every request
+
+Usage: python benchmark_logging.py [requests] [custom fields]
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+MODES = ('legacy', 'info', 'debug')
+
+
+def payload(fields):
+    return {
+        'job_id': 3015,
+        'site_name': 'Test Building',
+        'technician_name': 'Bob Builder',
+        'custom_fields_array': [{'CustomField': {'ID': i, 'Name': f'Field {i}'}, 'Value': f'value {i}'}
+                                for i in range(fields)],
+    }
+
+
+def install_legacy_dumps(app):
+    """Reproduce the print block generate_ccew had before structured logging"""
+    from flask import request
+    from simpro_fields import custom_field_values
+
+    @app.before_request
+    def legacy_dumps():
+        if request.path != '/api/ccew/generate':
+            return
+        print(f"\n{'='*80}")
+        print(f"INCOMING REQUEST to /api/ccew/generate")
+        print(f"Content-Type: {request.content_type}")
+        print(f"Headers: {dict(request.headers)}")
+        print(f"Raw data (first 500 chars): {request.data.decode('utf-8')[:500]}")
+        print(f"{'='*80}\n")
+        print(f"Parsed custom fields: {custom_field_values(request.json.get('custom_fields_array', []))}")
+
+
+def run(mode, requests, fields):
+    import app
+
+    if mode == 'legacy':
+        install_legacy_dumps(app.app)
+    client = app.app.test_client()
+    body = payload(fields)
+    client.post('/api/ccew/generate', json=body)
+    start = time.perf_counter()
+    for _ in range(requests):
+        client.post('/api/ccew/generate', json=body)
+    return (time.perf_counter() - start) / requests * 1000
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--mode':
+        mode, requests, fields = sys.argv[2], int(sys.argv[3]), int(sys.argv[4])
+        ms = run(mode, requests, fields)
+        sys.stderr.write(f"{ms:.3f}\n")
+        sys.exit(0)
+
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    fields = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    print(f"{requests} generate requests, {fields} custom fields each\n")
+    results = {}
+    for mode in MODES:
+        env = dict(os.environ, CCEW_IDEMPOTENCY_MODE='off',
+                   CCEW_LOG_LEVEL='DEBUG' if mode == 'debug' else 'INFO')
+        with tempfile.TemporaryFile() as out:
+            proc = subprocess.run([sys.executable, __file__, '--mode', mode, str(requests), str(fields)],
+                                  stdout=out, stderr=subprocess.PIPE, env=env, check=True, text=True)
+            out.seek(0, os.SEEK_END)
+            log_bytes = out.tell()
+        results[mode] = float(proc.stderr.strip().splitlines()[-1])
+        print(f"{mode:<7} {results[mode]:7.3f} ms/request  {log_bytes / requests / 1024:7.1f} KiB logged/request")
+    print(f"\nINFO saves {results['legacy'] - results['info']:.3f} ms/request over the legacy dumps")
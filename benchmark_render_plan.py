@@ -0,0 +1,69 @@
+"""
+Benchmark the submit path's form data -> draw ops transform
+
+- nested: the transform before render_plan, a copy of the flat form data
+  plus nested equipment / meters / tests dicts (form_schema.pdf_sections),
+  then iter_page_ops walking every key of that dict for each page;
+- plan:   render_plan.build_render_plan, one pass over the compiled layout
+  slots straight to a RenderPlan.
+
+Forms are random submissions with a share of the fields filled in; the
+pickled size is what a render pool worker receives.
+
+Usage: python benchmark_render_plan.py [forms] [fill ratio]
+"""
+
+import pickle
+import random
+import sys
+import time
+
+from field_coordinates import PAGE_COUNT, iter_page_ops
+from form_schema import FORM_KEYS, pdf_sections
+from render_plan import build_render_plan
+from simpro_mapping import extract_prefilled
+
+
+def nested_ops(form_data):
+    transformed = {**form_data}
+    transformed.update(pdf_sections(form_data))
+    return transformed, [list(iter_page_ops(transformed, page)) for page in range(PAGE_COUNT)]
+
+
+def plan_ops(form_data):
+    plan = build_render_plan(form_data)
+    return plan, plan.pages
+
+
+def random_form(rng, fill):
+    form = extract_prefilled({'job_id': rng.randint(1, 9999), 'site_name': 'Test Building',
+                              'technician_name': 'Bob Builder'})
+    for key in FORM_KEYS:
+        form[key] = rng.choice(('yes', 'Yes', 'Residential', '11')) if rng.random() < fill else ''
+    return form
+
+
+def bench(label, transform, forms, rounds=5):
+    """Best of rounds"""
+    transform(forms[0])
+    elapsed = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for form in forms:
+            transform(form)
+        round_time = time.perf_counter() - start
+        elapsed = round_time if elapsed is None else min(elapsed, round_time)
+    size = sum(len(pickle.dumps(transform(form)[0])) for form in forms) / len(forms)
+    print(f"{label:<7} {elapsed / len(forms) * 1e6:8.1f} us/form  {size:7.0f} bytes pickled")
+    return elapsed
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    fill = float(sys.argv[2]) if len(sys.argv) > 2 else 0.3
+    rng = random.Random(1)
+    forms = [random_form(rng, fill) for _ in range(count)]
+    print(f"{count} forms, {fill:.0%} of the form fields filled in\n")
+    nested = bench('nested', nested_ops, forms)
+    plan = bench('plan', plan_ops, forms)
+    print(f"\nplan is {nested / plan:.1f}x faster")
@@ -0,0 +1,131 @@
+"""
+Benchmark concurrent generate/submit throughput of the session store
+
+Each simulated request cycle does what the web tier does for one job:
+generate (save_session), open the form (get_session) and submit
+(get_session + update_session). Threads run cycles concurrently against
+
+- legacy: a new connection per request in the default rollback journal, as
+  app.get_db did before the session store;
+- store: session_store.SQLiteSessionStore (WAL, per-thread connections,
+  cached statements);
+- cached: the same store behind session_store.CachedSessionStore.
+
+Usage: python benchmark_sessions.py [threads] [cycles per thread]
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from session_store import CachedSessionStore, SQLiteSessionStore
+
+SIMPRO_DATA = {
+    'job_id': '3015',
+    'custom_fields': [{'CustomField': {'Name': f'Field {i}'}, 'Value': f'value {i}'} for i in range(40)],
+}
+PREFILLED_DATA = {'serial_no': '3015', 'install_suburb': 'Sydney', 'customer_first_name': 'John'}
+HOT_FIELDS = ('prefilled_data',)
+MOBILE_DATA = {'meter_1_no': 'M123456', 'test_date': '2025-11-11', 'signature': 'Bob Builder'}
+
+
+class LegacyStore:
+    """The pre-store access pattern: connect, execute, close on every request"""
+
+    def __init__(self, path):
+        self.path = path
+        conn = sqlite3.connect(path)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                simpro_data TEXT,
+                prefilled_data TEXT,
+                mobile_data TEXT,
+                created_at TEXT,
+                status TEXT
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def save(self, session_id, simpro_data, prefilled_data):
+        conn = self._connect()
+        conn.execute('''
+            INSERT INTO sessions (session_id, simpro_data, prefilled_data, mobile_data, created_at, status)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (session_id, json.dumps(simpro_data), json.dumps(prefilled_data), json.dumps({}),
+              datetime.now().isoformat(), 'pending'))
+        conn.commit()
+        conn.close()
+
+    def get(self, session_id, fields=None):
+        # The old get_session always read and decoded every blob
+        conn = self._connect()
+        row = conn.execute('SELECT * FROM sessions WHERE session_id = ?', (session_id,)).fetchone()
+        conn.close()
+        if row:
+            return {key: json.loads(row[key]) for key in ('simpro_data', 'prefilled_data', 'mobile_data')}
+        return None
+
+    def update(self, session_id, mobile_data):
+        conn = self._connect()
+        conn.execute('UPDATE sessions SET mobile_data = ?, status = ? WHERE session_id = ?',
+                     (json.dumps(mobile_data), 'submitted', session_id))
+        conn.commit()
+        conn.close()
+
+
+def cycle(store):
+    session_id = str(uuid.uuid4())
+    store.save(session_id, SIMPRO_DATA, PREFILLED_DATA)   # generate
+    store.get(session_id, HOT_FIELDS)                     # show_form
+    store.get(session_id, HOT_FIELDS)                     # submit_ccew
+    store.update(session_id, MOBILE_DATA)
+
+
+def bench(label, store, threads, cycles):
+    cycle(store)  # create the connection / warm the cache
+    barrier = threading.Barrier(threads + 1)
+
+    def worker():
+        barrier.wait()
+        for _ in range(cycles):
+            cycle(store)
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in pool:
+        t.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+    total = threads * cycles
+    print(f"{label:<8} {total / elapsed:8.1f} cycles/s  {elapsed / total * 1000:6.2f} ms/cycle")
+
+
+if __name__ == '__main__':
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    cycles = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{threads} threads x {cycles} generate/submit cycles\n")
+        bench('legacy', LegacyStore(os.path.join(tmp, 'legacy.db')), threads, cycles)
+        store = SQLiteSessionStore(os.path.join(tmp, 'store.db'))
+        store.init()
+        bench('store', store, threads, cycles)
+        cached = CachedSessionStore(store)
+        bench('cached', cached, threads, cycles)
+        print(f"\ncache: {cached.stats()}")
+        store.pool.close_all()
@@ -9,6 +9,8 @@ from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
 import io
 
+from field_coordinates import get_field_position
+
 template_path = "CCEW_OFFICIAL_TEMPLATE.pdf"
 
 def create_test_overlay(test_fields):
@@ -30,26 +32,21 @@ def create_test_overlay(test_fields):
 # Test Installation Address fields with range of Y values
 print("Creating calibration test PDF...")
 
-# Based on observation: fields are appearing too low, need higher Y values
-# Property Name was at Y=650 but appearing correct
-# Street Number at Y=605 appeared in Street Name
-# Need to test higher values
+# Sweep Y values around the positions currently in field_coordinates.LAYOUT
+
+def sweep(label, field_name, page=1, step=3, count=5):
+    """Test Y values around the field's current layout position"""
+    x, y = get_field_position(field_name, page)
+    offset = step * (count // 2)
+    return (label, x, [y - offset + step * i for i in range(count)])
+
 
 test_fields_page1 = [
-    # Property Name - test around 650
-    ("PROP", 70, [645, 648, 651, 654, 657]),
-    
-    # Street Number - test higher than 605
-    ("STNUM", 485, [595, 600, 605, 610, 615]),
-    
-    # Street Name - test higher than 560  
-    ("STNAME", 70, [550, 555, 560, 565, 570]),
-    
-    # Suburb - test higher than 515
-    ("SUBURB", 70, [505, 510, 515, 520, 525]),
-    
-    # Customer First Name - test higher than 400
-    ("CUSTFN", 70, [390, 395, 400, 405, 410]),
+    sweep("PROP", 'property_name'),
+    sweep("STNUM", 'install_street_number'),
+    sweep("STNAME", 'install_street_name'),
+    sweep("SUBURB", 'install_suburb'),
+    sweep("CUSTFN", 'customer_first_name'),
 ]
 
 # Create test PDF
@@ -0,0 +1,106 @@
+"""
+Structured, level-gated logging for the app and its background workers
+
+Loggers under 'ccew' hand records, unformatted, to a QueueHandler; a
+QueueListener thread does the formatting and writing, so a request thread
+neither formats nor blocks on stdout. Records render as one line with the
+message followed by key=value pairs passed as extra={'fields': {...}}.
+
+Full payload dumps (headers, raw bodies) are logged at DEBUG only, and only
+for a sample of requests (sample_payload()). Email addresses, phone numbers
+and credential headers in DEBUG fields are masked before they are written.
+
+Configuration (environment):
+    CCEW_LOG_LEVEL           level for the 'ccew' loggers (default: INFO)
+    CCEW_LOG_PAYLOAD_SAMPLE  share of requests whose payloads are dumped at DEBUG (default: 1.0)
+    CCEW_LOG_REDACT          mask personal data in DEBUG dumps, 0 to log it verbatim (default: 1)
+"""
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+
+LOG_LEVEL = os.environ.get('CCEW_LOG_LEVEL', 'INFO').upper()
+PAYLOAD_SAMPLE = float(os.environ.get('CCEW_LOG_PAYLOAD_SAMPLE', 1.0))
+REDACT = os.environ.get('CCEW_LOG_REDACT', '1') != '0'
+
+EMAIL_RE = re.compile(r'[\w.+-]+@[\w-]+(?:\.[\w-]+)+')
+# Australian landline and mobile numbers: 0x or +61 x, then eight digits, optionally spaced
+PHONE_RE = re.compile(r'(?<![\w+])(?:\+61[ -]?|0)[2-478](?:[ -]?\d){8}(?!\w)')
+SECRET_KEYS = {'authorization', 'cookie', 'x-admin-token'}
+
+_listener = None
+
+
+def redact(value):
+    """Copy of value with emails, phone numbers and credential entries masked"""
+    if isinstance(value, str):
+        return PHONE_RE.sub('<phone>', EMAIL_RE.sub('<email>', value))
+    if isinstance(value, dict):
+        return {key: '<redacted>' if str(key).lower() in SECRET_KEYS else redact(item)
+                for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(redact(item) for item in value)
+    return value
+
+
+class StructuredFormatter(logging.Formatter):
+    """'time level logger message key=value ...'; DEBUG fields are redacted"""
+
+    def __init__(self, redact_debug=None):
+        super().__init__()
+        self.redact_debug = REDACT if redact_debug is None else redact_debug
+
+    def format(self, record):
+        line = f"{self.formatTime(record)} {record.levelname} {record.name} {record.getMessage()}"
+        fields = getattr(record, 'fields', None)
+        if fields and self.redact_debug and record.levelno <= logging.DEBUG:
+            fields = redact(fields)
+        if fields:
+            line += ' ' + ' '.join(f"{key}={value!r}" for key, value in fields.items())
+        if record.exc_info:
+            line += '\n' + self.formatException(record.exc_info)
+        return line
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves all formatting to the listener thread"""
+
+    def prepare(self, record):
+        # The stock prepare() formats the record (message and traceback) so it
+        # can be pickled; this queue never leaves the process, so it need not be
+        return record
+
+
+def setup_logging(stream=None):
+    """Route the 'ccew' loggers through a queue to stream (default stdout); idempotent"""
+    global _listener
+    if _listener is not None:
+        return
+    records = queue.SimpleQueue()
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(StructuredFormatter())
+    _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    logger = logging.getLogger('ccew')
+    logger.setLevel(LOG_LEVEL)
+    logger.addHandler(DeferredQueueHandler(records))
+    logger.propagate = False
+
+
+def get_logger(name):
+    """Logger under the 'ccew' hierarchy"""
+    setup_logging()
+    return logging.getLogger(f'ccew.{name}')
+
+
+def sample_payload(logger):
+    """True if this request's payloads should be dumped (DEBUG enabled and sampled in)"""
+    return logger.isEnabledFor(logging.DEBUG) and (PAYLOAD_SAMPLE >= 1 or random.random() < PAYLOAD_SAMPLE)
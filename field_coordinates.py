@@ -1,155 +1,360 @@
 """
-Precise field coordinates for CCEW PDF overlay
-Based on visual analysis of the official CCEW form
+Field layout registry for the CCEW PDF overlay
+Single source of truth for where every form_data key is drawn on the official form
 
 Coordinate system: ReportLab uses bottom-left as origin (0,0)
 A4 page height = 842 points
+
+The LAYOUT table below is compiled once at import into a per-page index keyed
+by the top-level form_data key, so rendering walks only the keys that are
+actually present in form_data. The same table feeds the calibration tools
+(get_field_position) and the SimPro mapping's mandatory fields (simpro_mapping).
 """
 
-# Page 1 - Installation Address and Customer Details
-PAGE1_FIELDS = {
-    # Serial Number (top right)
-    'serial_no': (485, 757),  # height - 85
-    
-    # INSTALLATION ADDRESS SECTION
-    'property_name': (68, 562),  # height - 280
-    'install_floor': (68, 512),  # height - 330  
-    'install_unit': (155, 512),
-    'install_street_number': (210, 512),
-    'install_lot_rmb': (380, 512),
-    
-    'install_street_name': (68, 467),  # height - 375
-    'nearest_cross_street': (320, 467),
-    
-    'install_suburb': (68, 417),  # height - 425
-    'install_state': (320, 417),
-    'install_postcode': (440, 417),
-    
-    'pit_pillar_pole_no': (68, 350),  # height - 492
-    'nmi': (190, 350),
-    'meter_no': (285, 350),
-    'aemo_provider_id': (420, 350),
-    
-    # CUSTOMER DETAILS SECTION  
-    'customer_first_name': (68, 247),  # height - 595
-    'customer_last_name': (320, 247),
-    
-    'customer_company_name': (68, 207),  # height - 635
-    
-    'customer_floor': (68, 142),  # height - 700
-    'customer_unit': (155, 142),
-    'customer_street_number': (210, 142),
-    'customer_lot_rmb': (380, 142),
-    
-    'customer_street_name': (68, 87),  # height - 755
-    'customer_nearest_cross': (320, 87),
-    
-    'customer_suburb': (68, 32),  # height - 810
-    'customer_state': (320, 32),
-    'customer_postcode': (440, 32),
-}
-
-# Checkboxes for Installation Details (Page 1)
-PAGE1_CHECKBOXES = {
-    'residential': (70, -95),  # Approximate, needs adjustment
-    'commercial': (145, -95),
-    'industrial': (220, -95),
-    'rural': (295, -95),
-    'mixed_development': (400, -95),
-    
-    'new_work': (145, -118),
-    'addition_alteration': (70, -133),
-    'installed_meter': (295, -118),
-    'network_connection': (450, -118),
-}
-
-# Page 2 - Equipment and Installer Details
-PAGE2_FIELDS = {
-    # Equipment section
-    'equip_switchboard_rating': (145, 729),
-    'equip_switchboard_number': (295, 729),
-    'equip_switchboard_particulars': (395, 729),
-    
-    'equip_circuits_rating': (145, 706),
-    'equip_circuits_number': (295, 706),
-    'equip_circuits_particulars': (395, 706),
-    
-    # Meters section
-    'meter_1_number': (120, 609),
-    'meter_1_dials': (220, 609),
-    
-    # Load section
-    'load_increase': (250, 464),
-    
-    # Installer Details
-    'installer_first_name': (68, 349),
-    'installer_last_name': (320, 349),
-    
-    'installer_floor': (68, 303),
-    'installer_unit': (155, 303),
-    'installer_street_number': (210, 303),
-    'installer_lot_rmb': (380, 303),
-    
-    'installer_street_name': (68, 280),
-    'installer_nearest_cross': (320, 280),
-    
-    'installer_suburb': (68, 257),
-    'installer_state': (320, 257),
-    'installer_postcode': (440, 257),
-    
-    'installer_email': (68, 234),
-    'installer_office_phone': (320, 234),
-    
-    'installer_license_no': (320, 188),
-    'installer_license_expiry': (445, 188),
-}
-
-# Page 3 - Test Report and Tester Details  
-PAGE3_FIELDS = {
-    # Test date
-    'test_date': (200, 579),
-    
-    # Tester Details
-    'tester_first_name': (68, 504),
-    'tester_last_name': (320, 504),
-    
-    'tester_floor': (68, 458),
-    'tester_unit': (155, 458),
-    'tester_street_number': (210, 458),
-    'tester_lot_rmb': (380, 458),
-    
-    'tester_street_name': (68, 435),
-    'tester_nearest_cross': (320, 435),
-    
-    'tester_suburb': (68, 412),
-    'tester_state': (320, 412),
-    'tester_postcode': (440, 412),
-    
-    'tester_email': (68, 389),
-    
-    'tester_license_no': (320, 320),
-    'tester_license_expiry': (445, 320),
-    
-    # Energy Provider
-    'energy_provider': (100, 212),
-}
+from collections import namedtuple
+
+# Field kinds
+TEXT = 'text'                 # draw str(value) when value is truthy
+CHECKBOX = 'checkbox'         # draw "X" when value is truthy
+KEYWORD_CHOICE = 'keyword'    # tick every option whose keyword appears in value
+BOOLEAN_CHOICE = 'boolean'    # tick the yes or the no box
+ROW_TABLE = 'row_table'       # list of row dicts drawn on fixed row positions
+
+DEFAULT_FONT = ('Helvetica', 9)
+
+YES_VALUES = ('yes', 'y', 'true', '1', 'on')
+NO_VALUES = ('no', 'n', 'false', '0')
+
+# page is 0-based (matches create_overlay_page); key is a dotted path into form_data
+FieldSpec = namedtuple('FieldSpec', 'page key x y kind font required options transform box')
+FieldSpec.__new__.__defaults__ = (TEXT, DEFAULT_FONT, False, None, None, None)
+
+Column = namedtuple('Column', 'key x kind transform')
+Column.__new__.__defaults__ = (TEXT, None)
+
+# field is the AcroForm-style name of the drawn slot, checkbox marks an "X" tick
+DrawOp = namedtuple('DrawOp', 'x y text font box field checkbox')
+
+# Render-ready form: pages is one tuple of DrawOps per page (see render_plan)
+RenderPlan = namedtuple('RenderPlan', 'pages serial_no')
+
+
+def _tariff(value):
+    """Add 'T' prefix to tariff codes if not already present"""
+    value = str(value)
+    return value if value.startswith('T') else 'T' + value
+
+
+def _address_block(page, prefix, columns, rows, required_email=False):
+    """Name + address + contact rows shared by customer, installer and tester sections"""
+    unit_x, postcode_x, office_x = columns
+    name_y, addr_y, street_y, suburb_y, contact_y = rows
+    return [
+        FieldSpec(page, f'{prefix}_first_name', 50, name_y, required=True),
+        FieldSpec(page, f'{prefix}_last_name', 305, name_y, required=True),
+        FieldSpec(page, f'{prefix}_floor', 50, addr_y),
+        FieldSpec(page, f'{prefix}_unit', unit_x, addr_y),
+        FieldSpec(page, f'{prefix}_street_number', 305, addr_y, required=True),
+        FieldSpec(page, f'{prefix}_lot_rmb', 435, addr_y),
+        FieldSpec(page, f'{prefix}_street_name', 50, street_y, required=True),
+        FieldSpec(page, f'{prefix}_cross_street', 305, street_y),
+        FieldSpec(page, f'{prefix}_suburb', 50, suburb_y, required=True),
+        FieldSpec(page, f'{prefix}_state', 305, suburb_y, required=True),
+        FieldSpec(page, f'{prefix}_postcode', postcode_x, suburb_y, required=True),
+        FieldSpec(page, f'{prefix}_email', 50, contact_y, required=required_email),
+        FieldSpec(page, f'{prefix}_office_phone', office_x, contact_y),
+        FieldSpec(page, f'{prefix}_mobile_phone', postcode_x, contact_y),
+    ]
+
+
+def _licence_row(page, prefix, y):
+    return [
+        FieldSpec(page, f'{prefix}_supervisor_no', 50, y),
+        FieldSpec(page, f'{prefix}_supervisor_expiry', 195, y),
+        FieldSpec(page, f'{prefix}_contractor_license', 310, y),
+        FieldSpec(page, f'{prefix}_contractor_expiry', 450, y),
+    ]
+
+
+def _equipment_row(name, y):
+    return [
+        FieldSpec(1, f'equipment.{name}_checked', 45, y, CHECKBOX),
+        FieldSpec(1, f'equipment.{name}_rating', 160, y),
+        FieldSpec(1, f'equipment.{name}_number', 245, y),
+        FieldSpec(1, f'equipment.{name}_particulars', 365, y),
+    ]
+
+
+LAYOUT = [
+    # ===== PAGE 1 =====
+
+    # SERIAL NUMBER (top right header)
+    FieldSpec(0, 'serial_no', 490, 762),
+
+    # INSTALLATION ADDRESS
+    # Note: State field marked as N/A by user - not drawn
+    FieldSpec(0, 'property_name', 50, 660),
+    FieldSpec(0, 'install_floor', 50, 625),
+    FieldSpec(0, 'install_unit', 180, 625),
+    FieldSpec(0, 'install_street_number', 305, 625, required=True),
+    FieldSpec(0, 'install_lot_rmb', 435, 625),
+    FieldSpec(0, 'install_street_name', 50, 590, required=True),
+    FieldSpec(0, 'nearest_cross_street', 305, 590),
+    FieldSpec(0, 'install_suburb', 50, 555, required=True),
+    FieldSpec(0, 'install_postcode', 475, 555, required=True),
+    FieldSpec(0, 'pit_pillar_pole_no', 50, 518),
+    FieldSpec(0, 'nmi', 180, 515),
+    FieldSpec(0, 'meter_no', 275, 515),
+    FieldSpec(0, 'aemo_provider_id', 390, 515),
+
+    # CUSTOMER DETAILS
+    FieldSpec(0, 'customer_company_name', 50, 415),
+] + _address_block(0, 'customer', (175, 475, 375), (450, 380, 345, 310, 275)) + [
+
+    # INSTALLATION DETAILS - Type of Installation (checkboxes)
+    FieldSpec(0, 'installation_type', 115, 205, KEYWORD_CHOICE, required=True, options=(
+        (('residential',), 115, 205),
+        (('commercial',), 225, 205),
+        (('industrial',), 315, 205),
+        (('rural',), 390, 205),
+        (('mixed', 'development'), 535, 205),
+    )),
+
+    # Work carried out (checkboxes)
+    FieldSpec(0, 'work_new_work', 205, 170, CHECKBOX),
+    FieldSpec(0, 'work_installed_meter', 360, 170, CHECKBOX),
+    FieldSpec(0, 'work_network_connection', 535, 170, CHECKBOX),
+    FieldSpec(0, 'work_addition_alteration', 205, 150, CHECKBOX),
+    FieldSpec(0, 'work_advanced_meter', 360, 150, CHECKBOX),
+    FieldSpec(0, 'work_ev_connection', 535, 150, CHECKBOX),
+    FieldSpec(0, 'work_reinspection', 240, 130, CHECKBOX),
+    FieldSpec(0, 'non_compliance_no', 410, 130),
+
+    # Special Conditions (checkboxes)
+    FieldSpec(0, 'special_over_100_amps', 205, 90, CHECKBOX),
+    FieldSpec(0, 'special_hazardous_area', 360, 90, CHECKBOX),
+    FieldSpec(0, 'special_off_grid', 535, 90, CHECKBOX),
+    FieldSpec(0, 'special_high_voltage', 205, 70, CHECKBOX),
+    FieldSpec(0, 'special_unmetered', 360, 70, CHECKBOX),
+    FieldSpec(0, 'special_secondary_power', 535, 70, CHECKBOX),
+
+    # ===== PAGE 2 =====
+
+    # DETAILS OF EQUIPMENT (Table)
+] + _equipment_row('switchboard', 735) \
+  + _equipment_row('circuits', 715) \
+  + _equipment_row('lighting', 695) \
+  + _equipment_row('socket_outlets', 675) \
+  + _equipment_row('appliances', 655) \
+  + _equipment_row('generation', 635) \
+  + _equipment_row('storage', 615) + [
+
+    # METERS TABLE (8 rows)
+    FieldSpec(1, 'meters', 45, 520, ROW_TABLE, options={
+        'rows': (520, 500, 480, 460, 440, 420, 400, 380),
+        'columns': (
+            Column('type_i', 45, CHECKBOX),
+            Column('type_r', 70, CHECKBOX),
+            Column('type_e', 95, CHECKBOX),
+            Column('meter_no', 120),
+            Column('no_dials', 175),
+            Column('master_sub_status', 230),
+            Column('wired_as_master_sub', 300),
+            Column('register_no', 385),
+            Column('reading', 430),
+            Column('tariff', 495, TEXT, _tariff),
+        ),
+    }),
+
+    # Additional Page 2 Fields (between meters and installer details)
+    FieldSpec(1, 'estimated_load_increase', 230, 360),
+    FieldSpec(1, 'load_within_capacity', 415, 340, BOOLEAN_CHOICE, required=True, options=(
+        (YES_VALUES, 415, 340),
+        (NO_VALUES, 480, 340),
+    )),
+    FieldSpec(1, 'work_connected_to_supply', 415, 323, BOOLEAN_CHOICE, required=True, options=(
+        (YES_VALUES, 415, 323),
+        (NO_VALUES, 480, 320),
+    )),
+
+    # INSTALLERS LICENSE DETAILS
+] + _address_block(1, 'installer', (175, 470, 375), (260, 230, 200, 170, 142)) \
+  + _licence_row(1, 'installer', 112) + [
+
+    # ===== PAGE 3 =====
+
+    # TEST REPORT - Checkboxes
+    FieldSpec(2, 'tests.earthing_system', 65, 742, CHECKBOX),
+    FieldSpec(2, 'tests.rcd_operational', 65, 725, CHECKBOX),
+    FieldSpec(2, 'tests.insulation_resistance', 65, 707, CHECKBOX),
+    FieldSpec(2, 'tests.visual_check', 65, 691, CHECKBOX),
+    FieldSpec(2, 'tests.polarity', 65, 673, CHECKBOX),
+    FieldSpec(2, 'tests.standalone_system', 65, 657, CHECKBOX),
+    FieldSpec(2, 'tests.correct_current_connections', 65, 640, CHECKBOX),
+    FieldSpec(2, 'tests.fault_loop_impedance', 65, 622, CHECKBOX),
+
+    # Test completed on (date field)
+    FieldSpec(2, 'test_date', 220, 577, required=True),
+
+    # TESTERS LICENSE DETAILS
+    FieldSpec(2, 'tester_same_as_installer', 240, 552, CHECKBOX),
+] + _address_block(2, 'tester', (175, 470, 370), (517, 490, 460, 430, 402), required_email=True) \
+  + _licence_row(2, 'tester', 372) + [
+
+    # SUBMIT CCEW
+    # White box with black outline hides the template's dropdown placeholder
+    FieldSpec(2, 'energy_provider', 50, 271, required=True, box=(42, 266, 420, 15)),
+    FieldSpec(2, 'meter_provider_email', 50, 225),
+    FieldSpec(2, 'owner_email', 50, 180),
+
+    # Signature field (text placeholder)
+    FieldSpec(2, 'signature', 50, 112),
+]
+
+PAGE_COUNT = 3
+
+
+def compile_layout(layout):
+    """
+    Compile a layout table into per-page indexes
+
+    Returns a list (one per page) of dicts mapping the top-level form_data key
+    to either a list of specs, or for dotted keys a dict of sub key -> specs.
+    """
+    pages = [{} for _ in range(PAGE_COUNT)]
+    for spec in layout:
+        index = pages[spec.page]
+        top, _, sub = spec.key.partition('.')
+        if sub:
+            index.setdefault(top, {}).setdefault(sub, []).append(spec)
+        else:
+            index.setdefault(top, []).append(spec)
+    return pages
+
+
+COMPILED_LAYOUT = compile_layout(LAYOUT)
+FIELDS_BY_KEY = {spec.key: spec for spec in LAYOUT}
+
+
+def _choice_field(spec, option):
+    """Field name for one box of a keyword/boolean choice, e.g. 'load_within_capacity.yes'"""
+    return f'{spec.key}.{option[0]}'
+
+
+def cell_field(spec, row_index, column):
+    """Field name for one row-table cell, e.g. 'meters.1.meter_no'"""
+    return f'{spec.key}.{row_index + 1}.{column.key}'
+
+
+def spec_ops(spec, value):
+    """Yield the draw ops for one spec/value pair"""
+    kind = spec.kind
+    if kind == TEXT:
+        if value:
+            text = spec.transform(value) if spec.transform else str(value)
+            yield DrawOp(spec.x, spec.y, text, spec.font, spec.box, spec.key, False)
+    elif kind == CHECKBOX:
+        if value:
+            yield DrawOp(spec.x, spec.y, 'X', spec.font, None, spec.key, True)
+    elif kind == KEYWORD_CHOICE:
+        if value:
+            value = str(value).lower()
+            for keywords, x, y in spec.options:
+                if any(keyword in value for keyword in keywords):
+                    yield DrawOp(x, y, 'X', spec.font, None, _choice_field(spec, keywords), True)
+    elif kind == BOOLEAN_CHOICE:
+        value = str(value).lower()
+        for accepted, x, y in spec.options:
+            if value in accepted:
+                yield DrawOp(x, y, 'X', spec.font, None, _choice_field(spec, accepted), True)
+                break
+    elif kind == ROW_TABLE:
+        rows = spec.options['rows']
+        for row_index, (row_y, row) in enumerate(zip(rows, value or ())):
+            for column in spec.options['columns']:
+                cell = row.get(column.key)
+                if not cell:
+                    continue
+                field = cell_field(spec, row_index, column)
+                if column.kind == CHECKBOX:
+                    yield DrawOp(column.x, row_y, 'X', spec.font, None, field, True)
+                else:
+                    text = column.transform(cell) if column.transform else str(cell)
+                    yield DrawOp(column.x, row_y, text, spec.font, None, field, False)
+
+
+def iter_layout_fields(layout=LAYOUT):
+    """
+    Yield (page, DrawOp) slots, with text=None, for every fillable position
+
+    Used to build AcroForm widgets covering the whole form.
+    """
+    for spec in layout:
+        if spec.kind in (TEXT, CHECKBOX):
+            yield spec.page, DrawOp(spec.x, spec.y, None, spec.font, spec.box, spec.key, spec.kind == CHECKBOX)
+        elif spec.kind in (KEYWORD_CHOICE, BOOLEAN_CHOICE):
+            for option, x, y in spec.options:
+                yield spec.page, DrawOp(x, y, None, spec.font, None, _choice_field(spec, option), True)
+        elif spec.kind == ROW_TABLE:
+            for row_index, row_y in enumerate(spec.options['rows']):
+                for column in spec.options['columns']:
+                    field = cell_field(spec, row_index, column)
+                    yield spec.page, DrawOp(column.x, row_y, None, spec.font, None, field, column.kind == CHECKBOX)
+
+
+def iter_page_ops(form_data, page_num, compiled=COMPILED_LAYOUT):
+    """
+    Yield a DrawOp for every filled field on a page
+
+    Walks form_data once and looks each key up in the compiled index, so the
+    cost is proportional to the number of keys supplied, not the layout size.
+    A RenderPlan already holds its ops, which are yielded as they are.
+    """
+    if isinstance(form_data, RenderPlan):
+        if page_num < len(form_data.pages):
+            yield from form_data.pages[page_num]
+        return
+    if page_num >= len(compiled):
+        return
+    index = compiled[page_num]
+    for key, value in form_data.items():
+        entry = index.get(key)
+        if entry is None:
+            continue
+        if isinstance(entry, dict):
+            if not isinstance(value, dict):
+                continue
+            for sub_key, sub_value in value.items():
+                for spec in entry.get(sub_key, ()):
+                    yield from spec_ops(spec, sub_value)
+        else:
+            for spec in entry:
+                yield from spec_ops(spec, value)
 
 
 def get_field_position(field_name, page=1):
     """
     Get the (x, y) position for a field
-    
+
     Args:
-        field_name: Name of the field
+        field_name: Name of the field (dotted for nested keys, e.g. 'tests.polarity')
         page: Page number (1, 2, or 3)
-    
+
     Returns:
         Tuple of (x, y) coordinates, or None if field not found
     """
-    if page == 1:
-        return PAGE1_FIELDS.get(field_name) or PAGE1_CHECKBOXES.get(field_name)
-    elif page == 2:
-        return PAGE2_FIELDS.get(field_name)
-    elif page == 3:
-        return PAGE3_FIELDS.get(field_name)
-    return None
+    spec = FIELDS_BY_KEY.get(field_name)
+    if spec is None or spec.page != page - 1:
+        return None
+    return (spec.x, spec.y)
+
+
+def page_fields(page):
+    """Return {key: (x, y)} for every field on a page (1, 2, or 3)"""
+    return {spec.key: (spec.x, spec.y) for spec in LAYOUT if spec.page == page - 1}
+
+
+# Flat per-page views kept for the calibration scripts
+PAGE1_FIELDS = page_fields(1)
+PAGE2_FIELDS = page_fields(2)
+PAGE3_FIELDS = page_fields(3)
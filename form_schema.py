@@ -0,0 +1,332 @@
+"""
+Declarative schema for the fields the installer fills in on the CCEW web form
+
+FIELDS lists the single fields; GROUPS the repeated ones (equipment rows,
+meters 1-8, test checkboxes), each an instance x column grid whose form keys
+come from the group's key format ('meter_{instance}{column}' -> 'meter_3_tariff').
+The schema is compiled once at import and drives:
+
+- extraction: extract_form_data(request.form) -> mobile_data;
+- validation: form_problems(form_data) -> missing or unexpected values;
+- template rendering: ccew_form.html loops over the groups and choices;
+- the PDF transform: render_plan compiles it against the layout
+  (field_coordinates); pdf_sections(form_data) gives the same data as the
+  nested equipment / meters / tests dicts.
+
+Adding a meter or an equipment row is a schema change only.
+"""
+
+from collections import namedtuple
+
+TEXT = 'text'
+CHECKBOX = 'checkbox'
+CHOICE = 'choice'
+
+# One form field; pdf_key renames it for the PDF layout, fallback names the
+# prefilled key used when it is left empty
+Field = namedtuple('Field', 'key kind required choices pdf_key fallback')
+Field.__new__.__defaults__ = (TEXT, False, None, None, None)
+
+# Repeated fields: columns across instances. presence columns decide whether an
+# instance was filled in at all. label, placeholder and input_type (the HTML
+# input type) are for the template; an instance's placeholders, keyed by
+# column name, override the column's
+Instance = namedtuple('Instance', 'name pdf_key label placeholders')
+Instance.__new__.__defaults__ = (None, None, None)
+Column = namedtuple('Column', 'name pdf_key kind presence label placeholder choices input_type')
+Column.__new__.__defaults__ = (TEXT, False, None, None, None, 'text')
+
+# shape of the group in the PDF data: FLAT -> {'<instance>_<column>': value},
+# ROWS -> [{column: value}, ...], FLAGS -> {instance: True}
+FLAT = 'flat'
+ROWS = 'rows'
+FLAGS = 'flags'
+Group = namedtuple('Group', 'name key_format instances columns shape')
+
+YES_NO = ('Yes', 'No')
+ENERGY_PROVIDERS = ('Ausgrid', 'Endeavour Energy', 'Essential Energy')
+INSTALLATION_TYPES = ('Residential', 'Commercial', 'Industrial', 'Rural', 'Mixed Development')
+MASTER_SUB = (('N', 'N (Neither)'), ('M', 'M (Master)'), ('S', 'S (Sub)'))
+
+METER_COUNT = 8
+
+
+def _person_fields(prefix):
+    """Address and licence fields the form adds to the prefilled installer / tester"""
+    return [
+        Field(f'{prefix}_floor'),
+        Field(f'{prefix}_unit'),
+        Field(f'{prefix}_lot_rmb'),
+        Field(f'{prefix}_cross_street'),
+        Field(f'{prefix}_mobile_phone'),
+        Field(f'{prefix}_supervisor_no'),
+        Field(f'{prefix}_supervisor_expiry'),
+        Field(f'{prefix}_contractor_license', fallback=f'{prefix}_license_no'),
+        Field(f'{prefix}_contractor_expiry', fallback=f'{prefix}_license_expiry'),
+    ]
+
+
+FIELDS = [
+    # Installation Address
+    Field('nearest_cross_street'),
+    Field('pit_pillar_pole_no'),
+    Field('nmi'),
+    Field('meter_no'),
+    Field('aemo_provider_id'),
+
+    # Installation Details
+    Field('installation_type', CHOICE, required=True, choices=INSTALLATION_TYPES),
+    Field('installation_description'),
+    Field('work_type'),
+    Field('work_description'),
+
+    # Work carried out checkboxes
+    Field('work_new_work', CHECKBOX),
+    Field('work_installed_meter', CHECKBOX),
+    Field('work_network_connection', CHECKBOX),
+    Field('work_addition_alteration', CHECKBOX),
+    Field('work_advanced_meter', CHECKBOX),
+    Field('work_ev_connection', CHECKBOX),
+    Field('work_reinspection', CHECKBOX),
+    Field('non_compliance_no'),
+
+    # Special conditions checkboxes
+    Field('special_over_100_amps', CHECKBOX),
+    Field('special_hazardous_area', CHECKBOX),
+    Field('special_off_grid', CHECKBOX),
+    Field('special_high_voltage', CHECKBOX),
+    Field('special_unmetered', CHECKBOX),
+    Field('special_secondary_power', CHECKBOX),
+
+    # Electrical Work Details
+    Field('supply_type'),
+    Field('supply_phases'),
+    Field('supply_voltage'),
+    Field('supply_frequency'),
+    Field('earthing_type'),
+    Field('main_switch_rating'),
+    Field('rcd_rating'),
+    Field('circuit_details'),
+
+    # Testing
+    Field('test_date', required=True),
+    Field('insulation_test'),
+    Field('earth_continuity'),
+    Field('polarity_test'),
+    Field('rcd_test'),
+
+    # Load capacity
+    Field('load_increase', pdf_key='estimated_load_increase'),
+    Field('load_within_capacity', CHOICE, required=True, choices=YES_NO),
+    Field('work_connected', CHOICE, required=True, choices=YES_NO, pdf_key='work_connected_to_supply'),
+] + _person_fields('installer') + _person_fields('tester') + [
+
+    # Submit CCEW
+    Field('energy_provider', CHOICE, required=True, choices=ENERGY_PROVIDERS),
+    Field('meter_provider_email'),
+    Field('owner_email'),
+
+    # Dates
+    Field('date_work_completed'),
+    Field('date_work_tested'),
+
+    # Signature
+    Field('signature'),
+]
+
+GROUPS = [
+    Group('equipment', 'equip_{instance}{column}', [
+        Instance('switchboard', 'switchboard', 'Switchboard', {'_rating': 'e.g., 100A', '_number': '1'}),
+        Instance('circuits', 'circuits', 'Circuits', {'_rating': 'e.g., 20A', '_number': '10'}),
+        Instance('lighting', 'lighting', 'Lighting', {'_rating': 'e.g., 10A', '_number': '15'}),
+        Instance('sockets', 'socket_outlets', 'Socket Outlets', {'_rating': 'e.g., 10A', '_number': '20'}),
+        Instance('appliances', 'appliances', 'Appliances', {'_rating': 'e.g., 15A', '_number': '2'}),
+        Instance('generation', 'generation', 'Generation',
+                 {'_rating': 'e.g., 5kW', '_number': '1', '_particulars': 'Solar/Battery'}),
+        Instance('storage', 'storage', 'Storage',
+                 {'_rating': 'e.g., 10kWh', '_number': '1', '_particulars': 'Battery type'}),
+    ], [
+        Column('', 'checked', CHECKBOX, presence=True, label='Installed?'),
+        Column('_rating', 'rating', label='Rating'),
+        Column('_number', 'number', label='Number', input_type='number'),
+        Column('_particulars', 'particulars', label='Particulars', placeholder='Details'),
+    ], FLAT),
+
+    Group('meters', 'meter_{instance}{column}', [
+        Instance(str(i), label=f'Meter {i}') for i in range(1, METER_COUNT + 1)
+    ], [
+        Column('_i', 'type_i', CHECKBOX, presence=True, label='I (Installed)'),
+        Column('_r', 'type_r', CHECKBOX, presence=True, label='R (Removed)'),
+        Column('_e', 'type_e', CHECKBOX, presence=True, label='E (Existing)'),
+        Column('_number', 'meter_no', presence=True, label='Meter No.', placeholder='Meter number'),
+        Column('_dials', 'no_dials', label='No. Dials', placeholder='5'),
+        Column('_master_sub', 'master_sub_status', CHOICE, label='Master/Sub Status', choices=MASTER_SUB),
+        Column('_wired_as', 'wired_as_master_sub', label='Wired as Master/Sub', placeholder='Wiring config'),
+        Column('_register', 'register_no', label='Register No.', placeholder='Register no.'),
+        Column('_reading', 'reading', label='Reading', placeholder='Reading'),
+        Column('_tariff', 'tariff', label='Tariff', placeholder='Tariff'),
+    ], ROWS),
+
+    Group('tests', 'test_{instance}{column}', [
+        Instance('earthing', 'earthing_system', 'Earthing system integrity'),
+        Instance('rcd', 'rcd_operational', 'Residual current device operational'),
+        Instance('insulation', 'insulation_resistance', 'Insulation resistance Mohms'),
+        Instance('visual', 'visual_check', 'Visual check suitable for connection'),
+        Instance('polarity', 'polarity', 'Polarity'),
+        Instance('standalone', 'standalone_system', 'Stand-Alone system complies AS4509'),
+        Instance('current', 'correct_current_connections', 'Correct current connections'),
+        Instance('fault_loop', 'fault_loop_impedance', 'Fault loop impedance (if necessary)'),
+    ], [
+        Column('', None, CHECKBOX, presence=True),
+    ], FLAGS),
+]
+
+# At least one field of each set must be filled in (a prefilled fallback counts):
+# licence details accept either the supervisor or the contractor pair
+ONE_OF = [
+    ('installer_supervisor_no', 'installer_contractor_license'),
+    ('tester_supervisor_no', 'tester_contractor_license'),
+]
+
+FIELDS_BY_KEY = {field.key: field for field in FIELDS}
+GROUPS_BY_NAME = {group.name: group for group in GROUPS}
+
+
+def group_key(group, instance, column):
+    """Form key of one cell of a repeated group"""
+    return group.key_format.format(instance=instance.name, column=column.name)
+
+
+def _choice_values(choices):
+    return {choice[0] if isinstance(choice, tuple) else choice for choice in choices}
+
+
+def compile_schema(fields=FIELDS, groups=GROUPS, one_of=ONE_OF):
+    """
+    Compile the schema into flat tuples walked per request
+
+    Returns a dict with
+        keys      every form key, in form order
+        checks    (key, required, allowed values or None) for validation
+        one_of    (message, keys) sets of which one key must be filled in
+        renames   (key, pdf_key) for fields the layout names differently
+        fallbacks (key, prefilled key) for fields defaulting to prefilled data
+        groups    (group name, shape, rows): rows are
+                  (pdf_key, presence keys, ((form key, pdf column, kind), ...))
+    """
+    keys = []
+    checks = []
+    renames = []
+    fallbacks = []
+    for field in fields:
+        keys.append(field.key)
+        if field.required or field.choices:
+            checks.append((field.key, field.required, _choice_values(field.choices) if field.choices else None))
+        if field.pdf_key:
+            renames.append((field.key, field.pdf_key))
+        if field.fallback:
+            fallbacks.append((field.key, field.fallback))
+
+    compiled_groups = []
+    for group in groups:
+        rows = []
+        for instance in group.instances:
+            cells = []
+            presence = []
+            for column in group.columns:
+                key = group_key(group, instance, column)
+                keys.append(key)
+                cells.append((key, column.pdf_key, column.kind))
+                if column.presence:
+                    presence.append(key)
+                if column.choices:
+                    checks.append((key, False, _choice_values(column.choices)))
+            rows.append((instance.pdf_key or instance.name, tuple(presence), tuple(cells)))
+        compiled_groups.append((group.name, group.shape, tuple(rows)))
+
+    fallback_of = dict(fallbacks)
+    compiled_one_of = tuple(
+        (f"{' or '.join(keys)} is required",
+         tuple(k for key in keys for k in (key, fallback_of.get(key)) if k))
+        for keys in one_of
+    )
+
+    return {
+        'keys': tuple(dict.fromkeys(keys)),
+        'checks': tuple(checks),
+        'one_of': compiled_one_of,
+        'renames': tuple(renames),
+        'fallbacks': tuple(fallbacks),
+        'groups': tuple(compiled_groups),
+    }
+
+
+COMPILED_SCHEMA = compile_schema()
+FORM_KEYS = COMPILED_SCHEMA['keys']
+
+
+def extract_form_data(form, keys=FORM_KEYS):
+    """mobile_data from a submitted form: every schema key, '' when absent"""
+    get = form.get
+    return {key: get(key, '') for key in keys}
+
+
+def form_problems(form_data, compiled=COMPILED_SCHEMA):
+    """
+    Required fields left empty, values outside a field's choices and ONE_OF
+    sets with nothing filled in, as messages
+
+    form_data is the submission merged over the prefilled data, so prefilled
+    fallbacks count towards ONE_OF.
+    """
+    get = form_data.get
+    problems = []
+    for key, required, allowed in compiled['checks']:
+        value = get(key)
+        if not value:
+            if required:
+                problems.append(f"{key} is required")
+        elif allowed is not None and value not in allowed:
+            problems.append(f"{key} has unexpected value {value!r}")
+    for message, keys in compiled['one_of']:
+        if not any(get(key) for key in keys):
+            problems.append(message)
+    return problems
+
+
+def pdf_sections(form_data, compiled=COMPILED_SCHEMA):
+    """
+    The nested keys the PDF layout reads, to add on top of flat form_data
+
+    Nested equipment / meters / tests built from the groups, the renamed
+    fields and licence fields falling back to the prefilled SimPro values.
+    The submit path skips this dict and builds a render_plan.RenderPlan directly.
+    """
+    get = form_data.get
+    sections = {}
+    for name, shape, rows in compiled['groups']:
+        if shape == ROWS:
+            section = []
+        else:
+            section = {}
+        for pdf_key, presence, cells in rows:
+            if not any(get(key) for key in presence):
+                continue
+            if shape == FLAGS:
+                section[pdf_key] = True
+                continue
+            row = {}
+            for key, column, kind in cells:
+                row[column] = bool(get(key)) if kind == CHECKBOX else get(key, '')
+            if shape == ROWS:
+                section.append(row)
+            else:
+                section.update((f'{pdf_key}_{column}', value) for column, value in row.items())
+        sections[name] = section
+
+    for key, pdf_key in compiled['renames']:
+        sections[pdf_key] = get(key, '')
+    for key, fallback in compiled['fallbacks']:
+        if not get(key) and get(fallback):
+            sections[key] = get(fallback)
+    return sections
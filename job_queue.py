@@ -0,0 +1,219 @@
+"""
+Durable submission job queue backed by the sessions SQLite database
+
+submit_ccew enqueues a job and returns straight away; a background worker
+thread renders the PDF and hands the webhook call to the outbox. Job status
+moves through queued -> rendering -> rendered -> sent (set once the outbox
+delivers), or ends in failed.
+
+Jobs are claimed with a single UPDATE ... RETURNING, so several workers (and
+the threads of one JobWorker) can share the table. A job left in flight by a
+crashed worker (no finished_at and untouched for LEASE_SECONDS) is put back
+in the queue; the outbox keeps one message per job, so re-running a job that
+had already queued its webhook does not send it twice.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from ccew_logging import get_logger
+from session_store import delete_in_batches
+
+logger = get_logger('jobs')
+
+LEASE_SECONDS = 600
+POLL_INTERVAL = 2.0
+
+
+def init_jobs_table(db):
+    """Create the jobs table next to sessions"""
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            job_id TEXT PRIMARY KEY,
+            session_id TEXT,
+            status TEXT,
+            payload TEXT,
+            host_url TEXT,
+            pdf_path TEXT,
+            error TEXT,
+            attempts INTEGER DEFAULT 0,
+            created_at TEXT,
+            updated_at TEXT,
+            finished_at TEXT
+        )
+    ''')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)')
+
+
+def enqueue_job(db, session_id, payload, host_url):
+    """Queue a submission for background processing and return its job id"""
+    job_id = str(uuid.uuid4())
+    now = datetime.now().isoformat()
+    db.execute('''
+        INSERT INTO jobs (job_id, session_id, status, payload, host_url, created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (job_id, session_id, 'queued', json.dumps(payload), host_url, now, now))
+    db.commit()
+    return job_id
+
+
+def get_job(db, job_id):
+    """Get job status (without payload) from database"""
+    row = db.execute('''
+        SELECT job_id, session_id, status, pdf_path, error, attempts, created_at, updated_at, finished_at
+        FROM jobs WHERE job_id = ?
+    ''', (job_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def set_job_status(db, job_id, status, error=None):
+    """Record a status change made outside the worker, e.g. by the webhook outbox"""
+    now = datetime.now().isoformat()
+    db.execute('''
+        UPDATE jobs SET status = ?, error = ?, updated_at = ?, finished_at = COALESCE(finished_at, ?)
+        WHERE job_id = ?
+    ''', (status, error, now, now, job_id))
+    db.commit()
+
+
+def purge_jobs(db, before):
+    """Delete finished jobs created before the given datetime; returns the number deleted"""
+    return delete_in_batches(db, 'jobs', "status IN ('rendered', 'sent', 'failed') AND created_at < ?",
+                             (before.isoformat(),))
+
+
+class JobWorker:
+    """
+    Background threads that drain the jobs table
+
+    handler(job, progress) does the work for one job row. It may call
+    progress(status, pdf_path=None) to record intermediate states, and returns
+    the final status. An exception marks the job failed, except for
+    retry_exceptions, which put it back in the queue.
+
+    threads jobs are processed at a time, each thread claiming its own job on
+    its own connection; size it to the render pool so every render worker
+    process has a job to do.
+    """
+
+    def __init__(self, db_path, handler, retry_exceptions=(), poll_interval=POLL_INTERVAL, connect=None,
+                 threads=1):
+        self.db_path = db_path
+        self.connect = connect
+        self.handler = handler
+        self.retry_exceptions = retry_exceptions
+        self.poll_interval = poll_interval
+        self.threads = max(threads, 1)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the worker threads that are not already running"""
+        with self._lock:
+            if not any(thread.is_alive() for thread in self._threads):
+                self._stop.clear()
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            for i in range(len(self._threads), self.threads):
+                thread = threading.Thread(target=self._run, name=f'ccew-job-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def notify(self):
+        """Wake the idle worker threads after enqueueing a job"""
+        self._wake.set()
+
+    def _connect(self):
+        if self.connect is not None:
+            return self.connect(self.db_path)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _run(self):
+        conn = self._connect()
+        try:
+            while not self._stop.is_set():
+                try:
+                    worked = self.run_once(conn)
+                except Exception:
+                    logger.exception("job worker pass failed")
+                    worked = False
+                # Busy threads go straight back to claiming; idle ones wait for work
+                if not worked:
+                    self._wake.wait(self.poll_interval)
+                    self._wake.clear()
+        finally:
+            conn.close()
+
+    def _requeue_stale(self, conn):
+        cutoff = (datetime.now() - timedelta(seconds=LEASE_SECONDS)).isoformat()
+        conn.execute('''
+            UPDATE jobs SET status = 'queued', updated_at = ?
+            WHERE status IN ('rendering', 'rendered') AND finished_at IS NULL AND updated_at < ?
+        ''', (datetime.now().isoformat(), cutoff))
+        conn.commit()
+
+    def _claim(self, conn):
+        row = conn.execute('''
+            UPDATE jobs SET status = 'rendering', attempts = attempts + 1, updated_at = ?
+            WHERE job_id = (SELECT job_id FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1)
+              AND status = 'queued'
+            RETURNING *
+        ''', (datetime.now().isoformat(),)).fetchone()
+        conn.commit()
+        return row
+
+    def _set_status(self, conn, job_id, status, pdf_path=None, error=None, finished=False, keep_final=False):
+        now = datetime.now().isoformat()
+        conn.execute('''
+            UPDATE jobs
+            SET status = CASE WHEN :keep AND status IN ('sent', 'failed') THEN status ELSE :status END,
+                error = CASE WHEN :keep AND status IN ('sent', 'failed') THEN error ELSE :error END,
+                pdf_path = COALESCE(:pdf_path, pdf_path), updated_at = :now,
+                finished_at = CASE WHEN :finished THEN :now ELSE finished_at END
+            WHERE job_id = :job_id
+        ''', {'keep': keep_final, 'status': status, 'error': error, 'pdf_path': pdf_path,
+              'now': now, 'finished': finished, 'job_id': job_id})
+        conn.commit()
+
+    def run_once(self, conn=None):
+        """Process at most one queued job; returns True if one was claimed"""
+        own_conn = conn is None
+        if own_conn:
+            conn = self._connect()
+        try:
+            self._requeue_stale(conn)
+            job = self._claim(conn)
+            if job is None:
+                return False
+
+            def progress(status, pdf_path=None):
+                self._set_status(conn, job['job_id'], status, pdf_path=pdf_path)
+
+            try:
+                status = self.handler(job, progress)
+            except self.retry_exceptions as e:
+                self._set_status(conn, job['job_id'], 'queued', error=str(e))
+                time.sleep(self.poll_interval)
+            except Exception as e:
+                logger.exception("job failed", extra={'fields': {'job_id': job['job_id']}})
+                self._set_status(conn, job['job_id'], 'failed', error=str(e), finished=True)
+            else:
+                # The outbox may already have recorded sent/failed for this job
+                self._set_status(conn, job['job_id'], status, finished=True, keep_final=True)
+            return True
+        finally:
+            if own_conn:
+                conn.close()
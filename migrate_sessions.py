@@ -0,0 +1,88 @@
+"""
+Re-encode the JSON blobs of existing sessions with another session codec
+
+Rows are converted in small batches, one transaction each, so the app can
+keep running. Rows already in the target codec are left alone; afterwards
+free pages are handed back with an incremental vacuum.
+
+Usage:
+    python migrate_sessions.py --codec zlib
+    python migrate_sessions.py --codec json --db /path/to/ccew_sessions.db
+"""
+
+import argparse
+import os
+
+from session_codec import CODECS, check_codec, codec_of, decode, encode
+from session_store import DATABASE, SQLiteSessionStore
+
+# Table -> blob columns to re-encode
+BLOB_COLUMNS = {
+    'sessions': ('simpro_data', 'prefilled_data', 'mobile_data'),
+    'session_payloads': ('simpro_data',),
+}
+
+
+def migrate_table(db, table, columns, codec, batch_size=500):
+    """Re-encode one table's blob columns; returns (rows scanned, rows rewritten)"""
+    select = f"SELECT rowid, {', '.join(columns)} FROM {table} WHERE rowid > ? ORDER BY rowid LIMIT ?"
+    update = f"UPDATE {table} SET {', '.join(f'{c} = ?' for c in columns)} WHERE rowid = ?"
+    last_rowid = 0
+    scanned = rewritten = 0
+    while True:
+        rows = db.execute(select, (last_rowid, batch_size)).fetchall()
+        if not rows:
+            return scanned, rewritten
+        changes = []
+        for row in rows:
+            blobs = [row[c] for c in columns]
+            if any(blob is not None and codec_of(blob) != codec for blob in blobs):
+                changes.append([None if blob is None else encode(decode(blob), codec) for blob in blobs]
+                               + [row['rowid']])
+        if changes:
+            db.executemany(update, changes)
+        db.commit()
+        scanned += len(rows)
+        rewritten += len(changes)
+        last_rowid = rows[-1]['rowid']
+
+
+def migrate(store, codec, batch_size=500):
+    """Re-encode every session into codec; returns {table: (rows scanned, rows rewritten)}"""
+    db = store.connection()
+    return {table: migrate_table(db, table, columns, codec, batch_size)
+            for table, columns in BLOB_COLUMNS.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', default=DATABASE, help='sessions database (default: %(default)s)')
+    parser.add_argument('--codec', required=True, choices=CODECS, help='codec to re-encode into')
+    parser.add_argument('--batch', type=int, default=500, help='rows per transaction (default: %(default)s)')
+    args = parser.parse_args()
+    try:
+        check_codec(args.codec)
+    except ValueError as e:
+        parser.error(str(e))
+
+    store = SQLiteSessionStore(args.db, codec=args.codec)
+    store.init()
+    size_before = os.path.getsize(args.db)
+    counts = migrate(store, args.codec, args.batch)
+    freed = 0
+    while True:
+        pages = store.vacuum()
+        if not pages:
+            break
+        freed += pages
+    store.connection().execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    size_after = os.path.getsize(args.db)
+
+    for table, (scanned, rewritten) in counts.items():
+        print(f"{table}: re-encoded {rewritten} of {scanned} rows as {args.codec}")
+    print(f"Freed {freed} pages")
+    print(f"Database size: {size_before / 1048576:.2f} MB -> {size_after / 1048576:.2f} MB")
+
+
+if __name__ == '__main__':
+    main()
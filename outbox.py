@@ -0,0 +1,257 @@
+"""
+Durable webhook outbox backed by the sessions SQLite database
+
+Webhook calls are written to the outbox table and delivered by a background
+dispatcher, so a failed or slow Make.com call is retried rather than lost.
+Message status moves pending -> sending -> sent; a message that still fails
+after max_attempts is dead-lettered (status 'dead') and can be replayed with
+replay_dead(). Each job has at most one message, so a job re-run after a
+crash does not call the webhook twice.
+
+Retries back off exponentially with jitter: attempt n waits a random time
+between half and all of min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (n - 1)) seconds.
+
+Configuration (environment):
+    CCEW_OUTBOX_BATCH         messages claimed per dispatcher pass (default: 10)
+    CCEW_OUTBOX_MAX_ATTEMPTS  attempts before dead-lettering (default: 8)
+"""
+
+import os
+import random
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from ccew_logging import get_logger
+from session_store import delete_in_batches
+
+logger = get_logger('outbox')
+
+BACKOFF_BASE = 5
+BACKOFF_MAX = 3600
+LEASE_SECONDS = 300
+POLL_INTERVAL = 2.0
+
+
+def init_outbox_table(db):
+    """Create the outbox table next to sessions"""
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS outbox (
+            message_id TEXT PRIMARY KEY,
+            job_id TEXT,
+            session_id TEXT,
+            url TEXT,
+            payload TEXT,
+            status TEXT,
+            attempts INTEGER DEFAULT 0,
+            next_attempt_at TEXT,
+            last_error TEXT,
+            created_at TEXT,
+            updated_at TEXT,
+            sent_at TEXT
+        )
+    ''')
+    if 'sent_at' not in [column[1] for column in db.execute('PRAGMA table_info(outbox)')]:
+        db.execute('ALTER TABLE outbox ADD COLUMN sent_at TEXT')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_attempt_at)')
+    # Tables from before the unique index may hold repeat messages for a job; keep the first
+    db.execute('''
+        DELETE FROM outbox WHERE job_id IS NOT NULL AND rowid NOT IN (
+            SELECT MIN(rowid) FROM outbox WHERE job_id IS NOT NULL GROUP BY job_id
+        )
+    ''')
+    db.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_outbox_job ON outbox (job_id) WHERE job_id IS NOT NULL')
+
+
+def enqueue_message(db, job_id, session_id, url, payload):
+    """
+    Add a webhook call (payload is a JSON string) to the outbox and return its message id
+
+    A job that already has a message keeps it, whatever its status, and its
+    id is returned instead.
+    """
+    now = datetime.now().isoformat()
+    row = db.execute('''
+        INSERT INTO outbox (message_id, job_id, session_id, url, payload, status, next_attempt_at, created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, 'pending', ?, ?, ?)
+        ON CONFLICT (job_id) WHERE job_id IS NOT NULL DO NOTHING
+        RETURNING message_id
+    ''', (str(uuid.uuid4()), job_id, session_id, url, payload, now, now, now)).fetchone()
+    if row is None:
+        row = db.execute('SELECT message_id FROM outbox WHERE job_id = ?', (job_id,)).fetchone()
+    db.commit()
+    return row[0]
+
+
+def backoff_seconds(attempts):
+    """Delay before retrying a message that has failed attempts times"""
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempts - 1))
+    return random.uniform(delay / 2, delay)
+
+
+def list_dead(db, limit=100):
+    """Dead-lettered messages (without payload), oldest first"""
+    rows = db.execute('''
+        SELECT message_id, job_id, session_id, attempts, last_error, created_at, updated_at
+        FROM outbox WHERE status = 'dead' ORDER BY created_at LIMIT ?
+    ''', (limit,)).fetchall()
+    return [dict(row) for row in rows]
+
+
+def replay_dead(db, message_ids=None):
+    """
+    Put dead-lettered messages back in the queue with a fresh attempt budget
+
+    Replays every dead message, or only those in message_ids. Returns the
+    replayed (message_id, job_id) pairs.
+    """
+    now = datetime.now().isoformat()
+    sql = '''
+        UPDATE outbox SET status = 'pending', attempts = 0, next_attempt_at = ?, updated_at = ?
+        WHERE status = 'dead'
+    '''
+    params = [now, now]
+    if message_ids is not None:
+        if not message_ids:
+            return []
+        sql += f" AND message_id IN ({', '.join('?' * len(message_ids))})"
+        params.extend(message_ids)
+    rows = db.execute(sql + ' RETURNING message_id, job_id', params).fetchall()
+    db.commit()
+    return [(row[0], row[1]) for row in rows]
+
+
+def purge_sent(db, before):
+    """Delete messages delivered before the given datetime; returns the number deleted"""
+    # Rows delivered before sent_at existed were last updated when they were sent
+    return delete_in_batches(db, 'outbox', "status = 'sent' AND COALESCE(sent_at, updated_at) < ?",
+                             (before.isoformat(),))
+
+
+class OutboxDispatcher:
+    """
+    Background thread that delivers outbox messages in batches
+
+    send(message) performs one delivery and raises on failure. on_result(conn,
+    message, status, error) is called after a message is sent or
+    dead-lettered, on the dispatcher's own connection.
+    """
+
+    def __init__(self, db_path, send, on_result=None, batch_size=None, max_attempts=None,
+                 poll_interval=POLL_INTERVAL, connect=None):
+        if batch_size is None:
+            batch_size = int(os.environ.get('CCEW_OUTBOX_BATCH', 10))
+        if max_attempts is None:
+            max_attempts = int(os.environ.get('CCEW_OUTBOX_MAX_ATTEMPTS', 8))
+        self.db_path = db_path
+        self.connect = connect
+        self.send = send
+        self.on_result = on_result
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the dispatcher thread if it is not already running"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='ccew-outbox', daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def notify(self):
+        """Wake the dispatcher after enqueueing a message"""
+        self._wake.set()
+
+    def _connect(self):
+        if self.connect is not None:
+            return self.connect(self.db_path)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _run(self):
+        conn = self._connect()
+        try:
+            while not self._stop.is_set():
+                try:
+                    sent = self.run_once(conn)
+                except Exception:
+                    logger.exception("outbox dispatcher pass failed")
+                    sent = 0
+                # A full batch means more may be due; otherwise wait for work
+                if sent < self.batch_size:
+                    self._wake.wait(self.poll_interval)
+                    self._wake.clear()
+        finally:
+            conn.close()
+
+    def _claim(self, conn):
+        now = datetime.now()
+        stale = (now - timedelta(seconds=LEASE_SECONDS)).isoformat()
+        now = now.isoformat()
+        rows = conn.execute('''
+            UPDATE outbox SET status = 'sending', attempts = attempts + 1, updated_at = ?
+            WHERE message_id IN (
+                SELECT message_id FROM outbox
+                WHERE (status = 'pending' AND next_attempt_at <= ?)
+                   OR (status = 'sending' AND updated_at < ?)
+                ORDER BY next_attempt_at LIMIT ?
+            )
+            RETURNING *
+        ''', (now, now, stale, self.batch_size)).fetchall()
+        conn.commit()
+        return rows
+
+    def _finish(self, conn, message, status, error=None):
+        now = datetime.now()
+        next_attempt_at = None
+        if status == 'pending':
+            next_attempt_at = (now + timedelta(seconds=backoff_seconds(message['attempts']))).isoformat()
+        now = now.isoformat()
+        conn.execute('''
+            UPDATE outbox SET status = ?, last_error = ?, next_attempt_at = COALESCE(?, next_attempt_at), updated_at = ?,
+                sent_at = CASE WHEN ? = 'sent' THEN ? ELSE sent_at END
+            WHERE message_id = ?
+        ''', (status, error, next_attempt_at, now, status, now, message['message_id']))
+        conn.commit()
+        if status != 'pending' and self.on_result is not None:
+            self.on_result(conn, message, status, error)
+
+    def run_once(self, conn=None):
+        """Deliver one batch of due messages; returns the number claimed"""
+        own_conn = conn is None
+        if own_conn:
+            conn = self._connect()
+        try:
+            batch = self._claim(conn)
+            for message in batch:
+                try:
+                    self.send(message)
+                except Exception as e:
+                    error = str(e)
+                    fields = {'message_id': message['message_id'], 'job_id': message['job_id'],
+                              'attempts': message['attempts'], 'error': error}
+                    if message['attempts'] >= self.max_attempts:
+                        logger.error("outbox message dead-lettered", extra={'fields': fields})
+                        self._finish(conn, message, 'dead', error)
+                    else:
+                        logger.warning("outbox delivery failed, will retry", extra={'fields': fields})
+                        self._finish(conn, message, 'pending', error)
+                else:
+                    self._finish(conn, message, 'sent')
+            return len(batch)
+        finally:
+            if own_conn:
+                conn.close()
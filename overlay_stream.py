@@ -0,0 +1,166 @@
+"""
+Precompiled overlay content streams for the CCEW PDF generator
+
+The invariant parts of every overlay page - font resources, per-font Tf
+operators and the white box drawn behind the energy provider - are built once
+per process from field_coordinates.LAYOUT. Each request then only emits the
+variable text operators, encoded the same way ReportLab's drawString would
+(WinAnsi with Symbol/ZapfDingbats substitution for missing glyphs).
+
+apply() appends those operators straight onto a template page's content array,
+skipping both the ReportLab canvas round-trip and pypdf's merge_page.
+
+Note: append() registers its streams with PdfWriter._add_object, a private
+pypdf API. It is stable in the pypdf==4.0.1 pinned in requirements.txt;
+recheck it (and test_overlay_engines.py) before upgrading pypdf.
+"""
+
+from pypdf import PageObject
+from pypdf.generic import ArrayObject, DecodedStreamObject, DictionaryObject, IndirectObject, NameObject
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.rl_accel import escapePDF, fp_str
+from reportlab.pdfbase import pdfmetrics
+
+from field_coordinates import DEFAULT_FONT, LAYOUT, iter_page_ops
+
+
+class OverlayFragments:
+    """Per-process cache of overlay content-stream fragments and resources"""
+
+    def __init__(self, layout=LAYOUT):
+        fonts = [DEFAULT_FONT] + [spec.font for spec in layout]
+
+        # Resource names for every layout font plus its substitution fonts
+        self.font_resources = {}
+        for font_name, _ in fonts:
+            font = pdfmetrics.getFont(font_name)
+            for f in [font] + font.substitutionFonts:
+                if f.fontName not in self.font_resources:
+                    self.font_resources[f.fontName] = f'/F{len(self.font_resources) + 1}'
+
+        font_dict = DictionaryObject()
+        for font_name, resource_name in self.font_resources.items():
+            entry = DictionaryObject({
+                NameObject('/Type'): NameObject('/Font'),
+                NameObject('/Subtype'): NameObject('/Type1'),
+                NameObject('/BaseFont'): NameObject('/' + font_name),
+            })
+            if pdfmetrics.getFont(font_name).encName == 'WinAnsiEncoding':
+                entry[NameObject('/Encoding')] = NameObject('/WinAnsiEncoding')
+            font_dict[NameObject(resource_name)] = entry
+        self.resources = DictionaryObject({
+            NameObject('/Font'): font_dict,
+            NameObject('/ProcSet'): ArrayObject([NameObject('/PDF'), NameObject('/Text')]),
+        })
+
+        self._font_ops = {}
+        for font in fonts:
+            self._font_op(*font)
+
+        # Black fill for text; ReportLab emits the same before the first string
+        self.prologue = b'0 0 0 rg\n'
+
+        self._boxes = {spec.box: self._box_op(spec.box) for spec in layout if spec.box}
+
+    def _font_op(self, font_name, size):
+        key = (font_name, size)
+        op = self._font_ops.get(key)
+        if op is None:
+            op = self._font_ops[key] = f'{self.font_resources[font_name]} {fp_str(size)} Tf'
+        return op
+
+    @staticmethod
+    def _box_op(box):
+        # White box with black outline to replicate an empty field, then back to black text
+        return f'1 1 1 rg\n0 0 0 RG\nn {fp_str(*box)} re B*\n0 0 0 rg\n'.encode('latin-1')
+
+    def box(self, box):
+        """Return the cached drawing operators for a white field box"""
+        op = self._boxes.get(box)
+        if op is None:
+            op = self._boxes[box] = self._box_op(box)
+        return op
+
+    def text(self, x, y, text, font=DEFAULT_FONT):
+        """Return the text operators for one drawString(x, y, text)"""
+        font_name, size = font
+        tf = self._font_op(font_name, size)
+        if text.isascii():
+            shown = f'({escapePDF(text.encode("latin-1"))}) Tj'
+        else:
+            base = pdfmetrics.getFont(font_name)
+            parts = []
+            current = base
+            for f, chunk in pdfmetrics.unicode2T1(text, [base] + base.substitutionFonts):
+                if f is not current:
+                    parts.append(self._font_op(f.fontName, size))
+                    current = f
+                parts.append(f'({escapePDF(chunk)}) Tj')
+            shown = ' '.join(parts)
+        return f'BT {tf} 1 0 0 1 {fp_str(x, y)} Tm {shown} ET\n'.encode('latin-1')
+
+    def content(self, form_data, page_num):
+        """Return the complete overlay content stream for one page"""
+        out = [self.prologue]
+        for op in iter_page_ops(form_data, page_num):
+            if op.box:
+                out.append(self.box(op.box))
+            out.append(self.text(op.x, op.y, op.text, op.font))
+        return b''.join(out)
+
+    def page(self, form_data, page_num, pagesize=A4):
+        """Return a standalone overlay PageObject sharing the cached resources"""
+        page = PageObject.create_blank_page(width=pagesize[0], height=pagesize[1])
+        page[NameObject('/Resources')] = self.resources
+        stream = DecodedStreamObject()
+        stream.set_data(self.content(form_data, page_num))
+        page[NameObject('/Contents')] = stream
+        return page
+
+    def apply(self, page, writer, form_data, page_num):
+        """
+        Append the overlay for page_num directly to a writer-owned template page
+
+        Returns False (page untouched) if the template already uses one of our
+        font resource names, so the caller can fall back to merge_page.
+        """
+        return self.append(page, writer, self.content(form_data, page_num))
+
+    def append(self, page, writer, content):
+        """
+        Append overlay operators to a writer-owned page, adding our font resources
+
+        The page's own content is wrapped in q/Q so its graphics state cannot
+        leak into the overlay. Returns False (page untouched) on a font
+        resource name clash.
+        """
+        resources = page[NameObject('/Resources')].get_object()
+        fonts = resources.get('/Font')
+        fonts = DictionaryObject() if fonts is None else fonts.get_object()
+        our_fonts = self.resources['/Font']
+        if any(name in fonts and fonts[name].get_object() != our_fonts[name] for name in our_fonts):
+            return False
+        for name, font in our_fonts.items():
+            fonts[NameObject(name)] = font
+        resources[NameObject('/Font')] = fonts
+
+        original = page.raw_get('/Contents') if '/Contents' in page else None
+        if original is None:
+            original = []
+        elif isinstance(original.get_object(), ArrayObject):
+            original = list(original.get_object())
+        elif isinstance(original, IndirectObject):
+            original = [original]
+        else:
+            original = [writer._add_object(original)]
+
+        save, restore = DecodedStreamObject(), DecodedStreamObject()
+        save.set_data(b'q\n')
+        restore.set_data(b'Q\n' + content)
+        page[NameObject('/Contents')] = ArrayObject(
+            [writer._add_object(save)] + original + [writer._add_object(restore)]
+        )
+        return True
+
+
+overlay_fragments = OverlayFragments()
@@ -0,0 +1,214 @@
+"""
+Content-addressed store for rendered CCEW PDFs
+
+Rendered PDFs are kept by the SHA-256 of their bytes, sharded on the first
+two hex digits so no directory grows too large:
+
+    <root>/objects/1b/1ba5c43d....pdf
+    <root>/tmp/                         renders in progress
+
+A render is written to its own file under tmp/ and renamed into place
+(atomic within one filesystem), so readers never see a partial PDF and two
+submissions for the same job can no longer overwrite each other. Rendering
+identical content again finds the existing object and only records another
+reference to it.
+
+The index lives in two tables next to sessions:
+
+    pdf_objects  hash -> size, created_at, last_access
+    pdf_refs     job_id -> session_id, hash, filename
+
+Disk use is bounded: after every add, the least recently used objects
+(last_access is bumped whenever one is served) are deleted, with their refs,
+until the total fits in max_bytes.
+
+Configuration (environment):
+    CCEW_PDF_STORE_DIR     root directory (default: /tmp/ccew_pdfs)
+    CCEW_PDF_STORE_MAX_MB  disk budget for stored PDFs (default: 1024)
+"""
+
+import hashlib
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+# Leftover renders in tmp/ older than this are removed at startup
+STALE_TMP_SECONDS = 3600
+
+
+def init_pdf_tables(db):
+    """Create the PDF store index tables next to sessions"""
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS pdf_objects (
+            hash TEXT PRIMARY KEY,
+            size INTEGER,
+            created_at TEXT,
+            last_access TEXT
+        )
+    ''')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_pdf_objects_access ON pdf_objects (last_access)')
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS pdf_refs (
+            job_id TEXT PRIMARY KEY,
+            session_id TEXT,
+            hash TEXT,
+            filename TEXT,
+            created_at TEXT
+        )
+    ''')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_pdf_refs_hash ON pdf_refs (hash)')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_pdf_refs_session ON pdf_refs (session_id, created_at)')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_pdf_refs_filename ON pdf_refs (filename, created_at)')
+
+
+def _hash_file(path):
+    """(sha256 hex digest, size) of a file"""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+class PDFStore:
+    """Hash-keyed PDF files on disk, indexed in SQLite, with size-bounded LRU eviction"""
+
+    def __init__(self, root=None, max_bytes=None):
+        if root is None:
+            root = os.environ.get('CCEW_PDF_STORE_DIR', '/tmp/ccew_pdfs')
+        if max_bytes is None:
+            max_bytes = int(float(os.environ.get('CCEW_PDF_STORE_MAX_MB', 1024)) * 1024 * 1024)
+        self.root = root
+        self.max_bytes = max_bytes
+        self.objects_dir = os.path.join(root, 'objects')
+        self.tmp_dir = os.path.join(root, 'tmp')
+        # Serializes renames and evictions within this process
+        self._lock = threading.Lock()
+        self.added = 0
+        self.deduplicated = 0
+        self.evicted = 0
+
+    def init(self, db):
+        """Create the directories and index tables; clear out stale temporary renders"""
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        init_pdf_tables(db)
+        cutoff = time.time() - STALE_TMP_SECONDS
+        for entry in os.scandir(self.tmp_dir):
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                self.discard(entry.path)
+
+    def temp_path(self):
+        """A fresh path under tmp/ to render into before add()"""
+        return os.path.join(self.tmp_dir, f'{uuid.uuid4().hex}.pdf')
+
+    @staticmethod
+    def discard(path):
+        """Remove a temporary render, if it exists"""
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], f'{digest}.pdf')
+
+    def add(self, db, tmp_path, job_id, session_id, filename):
+        """
+        Move a rendered PDF into the store and point job_id at it
+
+        tmp_path should come from temp_path(). If an object with the same
+        content exists, the temporary file is dropped instead. Returns the hash.
+        """
+        digest, size = _hash_file(tmp_path)
+        path = self.object_path(digest)
+        now = datetime.now().isoformat()
+        with self._lock:
+            if os.path.exists(path):
+                self.discard(tmp_path)
+                self.deduplicated += 1
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+                self.added += 1
+            db.execute('''
+                INSERT INTO pdf_objects (hash, size, created_at, last_access) VALUES (?, ?, ?, ?)
+                ON CONFLICT (hash) DO UPDATE SET last_access = excluded.last_access
+            ''', (digest, size, now, now))
+            db.execute('''
+                INSERT OR REPLACE INTO pdf_refs (job_id, session_id, hash, filename, created_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (job_id, session_id, digest, filename, now))
+            db.commit()
+            self._evict(db, keep=digest)
+        return digest
+
+    def get(self, db, digest):
+        """Path of a stored PDF (marking it recently used), or None if it is not stored"""
+        if db.execute('SELECT 1 FROM pdf_objects WHERE hash = ?', (digest,)).fetchone() is None:
+            return None
+        path = self.object_path(digest)
+        if not os.path.exists(path):
+            return None
+        db.execute('UPDATE pdf_objects SET last_access = ? WHERE hash = ?', (datetime.now().isoformat(), digest))
+        db.commit()
+        return path
+
+    def ref(self, db, job_id):
+        """{'hash', 'filename', 'session_id'} of a job's PDF, or None"""
+        row = db.execute('SELECT hash, filename, session_id FROM pdf_refs WHERE job_id = ?', (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def latest(self, db, session_id=None, filename=None):
+        """Hash of the newest PDF for a session or with a filename, or None"""
+        column, value = ('session_id', session_id) if session_id is not None else ('filename', filename)
+        row = db.execute(f'''
+            SELECT hash FROM pdf_refs WHERE {column} = ? ORDER BY created_at DESC LIMIT 1
+        ''', (value,)).fetchone()
+        return row[0] if row else None
+
+    def evict(self, db):
+        """Delete least recently used objects until the store fits max_bytes; returns the count"""
+        with self._lock:
+            return self._evict(db)
+
+    def _evict(self, db, keep=None):
+        total = db.execute('SELECT COALESCE(SUM(size), 0) FROM pdf_objects').fetchone()[0]
+        if total <= self.max_bytes:
+            return 0
+        victims = []
+        for digest, size in db.execute('SELECT hash, size FROM pdf_objects ORDER BY last_access'):
+            if total <= self.max_bytes:
+                break
+            if digest == keep:
+                continue
+            victims.append(digest)
+            total -= size
+        for digest in victims:
+            path = self.object_path(digest)
+            self.discard(path)
+            try:
+                os.rmdir(os.path.dirname(path))
+            except OSError:
+                pass  # shard still holds other objects
+            db.execute('DELETE FROM pdf_objects WHERE hash = ?', (digest,))
+            db.execute('DELETE FROM pdf_refs WHERE hash = ?', (digest,))
+        db.commit()
+        self.evicted += len(victims)
+        return len(victims)
+
+    def stats(self, db):
+        """Object count and disk use, plus this process's add / dedup / eviction counters"""
+        objects, total = db.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM pdf_objects').fetchone()
+        return {
+            'objects': objects,
+            'bytes': total,
+            'max_bytes': self.max_bytes,
+            'added': self.added,
+            'deduplicated': self.deduplicated,
+            'evicted': self.evicted,
+        }
@@ -0,0 +1,80 @@
+"""
+Background reaper that keeps ccew_sessions.db from growing forever
+
+Every interval it expires sessions past their status's TTL
+(session_store.SESSION_TTLS), purges finished jobs and delivered outbox
+messages older than the job TTL, then hands freed pages back with an
+incremental vacuum. All deletes run in small batches (see
+session_store.delete_in_batches).
+
+Configuration (environment):
+    CCEW_REAP_INTERVAL   seconds between passes (default: 3600)
+    CCEW_JOB_TTL_DAYS    days to keep finished jobs and sent webhooks (default: 30)
+"""
+
+import os
+import threading
+from datetime import datetime, timedelta
+
+from ccew_logging import get_logger
+from job_queue import purge_jobs
+from outbox import purge_sent
+
+logger = get_logger('reaper')
+
+
+class Reaper:
+    """Periodic expiry and compaction for a SQLiteSessionStore"""
+
+    def __init__(self, store, interval=None, job_ttl=None):
+        if interval is None:
+            interval = float(os.environ.get('CCEW_REAP_INTERVAL', 3600))
+        if job_ttl is None:
+            job_ttl = timedelta(days=float(os.environ.get('CCEW_JOB_TTL_DAYS', 30)))
+        self.store = store
+        self.interval = interval
+        self.job_ttl = job_ttl
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the reaper thread if it is not already running"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='ccew-reaper', daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("reaper pass failed")
+            self._stop.wait(self.interval)
+
+    def run_once(self, now=None):
+        """One expiry + vacuum pass; returns counts of what was removed"""
+        now = now or datetime.now()
+        db = self.store.connection()
+        stats = {
+            'sessions': self.store.expire(now=now),
+            'jobs': purge_jobs(db, now - self.job_ttl),
+            'outbox': purge_sent(db, now - self.job_ttl),
+        }
+        # Vacuum in chunks so each write lock stays short
+        stats['pages_freed'] = 0
+        while True:
+            freed = self.store.vacuum()
+            stats['pages_freed'] += freed
+            if not freed:
+                break
+        if any(stats.values()):
+            logger.info("reaper removed", extra={'fields': stats})
+        return stats
@@ -0,0 +1,88 @@
+"""
+Regenerate CCEW PDFs for historic submissions in the sessions table
+
+Run after coordinate/layout changes to rebuild certificates in bulk. All
+documents share one parsed template; results go to a directory and/or zip.
+
+Usage:
+    python regenerate_pdfs.py --out regenerated/
+    python regenerate_pdfs.py --zip ccew_2025_11.zip --since 2025-11-01
+"""
+
+import argparse
+import sqlite3
+import zlib
+
+from ccew_logging import get_logger
+from pdf_generator import OVERLAY_ENGINES, generate_ccew_pdfs
+from render_plan import build_render_plan
+from session_codec import decode
+from session_store import DATABASE
+
+logger = get_logger('regenerate')
+
+
+def iter_submissions(db_path, status='submitted', since=None, skipped=None):
+    """
+    Yield render-ready form data for every matching session, one row at a time
+
+    A row whose data cannot be decoded is logged and skipped; when skipped is
+    a list, (session_id, error) is appended to it for the run's report.
+    """
+    db = sqlite3.connect(db_path)
+    db.row_factory = sqlite3.Row
+    query = 'SELECT session_id, prefilled_data, mobile_data FROM sessions WHERE status = ?'
+    params = [status]
+    if since:
+        query += ' AND created_at >= ?'
+        params.append(since)
+    try:
+        for row in db.execute(query + ' ORDER BY created_at', params):
+            try:
+                all_data = {**decode(row['prefilled_data']), **decode(row['mobile_data'])}
+            except (ValueError, TypeError, zlib.error) as e:
+                logger.warning("undecodable session skipped", extra={'fields': {
+                    'session_id': row['session_id'], 'error': str(e)}})
+                if skipped is not None:
+                    skipped.append((row['session_id'], str(e)))
+                continue
+            yield build_render_plan(all_data)
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', default=DATABASE, help='sessions database (default: %(default)s)')
+    parser.add_argument('--out', help='directory to write one PDF per session into')
+    parser.add_argument('--zip', help='zip archive to write all PDFs into')
+    parser.add_argument('--status', default='submitted', help='session status to select (default: %(default)s)')
+    parser.add_argument('--since', help='only sessions created on/after this ISO date')
+    parser.add_argument('--engine', choices=OVERLAY_ENGINES, help='PDF engine (default: CCEW_OVERLAY_ENGINE or stream)')
+    args = parser.parse_args()
+    if not args.out and not args.zip:
+        parser.error('give --out and/or --zip')
+
+    skipped = []
+    stats = generate_ccew_pdfs(
+        iter_submissions(args.db, args.status, args.since, skipped),
+        output_dir=args.out,
+        zip_path=args.zip,
+        engine=args.engine,
+    )
+    stats['skipped'] = skipped
+
+    print(f"Generated {stats['count']} PDFs ({stats['bytes'] / 1048576:.1f} MB) "
+          f"in {stats['seconds']:.1f}s - {stats['per_second']:.1f} PDFs/s")
+    if stats['failed']:
+        print(f"{stats['failed']} failed:")
+        for index, error in stats['errors']:
+            print(f"  #{index}: {error}")
+    if stats['skipped']:
+        print(f"{len(stats['skipped'])} skipped (undecodable session data):")
+        for session_id, error in stats['skipped']:
+            print(f"  {session_id}: {error}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Single-pass transform from submitted form data to a RenderPlan
+
+The PDF layout (field_coordinates.LAYOUT) names nested keys - equipment.*,
+meters, tests.* - and a few renamed ones, while the web form submits flat
+keys (form_schema). Rather than building that nested dict and walking it per
+page, the layout and the schema are compiled together once at import: every
+layout slot knows which flat form keys feed it. build_render_plan then makes
+one pass over those slots and emits the DrawOps for each page.
+
+The resulting RenderPlan (a tuple of DrawOps per page) is what the render
+engines draw: iter_page_ops yields its ops as they are, and it pickles small
+for the render pool.
+"""
+
+from field_coordinates import (
+    BOOLEAN_CHOICE, CHECKBOX, LAYOUT, PAGE_COUNT, DrawOp, RenderPlan, cell_field, spec_ops,
+)
+from form_schema import COMPILED_SCHEMA, FLAGS, FLAT, ROWS
+
+# Slot sources
+FIELD = 'field'      # (spec, form key, fallback key or None)
+CELL = 'cell'        # (spec, presence keys, form key, form kind): one equipment-style cell
+FLAG = 'flag'        # (spec, presence keys): a test-style tick
+TABLE = 'table'      # (spec, rows): rows of (presence keys, ((form key, layout column), ...))
+
+
+def _group_sources(compiled):
+    """Index the schema's groups by the nested layout key they fill"""
+    sources = {}
+    for name, shape, rows in compiled['groups']:
+        if shape == FLAT:
+            for pdf_key, presence, cells in rows:
+                for key, column, kind in cells:
+                    sources[f'{name}.{pdf_key}_{column}'] = (CELL, presence, key, kind)
+        elif shape == FLAGS:
+            for pdf_key, presence, _ in rows:
+                sources[f'{name}.{pdf_key}'] = (FLAG, presence)
+        elif shape == ROWS:
+            sources[name] = (TABLE, rows)
+    return sources
+
+
+def _table_rows(spec, rows):
+    """Pair each group row's form keys with the layout columns they fill"""
+    columns = spec.options['columns']
+    compiled = []
+    for _, presence, cells in rows:
+        by_column = {column: key for key, column, _ in cells}
+        compiled.append((presence, tuple(
+            (by_column[column.key], column) for column in columns if column.key in by_column
+        )))
+    return tuple(compiled)
+
+
+def compile_render_plan(layout=LAYOUT, compiled=COMPILED_SCHEMA):
+    """
+    Compile layout + schema into one slot list per page
+
+    Each slot is (source kind, spec, ...) as described at the top of this module.
+    """
+    renamed = {pdf_key: key for key, pdf_key in compiled['renames']}
+    fallbacks = dict(compiled['fallbacks'])
+    groups = _group_sources(compiled)
+    pages = [[] for _ in range(PAGE_COUNT)]
+    for spec in layout:
+        slots = pages[spec.page]
+        source = groups.get(spec.key)
+        if source is None:
+            if '.' in spec.key:
+                continue  # nested key no form field feeds
+            key = renamed.get(spec.key, spec.key)
+            slots.append((FIELD, spec, key, fallbacks.get(key)))
+        elif source[0] == TABLE:
+            slots.append((TABLE, spec, _table_rows(spec, source[1])))
+        else:
+            slots.append((source[0], spec) + source[1:])
+    return tuple(tuple(slots) for slots in pages)
+
+
+COMPILED_PLAN = compile_render_plan()
+
+
+def _table_ops(spec, rows, get):
+    """Draw the filled rows of a row table on consecutive row positions"""
+    row_ys = spec.options['rows']
+    row_index = 0
+    for presence, cells in rows:
+        if row_index == len(row_ys):
+            break
+        if not any(get(key) for key in presence):
+            continue
+        row_y = row_ys[row_index]
+        for key, column in cells:
+            value = get(key)
+            if not value:
+                continue
+            field = cell_field(spec, row_index, column)
+            if column.kind == CHECKBOX:
+                yield DrawOp(column.x, row_y, 'X', spec.font, None, field, True)
+            else:
+                text = column.transform(value) if column.transform else str(value)
+                yield DrawOp(column.x, row_y, text, spec.font, None, field, False)
+        row_index += 1
+
+
+def build_render_plan(form_data, compiled=COMPILED_PLAN):
+    """Flat submitted form data (prefilled + mobile) -> RenderPlan, in one pass"""
+    get = form_data.get
+    pages = []
+    for slots in compiled:
+        ops = []
+        for slot in slots:
+            source, spec = slot[0], slot[1]
+            if source == FIELD:
+                value = get(slot[2])
+                if not value and slot[3]:
+                    value = get(slot[3])
+                # Only a yes/no choice can draw for a falsy value (0 -> "no")
+                if value or (spec.kind == BOOLEAN_CHOICE and value is not None):
+                    ops.extend(spec_ops(spec, value))
+            elif source == CELL:
+                if any(get(key) for key in slot[2]):
+                    value = get(slot[3])
+                    ops.extend(spec_ops(spec, bool(value) if slot[4] == CHECKBOX else value))
+            elif source == FLAG:
+                if any(get(key) for key in slot[2]):
+                    ops.extend(spec_ops(spec, True))
+            else:
+                ops.extend(_table_ops(spec, slot[2], get))
+        pages.append(tuple(ops))
+    return RenderPlan(tuple(pages), get('serial_no', 'Unknown'))
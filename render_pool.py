@@ -0,0 +1,159 @@
+"""
+Process-pool PDF renderer for the web tier
+
+PDF rendering is CPU bound, so with a single gunicorn worker it serializes on
+one core. RenderPool fans jobs out to a bounded pool of worker processes that
+keep the parsed template warm (see pdf_generator.template_cache).
+
+- Back-pressure: at most workers + max_queue jobs may be in flight; beyond
+  that submit() raises RenderPoolBusy immediately instead of queueing forever.
+- Timeouts: render()/render_to_file() wait at most timeout seconds and raise
+  RenderTimeout. A process cannot be interrupted mid-render, so a job that
+  already started keeps both its worker and its slot until it finishes; a
+  timed-out render_to_file() removes its target file once the job is done.
+
+Configuration (environment):
+    CCEW_RENDER_WORKERS  worker processes, 0 renders in-process (default: CPU count)
+    CCEW_RENDER_QUEUE    extra jobs allowed to wait for a worker (default: 2 x workers)
+    CCEW_RENDER_TIMEOUT  seconds to wait for a job (default: 30)
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from pdf_generator import generate_ccew_pdf, template_cache
+
+
+class RenderPoolError(Exception):
+    """Base class for render pool failures"""
+
+
+class RenderPoolBusy(RenderPoolError):
+    """Raised when the pool's job queue is full"""
+
+
+class RenderTimeout(RenderPoolError):
+    """Raised when a job does not finish within its timeout"""
+
+
+def _warm_worker():
+    # Parse the default template once per worker process, before the first job
+    template_cache.get_reader()
+
+
+def _render_job(form_data, options):
+    return generate_ccew_pdf(form_data, **options)
+
+
+def _render_file_job(form_data, path, options):
+    # Written by the worker so the PDF never crosses the process pipe
+    with open(path, 'wb') as f:
+        generate_ccew_pdf(form_data, output=f, **options)
+    return path
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class RenderPool:
+    """Bounded process pool for generate_ccew_pdf"""
+
+    def __init__(self, workers=None, max_queue=None, timeout=None):
+        if workers is None:
+            workers = int(os.environ.get('CCEW_RENDER_WORKERS', os.cpu_count() or 1))
+        if max_queue is None:
+            max_queue = int(os.environ.get('CCEW_RENDER_QUEUE', 2 * workers))
+        if timeout is None:
+            timeout = float(os.environ.get('CCEW_RENDER_TIMEOUT', 30))
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max(workers, 1) + max_queue)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn: never fork a process that may already be running request threads
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_warm_worker,
+                )
+            return self._executor
+
+    def submit(self, fn, *args):
+        """Submit a job, raising RenderPoolBusy if the queue is full"""
+        if not self._slots.acquire(blocking=False):
+            raise RenderPoolBusy(f"Render queue full ({self.workers} workers, {self.max_queue} queued)")
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BrokenProcessPool as e:
+            self._slots.release()
+            self._reset()
+            raise RenderPoolError(f"Render pool crashed: {e}") from e
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _wait(self, future, timeout):
+        """
+        Wait for a job's result
+
+        On RenderTimeout only a job still queued is cancelled; a running one
+        holds its slot until the worker finishes it.
+        """
+        try:
+            return future.result(timeout=self.timeout if timeout is None else timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise RenderTimeout("PDF render timed out")
+        except BrokenProcessPool as e:
+            self._reset()
+            raise RenderPoolError(f"Render pool crashed: {e}") from e
+
+    def render(self, form_data, timeout=None, **options):
+        """Render a PDF and return its bytes"""
+        if self.workers == 0:
+            return generate_ccew_pdf(form_data, **options)
+        return self._wait(self.submit(_render_job, form_data, options), timeout)
+
+    def render_to_file(self, form_data, path, timeout=None, **options):
+        """Render a PDF straight into path"""
+        if self.workers == 0:
+            return _render_file_job(form_data, path, options)
+        return self._wait_for_file(self.submit(_render_file_job, form_data, path, options), path, timeout)
+
+    def _wait_for_file(self, future, path, timeout):
+        try:
+            return self._wait(future, timeout)
+        except RenderTimeout:
+            # The worker may still write path after the caller has given up on it
+            future.add_done_callback(lambda _: _remove(path))
+            raise
+
+    def _reset(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self, wait=True):
+        """Stop the worker processes"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+
+render_pool = RenderPool()
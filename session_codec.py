@@ -0,0 +1,74 @@
+"""
+Encoding of the JSON blobs stored in the sessions table
+
+    json     plain JSON text, as every row was written before this module
+             (no version byte; stored as TEXT)
+    zlib     b'\x01' + zlib-compressed compact JSON (stored as BLOB)
+    msgpack  b'\x02' + msgpack (stored as BLOB; needs the msgpack package)
+
+decode() accepts all three, so rows written with any codec stay readable
+whatever CCEW_SESSION_CODEC is set to. migrate_sessions.py re-encodes
+existing rows; benchmark_codecs.py reports size and decode time per codec.
+"""
+
+import json
+import os
+import zlib
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+ZLIB_VERSION = 1
+MSGPACK_VERSION = 2
+CODECS = ('json', 'zlib', 'msgpack')
+DEFAULT_CODEC = os.environ.get('CCEW_SESSION_CODEC', 'json')
+
+ZLIB_LEVEL = 6
+
+
+def check_codec(codec):
+    """Raise ValueError for an unknown codec or one whose package is missing"""
+    if codec not in CODECS:
+        raise ValueError(f"Unknown session codec {codec!r} (expected one of {', '.join(CODECS)})")
+    if codec == 'msgpack' and msgpack is None:
+        raise ValueError("Session codec 'msgpack' needs the msgpack package")
+
+
+def encode(value, codec=None):
+    """Encode a JSON-compatible value for storage"""
+    codec = codec or DEFAULT_CODEC
+    if codec == 'json':
+        return json.dumps(value)
+    if codec == 'zlib':
+        packed = json.dumps(value, separators=(',', ':')).encode('utf-8')
+        return bytes([ZLIB_VERSION]) + zlib.compress(packed, ZLIB_LEVEL)
+    check_codec(codec)
+    return bytes([MSGPACK_VERSION]) + msgpack.packb(value, use_bin_type=True)
+
+
+def decode(stored):
+    """Decode a stored blob written by any codec"""
+    if stored is None:
+        return None
+    if isinstance(stored, str):
+        return json.loads(stored)
+    version = stored[0]
+    if version == ZLIB_VERSION:
+        return json.loads(zlib.decompress(stored[1:]))
+    if version == MSGPACK_VERSION:
+        if msgpack is None:
+            raise ValueError("Session row is msgpack-encoded but msgpack is not installed")
+        return msgpack.unpackb(stored[1:], raw=False)
+    if version in b'{["':
+        # JSON that reached the column as bytes
+        return json.loads(stored)
+    raise ValueError(f"Unknown session encoding version {version}")
+
+
+def codec_of(stored):
+    """Name of the codec a stored blob was written with"""
+    if stored is None or isinstance(stored, str):
+        return 'json'
+    return {ZLIB_VERSION: 'zlib', MSGPACK_VERSION: 'msgpack'}.get(stored[0], 'json')
@@ -0,0 +1,413 @@
+"""
+Session stores: the SessionStore interface, SQLite tuned for concurrent
+requests, and an in-process LRU tier in front of it
+
+- WAL journal, so readers never wait behind a writer, with synchronous=NORMAL
+  (durable at checkpoints, safe against corruption), a larger page cache and
+  memory-mapped reads.
+- Expiry: sessions are indexed on (status, created_at) and expire() deletes
+  those older than their status's TTL in small batches, committing between
+  batches so writers are never locked out for long. The database uses
+  incremental auto-vacuum, so vacuum() hands freed pages back to the OS a
+  few at a time instead of a full VACUUM.
+- One long-lived connection per thread instead of a connect/close per
+  request. Because the connection outlives the request, sqlite3's per-connection
+  statement cache keeps save/get/update prepared; the SQL below is kept in
+  module constants so every call hits the same cached statement.
+- The three JSON blobs go through session_codec, so rows can be stored
+  compressed (CCEW_SESSION_CODEC) while older plain-JSON rows stay readable.
+- Projection: get(session_id, fields) reads and decodes only the blobs a
+  caller asks for. The raw SimPro payload, needed by nothing after generate,
+  lives in a cold session_payloads table so the hot sessions rows stay
+  small; rows written before the split keep it in sessions.simpro_data.
+- Idempotency: a session may carry an idempotency key (unique, indexed).
+  save() skips a session whose key already exists and find() returns the
+  existing session id in one index lookup.
+- CachedSessionStore keeps the most recently used decoded sessions in
+  memory, so the form open -> submit round trip reads and decodes the row
+  once. It is per process: with several web processes a session updated in
+  one may be stale in another's cache until evicted.
+
+Configuration (environment):
+    CCEW_SQLITE_CACHE_KB  page cache per connection in KiB (default: 16384)
+    CCEW_SQLITE_MMAP_MB   memory-mapped I/O size in MiB (default: 256)
+    CCEW_SESSION_TTL_DAYS_PENDING    days to keep never-submitted sessions (default: 14)
+    CCEW_SESSION_TTL_DAYS_SUBMITTED  days to keep submitted sessions (default: 90)
+    CCEW_SESSION_CACHE_SIZE          sessions held by CachedSessionStore (default: 256)
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from session_codec import DEFAULT_CODEC, check_codec, decode, encode
+
+# The app's sessions database; the offline tools default to it too
+DATABASE = '/tmp/ccew_sessions.db'
+
+SAVE_SESSION_SQL = '''
+    INSERT INTO sessions (session_id, prefilled_data, mobile_data, created_at, status, idempotency_key)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT DO NOTHING
+    RETURNING session_id
+'''
+FIND_SESSION_SQL = '''
+    SELECT session_id FROM sessions WHERE idempotency_key = ?
+'''
+SAVE_PAYLOAD_SQL = '''
+    INSERT INTO session_payloads (session_id, simpro_data) VALUES (?, ?)
+'''
+UPDATE_SESSION_SQL = '''
+    UPDATE sessions
+    SET mobile_data = ?, status = ?
+    WHERE session_id = ?
+'''
+BLOB_FIELDS = ('simpro_data', 'prefilled_data', 'mobile_data')
+# Cold payload first, falling back to the pre-split column
+SIMPRO_DATA_COLUMN = (
+    '(SELECT p.simpro_data FROM session_payloads p WHERE p.session_id = s.session_id), s.simpro_data'
+)
+
+_GET_SESSION_SQL = {}
+
+
+def get_session_sql(fields):
+    """SELECT for a projection of BLOB_FIELDS; the strings are reused so statements stay cached"""
+    sql = _GET_SESSION_SQL.get(fields)
+    if sql is None:
+        columns = [f'COALESCE({SIMPRO_DATA_COLUMN})' if field == 'simpro_data' else f's.{field}'
+                   for field in fields]
+        sql = _GET_SESSION_SQL[fields] = (
+            f"SELECT {', '.join(['s.session_id', 's.created_at', 's.status'] + columns)} "
+            'FROM sessions s WHERE s.session_id = ?'
+        )
+    return sql
+
+
+SESSION_TTLS = {
+    'pending': timedelta(days=float(os.environ.get('CCEW_SESSION_TTL_DAYS_PENDING', 14))),
+    'submitted': timedelta(days=float(os.environ.get('CCEW_SESSION_TTL_DAYS_SUBMITTED', 90))),
+}
+DELETE_BATCH = 500
+
+
+def delete_in_batches(conn, table, where, params, batch_size=DELETE_BATCH, pause=0.01):
+    """
+    Delete rows of table matching where, batch_size rows per transaction
+
+    Each batch commits on its own and sleeps briefly, so other writers get
+    the lock in between. Returns the number of rows deleted.
+    """
+    sql = f'DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} WHERE {where} LIMIT ?)'
+    deleted = 0
+    while True:
+        count = conn.execute(sql, (*params, batch_size)).rowcount
+        conn.commit()
+        deleted += count
+        if count < batch_size:
+            return deleted
+        time.sleep(pause)
+
+
+def connect(path):
+    """Open a connection with the store's pragmas applied"""
+    cache_kb = int(os.environ.get('CCEW_SQLITE_CACHE_KB', 16384))
+    mmap_mb = int(os.environ.get('CCEW_SQLITE_MMAP_MB', 256))
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False, cached_statements=256)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute(f'PRAGMA cache_size = {-cache_kb}')
+    conn.execute(f'PRAGMA mmap_size = {mmap_mb * 1024 * 1024}')
+    conn.execute('PRAGMA temp_store = MEMORY')
+    return conn
+
+
+class ConnectionPool:
+    """One tuned connection per thread, kept open for the life of the thread"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._all = []
+        self._lock = threading.Lock()
+
+    def connection(self):
+        """The calling thread's connection"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = connect(self.path)
+            with self._lock:
+                self._all.append(conn)
+        return conn
+
+    def release(self):
+        """End the request: roll back anything a failed request left open"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and conn.in_transaction:
+            conn.rollback()
+
+    def close_all(self):
+        with self._lock:
+            conns, self._all = self._all, []
+        for conn in conns:
+            conn.close()
+        self._local = threading.local()
+
+
+class SessionStore:
+    """
+    Interface for session backends
+
+    A session is a dict with session_id, created_at, status and the blobs
+    in BLOB_FIELDS: simpro_data, prefilled_data and mobile_data. get() may be
+    given a subset of BLOB_FIELDS to return only those blobs. Returned
+    sessions are shared with the caller and must be treated as read-only.
+    """
+
+    def save(self, session_id, simpro_data, prefilled_data, idempotency_key=None):
+        """Save a new pending session; returns False if idempotency_key is already taken"""
+        raise NotImplementedError
+
+    def save_many(self, sessions):
+        """
+        Save new pending sessions
+
+        sessions holds (session_id, simpro_data, prefilled_data,
+        idempotency_key) tuples. Returns the set of session ids saved; a
+        session whose key is already taken is skipped.
+        """
+        return {session[0] for session in sessions if self.save(*session)}
+
+    def find(self, idempotency_key):
+        """Session id saved with idempotency_key, or None"""
+        raise NotImplementedError
+
+    def get(self, session_id, fields=BLOB_FIELDS):
+        """Get a session with the given blobs, or None"""
+        raise NotImplementedError
+
+    def update(self, session_id, mobile_data):
+        """Store the mobile form data and mark the session submitted"""
+        raise NotImplementedError
+
+    def expire(self, ttls=None, now=None):
+        """Delete sessions older than their status's TTL; returns the number deleted"""
+        raise NotImplementedError
+
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions table on a per-thread connection pool"""
+
+    def __init__(self, path, codec=None):
+        self.path = path
+        self.codec = codec or DEFAULT_CODEC
+        check_codec(self.codec)
+        self.pool = ConnectionPool(path)
+
+    def connection(self):
+        return self.pool.connection()
+
+    def init(self):
+        """Create the sessions table and its expiry index"""
+        db = self.connection()
+        if db.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            # Only takes effect on an existing database after a one-off VACUUM
+            db.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            db.execute('VACUUM')
+        db.execute('''
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                simpro_data TEXT,
+                prefilled_data TEXT,
+                mobile_data TEXT,
+                created_at TEXT,
+                status TEXT
+            )
+        ''')
+        db.execute('CREATE INDEX IF NOT EXISTS idx_sessions_status_created ON sessions (status, created_at)')
+        if 'idempotency_key' not in [column[1] for column in db.execute('PRAGMA table_info(sessions)')]:
+            db.execute('ALTER TABLE sessions ADD COLUMN idempotency_key TEXT')
+        db.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_sessions_idempotency
+            ON sessions (idempotency_key) WHERE idempotency_key IS NOT NULL
+        ''')
+        db.execute('''
+            CREATE TABLE IF NOT EXISTS session_payloads (
+                session_id TEXT PRIMARY KEY,
+                simpro_data TEXT
+            )
+        ''')
+        db.commit()
+
+    def save(self, session_id, simpro_data, prefilled_data, idempotency_key=None):
+        """Save a new session; returns False if idempotency_key is already taken"""
+        return bool(self.save_many([(session_id, simpro_data, prefilled_data, idempotency_key)]))
+
+    def save_many(self, sessions):
+        """Save new sessions in a single transaction; returns the set of session ids saved"""
+        now = datetime.now().isoformat()
+        empty = encode({}, self.codec)
+        saved = set()
+        db = self.connection()
+        try:
+            for session_id, simpro_data, prefilled_data, idempotency_key in sessions:
+                row = db.execute(SAVE_SESSION_SQL, (
+                    session_id, encode(prefilled_data, self.codec), empty, now, 'pending', idempotency_key
+                )).fetchone()
+                if row is not None:
+                    db.execute(SAVE_PAYLOAD_SQL, (session_id, encode(simpro_data, self.codec)))
+                    saved.add(session_id)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        return saved
+
+    def find(self, idempotency_key):
+        """Session id saved with idempotency_key, or None"""
+        row = self.connection().execute(FIND_SESSION_SQL, (idempotency_key,)).fetchone()
+        return row[0] if row else None
+
+    def get(self, session_id, fields=BLOB_FIELDS):
+        """Get a session with only the given blobs read and decoded, or None"""
+        fields = tuple(fields)
+        row = self.connection().execute(get_session_sql(fields), (session_id,)).fetchone()
+        if row is None:
+            return None
+        session = {'session_id': row[0], 'created_at': row[1], 'status': row[2]}
+        for i, field in enumerate(fields, 3):
+            session[field] = decode(row[i])
+        return session
+
+    def update(self, session_id, mobile_data):
+        """Store the mobile form data and mark the session submitted"""
+        db = self.connection()
+        db.execute(UPDATE_SESSION_SQL, (encode(mobile_data, self.codec), 'submitted', session_id))
+        db.commit()
+
+    def expire(self, ttls=None, now=None):
+        """Delete sessions older than their status's TTL; returns the number deleted"""
+        ttls = SESSION_TTLS if ttls is None else ttls
+        now = now or datetime.now()
+        db = self.connection()
+        deleted = 0
+        for status, ttl in ttls.items():
+            cutoff = (now - ttl).isoformat()
+            deleted += delete_in_batches(db, 'sessions', 'status = ? AND created_at < ?', (status, cutoff))
+        if deleted:
+            delete_in_batches(db, 'session_payloads', 'session_id NOT IN (SELECT session_id FROM sessions)', ())
+        return deleted
+
+    def vacuum(self, pages=1000):
+        """Release up to pages free pages back to the filesystem"""
+        db = self.connection()
+        freelist = db.execute('PRAGMA freelist_count').fetchone()[0]
+        if freelist:
+            # execute() would only step the pragma once (one page); executescript runs it to completion
+            db.executescript(f'PRAGMA incremental_vacuum({int(pages)});')
+        return freelist - db.execute('PRAGMA freelist_count').fetchone()[0]
+
+
+class CachedSessionStore(SessionStore):
+    """
+    Bounded LRU read-through cache in front of another SessionStore
+
+    get() serves decoded sessions from memory and falls back to the backend
+    on a miss; save() and update() write through to the backend and then
+    refresh the cached copy. Entries hold only the blobs asked for so far
+    (never the raw SimPro payload from save()); a get() needing a blob the
+    entry lacks counts as a miss and fetches just the missing ones. Anything
+    else (connection, vacuum, ...) is delegated to the backend.
+    """
+
+    def __init__(self, backend, max_entries=None):
+        if max_entries is None:
+            max_entries = int(os.environ.get('CCEW_SESSION_CACHE_SIZE', 256))
+        self.backend = backend
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+    def _put(self, session):
+        with self._lock:
+            self._entries[session['session_id']] = session
+            self._entries.move_to_end(session['session_id'])
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def save(self, session_id, simpro_data, prefilled_data, idempotency_key=None):
+        return bool(self.save_many([(session_id, simpro_data, prefilled_data, idempotency_key)]))
+
+    def save_many(self, sessions):
+        saved = self.backend.save_many(sessions)
+        # Cache the pending sessions the forms are about to open
+        now = datetime.now().isoformat()
+        for session_id, _, prefilled_data, _ in sessions:
+            if session_id not in saved:
+                continue
+            self._put({
+                'session_id': session_id,
+                'prefilled_data': prefilled_data,
+                'mobile_data': {},
+                'created_at': now,
+                'status': 'pending'
+            })
+        return saved
+
+    def find(self, idempotency_key):
+        return self.backend.find(idempotency_key)
+
+    def get(self, session_id, fields=BLOB_FIELDS):
+        with self._lock:
+            cached = self._entries.get(session_id)
+            if cached is not None and all(field in cached for field in fields):
+                self._entries.move_to_end(session_id)
+                self.hits += 1
+                return cached
+            self.misses += 1
+        missing = tuple(fields) if cached is None else tuple(f for f in fields if f not in cached)
+        session = self.backend.get(session_id, missing)
+        if session is None:
+            return None
+        if cached is not None:
+            session = {**cached, **session}
+        self._put(session)
+        return session
+
+    def update(self, session_id, mobile_data):
+        self.backend.update(session_id, mobile_data)
+        with self._lock:
+            cached = self._entries.get(session_id)
+            if cached is not None:
+                self._entries[session_id] = {**cached, 'mobile_data': mobile_data, 'status': 'submitted'}
+
+    def expire(self, ttls=None, now=None):
+        deleted = self.backend.expire(ttls, now)
+        if deleted:
+            self.clear()
+        return deleted
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Cache hit/miss counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            }
@@ -0,0 +1,61 @@
+"""
+Single-pass parsing of the SimPro JSON body sent by Make.com
+
+Make.com sends the job either as plain JSON or, depending on how the scenario
+is built, as that JSON double-encoded into a JSON string
+("{\\"job_id\\": ...}"), often with a text/plain content type. parse_body()
+looks at the first byte to tell the two apart, so neither form pays for a
+failed parse and the exception that goes with it.
+
+orjson is used when installed; anything it rejects (NaN, integers over 64
+bits, ...) is retried with the json module, so the result is the same either
+way.
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+WHITESPACE = b' \t\r\n'
+
+
+def loads(data):
+    """json.loads, through orjson when it is installed"""
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data)
+
+
+def _unescape_legacy(text):
+    """The quote-stripping unescape generate_ccew did before parse_body"""
+    return text[1:-1].replace('\\"', '"').replace('\\\\', '\\')
+
+
+def parse_body(raw):
+    """
+    Parse a request body (bytes or str) into the SimPro payload
+
+    A body that is a JSON string is decoded once more. Raises ValueError if
+    the body is not JSON in either form.
+    """
+    if isinstance(raw, str):
+        raw = raw.encode('utf-8')
+    body = raw.strip(WHITESPACE)
+    if not body.startswith(b'"'):
+        return loads(body)
+    # Double-encoded: the outer string holds the JSON document
+    try:
+        inner = loads(body)
+    except ValueError:
+        # Not a valid JSON string (raw control characters, stray escapes);
+        # fall back to the old manual unescape
+        if not body.endswith(b'"') or len(body) < 2:
+            raise
+        return loads(_unescape_legacy(body.decode('utf-8')))
+    return loads(inner)
@@ -0,0 +1,47 @@
+"""
+SimPro custom field parsing for generate_ccew
+
+SimPro (via Make.com) sends custom fields in any of these shapes:
+
+    [{"CustomField": {"Name": "Install Suburb", ...}, "Value": "Sydney"}, ...]
+    [{"Name": "Install Suburb", "Value": "Sydney"}, ...]
+    {"<key>": {"Name": "Install Suburb", "Value": "Sydney"}, ...}
+
+custom_field_values() normalizes them into a name -> value dict in one pass,
+so each lookup is a dict get instead of a scan of the whole array.
+"""
+
+
+def _name_value(item):
+    """(name, value) for one custom field entry, or None if it is not one"""
+    if not isinstance(item, dict):
+        return None
+    # Structure: {"CustomField": {"Name": "...", ...}, "Value": "..."}
+    if 'CustomField' in item and 'Value' in item:
+        custom_field = item['CustomField'] or {}
+        return custom_field.get('Name', ''), item.get('Value', '')
+    # Structure: {"Name": "...", "Value": "..."}
+    if 'Name' in item:
+        return item['Name'], item.get('Value', '')
+    return None
+
+
+def custom_field_values(custom_fields_raw):
+    """
+    Build {name: value} from custom_fields_raw in any supported shape
+
+    If a name appears more than once the first entry wins, as it did with
+    the old linear lookup.
+    """
+    if isinstance(custom_fields_raw, dict):
+        items = custom_fields_raw.values()
+    elif isinstance(custom_fields_raw, list):
+        items = custom_fields_raw
+    else:
+        return {}
+    values = {}
+    for item in items:
+        pair = _name_value(item)
+        if pair is not None and pair[0] not in values:
+            values[pair[0]] = pair[1]
+    return values
@@ -0,0 +1,176 @@
+"""
+Declarative SimPro job -> prefilled_data mapping for generate_ccew
+
+Each Mapping names the prefilled_data key it fills (target) and where the
+value comes from: a dotted path into the SimPro payload (source), a SimPro
+custom field by name (custom_field) or a constant (value), optionally passed
+through a transform. MAPPING is compiled once at import into extract_prefilled,
+so a request runs one getter per field and looks custom fields up in a dict
+built once (simpro_fields.custom_field_values).
+
+Fields are mandatory when the CCEW layout marks them (*)
+(field_coordinates.FIELDS_BY_KEY) or the mapping says required=True;
+missing_mandatory_fields reports the empty ones.
+"""
+
+from collections import namedtuple
+
+from field_coordinates import FIELDS_BY_KEY
+from simpro_fields import custom_field_values
+
+CUSTOM_FIELDS_PATH = 'custom_fields_array'
+
+# Hardcoded company data
+COMPANY_DATA = {
+    'street_number': '177',
+    'street_name': 'Bringelly Rd',
+    'suburb': 'Leppington',
+    'state': 'NSW',
+    'postcode': '2179',
+    'email': 'admin@proformelec.com.au',
+    'office_phone': '47068270'
+}
+
+Mapping = namedtuple('Mapping', 'target source custom_field value transform required')
+Mapping.__new__.__defaults__ = (None, None, None, None, None)
+
+
+def first_name(full_name):
+    parts = (full_name or '').split()
+    return parts[0] if parts else ''
+
+
+def last_name(full_name):
+    return ' '.join((full_name or '').split()[1:])
+
+
+def signature(full_name):
+    return f"{first_name(full_name)} {last_name(full_name)}"
+
+
+def _company_address(prefix, keys):
+    return [Mapping(f'{prefix}_{key}', value=COMPANY_DATA[key]) for key in keys]
+
+
+_ADDRESS_KEYS = ('street_number', 'street_name', 'suburb', 'state', 'postcode', 'email')
+
+MAPPING = [
+    # Installation Address
+    Mapping('serial_no', source='job_id', transform=str),
+    Mapping('property_name', source='site_name'),
+    Mapping('install_street_number', custom_field='Install Street Number'),
+    Mapping('install_street_name', custom_field='Install Street Name'),
+    Mapping('install_suburb', custom_field='Install Suburb'),
+    Mapping('install_state', value='NSW'),
+    Mapping('install_postcode', custom_field='Install Postcode'),
+
+    # Customer Details
+    Mapping('customer_first_name', custom_field='Customer First Name'),
+    Mapping('customer_last_name', custom_field='Customer Last Name'),
+    Mapping('customer_company_name', source='customer_company_name'),
+    Mapping('customer_street_number', custom_field='Customer Street Number'),
+    Mapping('customer_street_name', custom_field='Customer Street Name'),
+    Mapping('customer_suburb', custom_field='Customer Suburb'),
+    Mapping('customer_state', custom_field='Customer State'),
+    Mapping('customer_postcode', custom_field='Customer Postcode'),
+
+    # Installer: the job's technician at the company address
+    Mapping('installer_first_name', source='technician_name', transform=first_name),
+    Mapping('installer_last_name', source='technician_name', transform=last_name),
+    # Becomes the contractor licence on the form, one of which is mandatory
+    Mapping('installer_license_no', custom_field='Tech Licence Number', required=True),
+    Mapping('installer_license_expiry', custom_field='Tech License Expiry'),
+] + _company_address('installer', _ADDRESS_KEYS) + [
+    Mapping('installer_office_phone', value=COMPANY_DATA['office_phone']),
+
+    # Tester (same as installer)
+    Mapping('tester_first_name', source='technician_name', transform=first_name),
+    Mapping('tester_last_name', source='technician_name', transform=last_name),
+    Mapping('tester_license_no', custom_field='Tech Licence Number'),
+    Mapping('tester_license_expiry', custom_field='Tech License Expiry'),
+] + _company_address('tester', _ADDRESS_KEYS) + [
+
+    # Signature
+    Mapping('signature', source='technician_name', transform=signature),
+]
+
+
+def describe_source(mapping):
+    """Human-readable origin of a mapped field, for validation reports"""
+    if mapping.custom_field is not None:
+        return f"custom field '{mapping.custom_field}'"
+    if mapping.source is not None:
+        return f"'{mapping.source}'"
+    return 'constant'
+
+
+def _path_getter(path):
+    keys = path.split('.')
+    if len(keys) == 1:
+        key = keys[0]
+        return lambda data: data.get(key, '')
+
+    def get(data):
+        for key in keys:
+            if not isinstance(data, dict):
+                return ''
+            data = data.get(key, '')
+        return data
+    return get
+
+
+def compile_mapping(mapping=MAPPING):
+    """
+    Compile a mapping spec into (extract, required)
+
+    extract(simpro_data) returns the prefilled_data dict; required lists the
+    mandatory Mapping entries.
+    """
+    constants = {}
+    source_getters = []
+    custom_getters = []
+    required = []
+    for m in mapping:
+        if (m.source is not None) + (m.custom_field is not None) + (m.value is not None) != 1:
+            raise ValueError(f"Mapping for {m.target!r} needs exactly one of source, custom_field, value")
+        if m.required or (m.required is None and m.target in FIELDS_BY_KEY and FIELDS_BY_KEY[m.target].required):
+            required.append(m)
+        if m.value is not None:
+            constants[m.target] = m.transform(m.value) if m.transform else m.value
+        elif m.source is not None:
+            source_getters.append((m.target, _path_getter(m.source), m.transform))
+        else:
+            custom_getters.append((m.target, m.custom_field, m.transform))
+    get_custom_fields = _path_getter(CUSTOM_FIELDS_PATH)
+
+    def extract(simpro_data):
+        prefilled = dict(constants)
+        for target, get, transform in source_getters:
+            value = get(simpro_data)
+            prefilled[target] = transform(value) if transform else value
+        if custom_getters:
+            custom_fields = custom_field_values(get_custom_fields(simpro_data))
+            for target, name, transform in custom_getters:
+                value = custom_fields.get(name, '')
+                prefilled[target] = transform(value) if transform else value
+        return prefilled
+
+    return extract, required
+
+
+extract_prefilled, REQUIRED_MAPPINGS = compile_mapping()
+
+
+def missing_mandatory_fields(prefilled_data, required=None):
+    """Mandatory mappings left empty, as ["target (from source)", ...]"""
+    required = REQUIRED_MAPPINGS if required is None else required
+    return [
+        f"{m.target} (from {describe_source(m)})"
+        for m in required if not prefilled_data.get(m.target)
+    ]
+
+
+def validate_simpro_payload(simpro_data):
+    """Extract prefilled_data and report missing mandatory fields in one pass"""
+    prefilled = extract_prefilled(simpro_data)
+    return prefilled, missing_mandatory_fields(prefilled)
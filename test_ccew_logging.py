@@ -0,0 +1,134 @@
+"""Tests for ccew_logging: level gating, payload sampling, redaction and queued formatting"""
+
+import io
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+
+import pytest
+
+import ccew_logging
+from ccew_logging import DeferredQueueHandler, StructuredFormatter, get_logger, redact, sample_payload
+
+
+class Recorder(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+@pytest.fixture
+def recorder():
+    handler = Recorder()
+    root = logging.getLogger('ccew')
+    level = root.level
+    root.addHandler(handler)
+    yield handler
+    root.removeHandler(handler)
+    root.setLevel(level)
+
+
+def record(level, msg, fields=None, args=()):
+    record = logging.LogRecord('ccew.test', level, __file__, 1, msg, args, None)
+    if fields is not None:
+        record.fields = fields
+    return record
+
+
+def test_level_gating(recorder):
+    logger = get_logger('test')
+    logging.getLogger('ccew').setLevel(logging.INFO)
+    logger.debug("dropped")
+    logger.info("kept")
+    assert [r.getMessage() for r in recorder.records] == ['kept']
+    assert not sample_payload(logger)
+
+    logging.getLogger('ccew').setLevel(logging.DEBUG)
+    logger.debug("now kept")
+    assert [r.getMessage() for r in recorder.records] == ['kept', 'now kept']
+
+
+def test_payload_sampling(recorder, monkeypatch):
+    logger = get_logger('test')
+    logging.getLogger('ccew').setLevel(logging.DEBUG)
+    assert sample_payload(logger)
+
+    monkeypatch.setattr(ccew_logging, 'PAYLOAD_SAMPLE', 0.25)
+    monkeypatch.setattr(ccew_logging.random, 'random', lambda: 0.2)
+    assert sample_payload(logger)
+    monkeypatch.setattr(ccew_logging.random, 'random', lambda: 0.3)
+    assert not sample_payload(logger)
+
+    monkeypatch.setattr(ccew_logging, 'PAYLOAD_SAMPLE', 0.0)
+    monkeypatch.setattr(ccew_logging.random, 'random', lambda: 0.0)
+    assert not sample_payload(logger)
+
+
+def test_redact_masks_emails_phones_and_credentials():
+    payload = {
+        'headers': {'Authorization': 'Bearer abc', 'Content-Type': 'application/json'},
+        'body': '{"customer_email": "john.smith@test.com", "mobile": "0412 345 678"}',
+        'phones': ['02 1234 5678', '+61 412 345 678', '0298765432'],
+        'nmi': 'NMI123456',
+        'job_id': 3015,
+    }
+    assert redact(payload) == {
+        'headers': {'Authorization': '<redacted>', 'Content-Type': 'application/json'},
+        'body': '{"customer_email": "<email>", "mobile": "<phone>"}',
+        'phones': ['<phone>', '<phone>', '<phone>'],
+        'nmi': 'NMI123456',
+        'job_id': 3015,
+    }
+    # The caller's data is left alone
+    assert payload['phones'][0] == '02 1234 5678'
+
+
+def test_only_debug_fields_are_redacted():
+    formatter = StructuredFormatter(redact_debug=True)
+    fields = {'email': 'sarah@tester.com'}
+    assert "email='<email>'" in formatter.format(record(logging.DEBUG, "dump", fields))
+    assert "email='sarah@tester.com'" in formatter.format(record(logging.INFO, "sent", fields))
+    assert "email='sarah@tester.com'" in StructuredFormatter(redact_debug=False).format(
+        record(logging.DEBUG, "dump", fields))
+
+
+def test_records_are_formatted_by_the_listener():
+    threads = []
+
+    class ThreadFormatter(StructuredFormatter):
+        def format(self, record):
+            threads.append(threading.current_thread().name)
+            return super().format(record)
+
+    records = queue.SimpleQueue()
+    stream = io.StringIO()
+    output = logging.StreamHandler(stream)
+    output.setFormatter(ThreadFormatter())
+    listener = logging.handlers.QueueListener(records, output)
+    handler = DeferredQueueHandler(records)
+
+    queued = record(logging.INFO, "rendered %s", {'ms': 12}, args=('job1',))
+    assert handler.prepare(queued) is queued
+    listener.start()
+    try:
+        try:
+            raise ValueError('bad form')
+        except ValueError:
+            failed = record(logging.ERROR, "job failed")
+            failed.exc_info = sys.exc_info()
+        handler.handle(queued)
+        handler.handle(failed)
+    finally:
+        listener.stop()
+
+    # Nothing was formatted on the calling thread
+    assert (queued.args, queued.exc_text) == (('job1',), None)
+    assert threads and threading.current_thread().name not in threads
+    lines = stream.getvalue()
+    assert "INFO ccew.test rendered job1 ms=12" in lines
+    assert "ERROR ccew.test job failed" in lines and 'ValueError: bad form' in lines
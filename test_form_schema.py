@@ -0,0 +1,101 @@
+"""Tests for form_schema"""
+
+import os
+import re
+
+from jinja2 import Environment, FileSystemLoader
+
+from form_schema import (
+    COMPILED_SCHEMA, FIELDS_BY_KEY, FORM_KEYS, GROUPS_BY_NAME, extract_form_data, form_problems, pdf_sections,
+)
+
+
+def test_extract_covers_every_meter():
+    form = {'meter_8_tariff': '11', 'equip_storage_rating': '10kWh', 'unknown': 'x'}
+    mobile_data = extract_form_data(form)
+    assert set(mobile_data) == set(FORM_KEYS)
+    assert mobile_data['meter_8_tariff'] == '11'
+    assert mobile_data['meter_1_tariff'] == ''
+    assert 'unknown' not in mobile_data
+
+
+def test_pdf_sections_shapes():
+    sections = pdf_sections({
+        'equip_sockets': 'yes', 'equip_sockets_rating': '10A',
+        'equip_lighting_rating': '10A',   # not ticked: dropped
+        'meter_2_r': 'yes', 'meter_2_number': 'M2',
+        'meter_3_tariff': '11',           # no presence column: dropped
+        'test_rcd': 'yes',
+        'load_increase': '5', 'work_connected': 'Yes',
+    })
+    assert sections['equipment'] == {'socket_outlets_checked': True, 'socket_outlets_rating': '10A',
+                                     'socket_outlets_number': '', 'socket_outlets_particulars': ''}
+    assert len(sections['meters']) == 1
+    assert sections['meters'][0]['type_r'] is True
+    assert sections['meters'][0]['type_i'] is False
+    assert sections['meters'][0]['meter_no'] == 'M2'
+    assert sections['tests'] == {'rcd_operational': True}
+    assert sections['estimated_load_increase'] == '5'
+    assert sections['work_connected_to_supply'] == 'Yes'
+
+
+def test_licence_fallback():
+    sections = pdf_sections({'installer_license_no': 'L1', 'tester_contractor_license': 'T2',
+                             'tester_license_no': 'L2'})
+    assert sections['installer_contractor_license'] == 'L1'
+    assert 'tester_contractor_license' not in sections
+
+
+def test_form_problems():
+    complete = {'installation_type': 'Rural', 'test_date': '2025-11-11', 'load_within_capacity': 'Yes',
+                'work_connected': 'No', 'energy_provider': 'Ausgrid',
+                'installer_supervisor_no': 'S1', 'tester_contractor_license': 'C2'}
+    assert form_problems(complete) == []
+    problems = form_problems({**complete, 'energy_provider': '', 'meter_4_master_sub': 'X'})
+    assert problems == ['energy_provider is required', "meter_4_master_sub has unexpected value 'X'"]
+
+
+def test_form_problems_one_of_licence():
+    complete = {'installation_type': 'Rural', 'test_date': '2025-11-11', 'load_within_capacity': 'Yes',
+                'work_connected': 'No', 'energy_provider': 'Ausgrid'}
+    assert form_problems(complete) == [
+        'installer_supervisor_no or installer_contractor_license is required',
+        'tester_supervisor_no or tester_contractor_license is required',
+    ]
+    # Either of the pair will do, and the prefilled licence stands in for the contractor one
+    assert form_problems({**complete, 'installer_contractor_license': 'C1', 'tester_license_no': 'L2'}) == []
+    assert form_problems({**complete, 'installer_supervisor_no': 'S1'}) == [
+        'tester_supervisor_no or tester_contractor_license is required',
+    ]
+
+
+def render_form(groups=GROUPS_BY_NAME):
+    env = Environment(loader=FileSystemLoader(os.path.join(os.path.dirname(__file__), 'templates')))
+    return env.get_template('ccew_form.html').render(session_id='s1', form_fields=FIELDS_BY_KEY,
+                                                     form_groups=groups)
+
+
+def inputs(html):
+    """name -> (type, placeholder) of every text-like input"""
+    return {name: (kind, placeholder) for kind, name, placeholder
+            in re.findall(r'<input type="(\w+)" name="([^"]+)" placeholder="([^"]*)"', html)}
+
+
+def test_template_renders_every_group_key():
+    names = set(re.findall(r'name="([^"]+)"', render_form()))
+    for name, _, rows in COMPILED_SCHEMA['groups']:
+        for _, _, cells in rows:
+            assert {key for key, _, _ in cells} <= names, name
+
+
+def test_template_placeholders_follow_columns():
+    rendered = inputs(render_form())
+    assert rendered['equip_generation_number'] == ('number', '1')
+    assert rendered['equip_generation_particulars'] == ('text', 'Solar/Battery')
+    assert rendered['equip_switchboard_particulars'] == ('text', 'Details')
+    assert rendered['meter_3_dials'] == ('text', '5')
+
+    # Reordered columns keep their own placeholders
+    equipment = GROUPS_BY_NAME['equipment']
+    reordered = {**GROUPS_BY_NAME, 'equipment': equipment._replace(columns=equipment.columns[::-1])}
+    assert inputs(render_form(reordered)) == rendered
@@ -0,0 +1,117 @@
+"""Tests for the /api/ccew/generate/batch endpoint, on a temporary session store"""
+
+import pytest
+
+import app as ccew_app
+from session_store import CachedSessionStore, SQLiteSessionStore
+
+URL = '/api/ccew/generate/batch'
+
+
+class Idle:
+    """Stands in for the background workers the first request would start"""
+
+    def start(self):
+        pass
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = CachedSessionStore(SQLiteSessionStore(str(tmp_path / 'sessions.db')))
+    store.init()
+    monkeypatch.setattr(ccew_app, 'session_store', store)
+    for name in ('job_worker', 'outbox_dispatcher', 'reaper'):
+        monkeypatch.setattr(ccew_app, name, Idle())
+    yield store
+    store.pool.close_all()
+
+
+@pytest.fixture
+def client(store):
+    return ccew_app.app.test_client()
+
+
+def job(job_id, **fields):
+    return {'job_id': job_id, 'site_name': f'Site {job_id}', **fields}
+
+
+def session_count(store):
+    return store.connection().execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+
+
+def test_oversized_batch_is_rejected(client, store, monkeypatch):
+    monkeypatch.setattr(ccew_app, 'GENERATE_BATCH_MAX', 2)
+    response = client.post(URL, json=[job(1), job(2), job(3)])
+    assert response.status_code == 413
+    assert response.get_json()['error'] == 'Batch of 3 jobs exceeds the maximum of 2'
+    assert session_count(store) == 0
+
+
+def test_item_errors_do_not_fail_the_batch(client, store, monkeypatch):
+    validate = ccew_app.validate_simpro_payload
+
+    def validate_or_fail(simpro_data):
+        if simpro_data.get('job_id') == 2:
+            raise ValueError('custom_fields_array is not a list')
+        return validate(simpro_data)
+
+    monkeypatch.setattr(ccew_app, 'validate_simpro_payload', validate_or_fail)
+    response = client.post(URL, json={'jobs': [job(1), 'not a job', job(2), job(3)]})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert (body['created'], body['existing'], body['failed']) == (2, 0, 2)
+    results = body['results']
+    assert [result['index'] for result in results] == [0, 1, 2, 3]
+    assert [result['success'] for result in results] == [True, False, False, True]
+    assert results[1]['error'] == 'Job must be a JSON object'
+    assert results[2]['error'] == 'custom_fields_array is not a list'
+    assert results[3]['form_url'] == f"http://localhost/form/{results[3]['session_id']}"
+    assert store.get(results[0]['session_id'], ('prefilled_data',))['prefilled_data']['property_name'] == 'Site 1'
+    assert session_count(store) == 2
+
+
+def test_sessions_are_saved_in_one_transaction(client, store):
+    statements = []
+    store.connection().set_trace_callback(statements.append)
+    try:
+        response = client.post(URL, json=[job(i) for i in range(5)])
+    finally:
+        store.connection().set_trace_callback(None)
+    assert response.get_json()['created'] == 5
+    inserts = [i for i, sql in enumerate(statements) if 'INSERT INTO sessions' in sql]
+    commits = [i for i, sql in enumerate(statements) if sql == 'COMMIT']
+    assert len(inserts) == 5
+    assert len(commits) == 1 and commits[0] > inserts[-1]
+
+
+def test_repeated_jobs_return_existing_sessions(client, store):
+    first = client.post(URL, json=[job(1)]).get_json()['results'][0]
+    body = client.post(URL, json=[job(1), job(2), job(2)]).get_json()
+    assert (body['created'], body['existing']) == (1, 2)
+    results = body['results']
+    assert (results[0]['session_id'], results[0]['existing']) == (first['session_id'], True)
+    # The second job 2 repeats the first one within the same batch
+    assert results[2]['session_id'] == results[1]['session_id']
+    assert session_count(store) == 2
+
+
+def test_items_that_lose_the_insert_race_are_remapped(client, store, monkeypatch):
+    # Another request saves job 2 after this batch looked the key up, before it saves
+    find = store.find
+    looked_up = set()
+
+    def find_then_lose_race(idempotency_key):
+        if idempotency_key == 'job:2' and idempotency_key not in looked_up:
+            looked_up.add(idempotency_key)
+            store.save('winner', job(2), {}, idempotency_key='job:2')
+            return None
+        return find(idempotency_key)
+
+    monkeypatch.setattr(store, 'find', find_then_lose_race)
+    body = client.post(URL, json=[job(1), job(2)]).get_json()
+    assert (body['created'], body['existing'], body['failed']) == (1, 1, 0)
+    lost = body['results'][1]
+    assert (lost['session_id'], lost['existing']) == ('winner', True)
+    assert lost['form_url'] == 'http://localhost/form/winner'
+    assert 'missing_fields' not in lost
+    assert session_count(store) == 2
@@ -0,0 +1,184 @@
+"""Tests for job_queue: claiming, lease requeue and the JobWorker threads"""
+
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from job_queue import LEASE_SECONDS, JobWorker, enqueue_job, get_job, init_jobs_table, purge_jobs, set_job_status
+from outbox import enqueue_message, init_outbox_table
+from session_store import connect
+
+
+class Busy(Exception):
+    pass
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'jobs.db')
+    db = connect(path)
+    init_jobs_table(db)
+    db.commit()
+    db.close()
+    return path
+
+
+@pytest.fixture
+def db(db_path):
+    db = connect(db_path)
+    yield db
+    db.close()
+
+
+def worker(db_path, handler, **kwargs):
+    return JobWorker(db_path, handler, retry_exceptions=(Busy,), poll_interval=0.01, connect=connect, **kwargs)
+
+
+def backdate(db, job_id, seconds):
+    updated_at = (datetime.now() - timedelta(seconds=seconds)).isoformat()
+    db.execute('UPDATE jobs SET updated_at = ? WHERE job_id = ?', (updated_at, job_id))
+    db.commit()
+
+
+def test_claims_oldest_job_and_records_progress(db_path, db):
+    first = enqueue_job(db, 's1', {'n': 1}, 'http://host/')
+    second = enqueue_job(db, 's2', {'n': 2}, 'http://host/')
+    seen = []
+
+    def handler(job, progress):
+        seen.append((job['job_id'], job['status']))
+        progress('rendered', pdf_path='/pdfs/x.pdf')
+        return 'rendered'
+
+    jobs = worker(db_path, handler)
+    assert jobs.run_once(db) is True
+    assert seen == [(first, 'rendering')]
+    job = get_job(db, first)
+    assert (job['status'], job['pdf_path'], job['attempts']) == ('rendered', '/pdfs/x.pdf', 1)
+    assert job['finished_at'] is not None
+    assert get_job(db, second)['status'] == 'queued'
+
+    assert jobs.run_once(db) is True
+    assert jobs.run_once(db) is False
+
+
+def test_handler_error_fails_job(db_path, db):
+    job_id = enqueue_job(db, 's1', {}, 'http://host/')
+
+    def handler(job, progress):
+        raise ValueError('bad form')
+
+    worker(db_path, handler).run_once(db)
+    job = get_job(db, job_id)
+    assert (job['status'], job['error']) == ('failed', 'bad form')
+    assert job['finished_at'] is not None
+
+
+def test_retry_exception_requeues_job(db_path, db):
+    job_id = enqueue_job(db, 's1', {}, 'http://host/')
+    calls = []
+
+    def handler(job, progress):
+        calls.append(job['attempts'])
+        if len(calls) == 1:
+            raise Busy('render queue full')
+        return 'rendered'
+
+    jobs = worker(db_path, handler)
+    jobs.run_once(db)
+    job = get_job(db, job_id)
+    assert (job['status'], job['error'], job['finished_at']) == ('queued', 'render queue full', None)
+    jobs.run_once(db)
+    assert calls == [1, 2]
+    assert get_job(db, job_id)['status'] == 'rendered'
+
+
+def test_final_status_from_outbox_is_kept(db_path, db):
+    job_id = enqueue_job(db, 's1', {}, 'http://host/')
+
+    def handler(job, progress):
+        # The outbox delivered before the handler returned
+        set_job_status(db, job['job_id'], 'sent')
+        return 'rendered'
+
+    worker(db_path, handler).run_once(db)
+    assert get_job(db, job_id)['status'] == 'sent'
+
+
+def test_expired_lease_is_requeued(db_path, db):
+    job_id = enqueue_job(db, 's1', {}, 'http://host/')
+    jobs = worker(db_path, lambda job, progress: 'rendered')
+    # A worker claimed the job and died before finishing it
+    jobs._claim(db)
+    backdate(db, job_id, LEASE_SECONDS + 5)
+
+    assert jobs.run_once(db) is True
+    job = get_job(db, job_id)
+    assert (job['status'], job['attempts']) == ('rendered', 2)
+
+
+def test_requeued_rendered_job_sends_one_webhook(db_path, db):
+    init_outbox_table(db)
+    job_id = enqueue_job(db, 's1', {}, 'http://host/')
+
+    def handler(job, progress):
+        progress('rendered', pdf_path='/pdfs/x.pdf')
+        enqueue_message(db, job['job_id'], 's1', 'http://hook', '{}')
+        return 'rendered'
+
+    jobs = worker(db_path, handler)
+    # The worker queued the webhook, then died before marking the job finished
+    jobs._claim(db)
+    enqueue_message(db, job_id, 's1', 'http://hook', '{}')
+    db.execute("UPDATE jobs SET status = 'rendered' WHERE job_id = ?", (job_id,))
+    backdate(db, job_id, LEASE_SECONDS + 5)
+
+    assert jobs.run_once(db) is True
+    assert get_job(db, job_id)['attempts'] == 2
+    assert db.execute('SELECT COUNT(*) FROM outbox WHERE job_id = ?', (job_id,)).fetchone()[0] == 1
+
+
+def test_live_lease_is_left_alone(db_path, db):
+    job_id = enqueue_job(db, 's1', {}, 'http://host/')
+    jobs = worker(db_path, lambda job, progress: 'rendered')
+    jobs._claim(db)
+    backdate(db, job_id, LEASE_SECONDS - 60)
+
+    assert jobs.run_once(db) is False
+    assert get_job(db, job_id)['status'] == 'rendering'
+
+
+def test_threads_process_jobs_concurrently(db_path, db):
+    # Every handler waits for the other two, so this only finishes if three
+    # jobs are in flight at once
+    barrier = threading.Barrier(3, timeout=5)
+
+    def handler(job, progress):
+        barrier.wait()
+        return 'rendered'
+
+    job_ids = [enqueue_job(db, f's{i}', {}, 'http://host/') for i in range(3)]
+    jobs = worker(db_path, handler, threads=3)
+    jobs.start()
+    try:
+        jobs.notify()
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            if all(get_job(db, job_id)['finished_at'] for job_id in job_ids):
+                break
+            time.sleep(0.01)
+    finally:
+        jobs.stop(timeout=5)
+    assert [get_job(db, job_id)['status'] for job_id in job_ids] == ['rendered'] * 3
+    assert [get_job(db, job_id)['attempts'] for job_id in job_ids] == [1] * 3
+
+
+def test_purge_jobs_keeps_unfinished(db_path, db):
+    done = enqueue_job(db, 's1', {}, 'http://host/')
+    waiting = enqueue_job(db, 's2', {}, 'http://host/')
+    set_job_status(db, done, 'sent')
+    assert purge_jobs(db, datetime.now() + timedelta(seconds=1)) == 1
+    assert get_job(db, done) is None
+    assert get_job(db, waiting)['status'] == 'queued'
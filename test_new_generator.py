@@ -1,6 +1,5 @@
 """Test the new PDF generator with sample data"""
 
-import base64
 from pdf_generator import generate_ccew_pdf, get_pdf_filename
 
 # Sample test data
@@ -88,8 +87,7 @@ print("Generating PDF with new overlay approach...")
 print(f"Using calibrated coordinates (Property Name Y=650)")
 
 try:
-    pdf_base64 = generate_ccew_pdf(test_data)
-    pdf_bytes = base64.b64decode(pdf_base64)
+    pdf_bytes = generate_ccew_pdf(test_data)
     
     filename = get_pdf_filename(test_data.get('serial_no', '3015'))
     with open(filename, 'wb') as f:
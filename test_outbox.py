@@ -0,0 +1,207 @@
+"""Tests for outbox: delivery, backoff, dead-lettering and replay"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import outbox
+from outbox import (
+    BACKOFF_BASE, BACKOFF_MAX, LEASE_SECONDS, OutboxDispatcher, backoff_seconds, enqueue_message,
+    init_outbox_table, list_dead, purge_sent, replay_dead,
+)
+from session_store import connect
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = connect(str(tmp_path / 'outbox.db'))
+    init_outbox_table(db)
+    db.commit()
+    yield db
+    db.close()
+
+
+class Sender:
+    """send() that fails the first `failures` calls"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.sent = []
+
+    def __call__(self, message):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError('Make.com unreachable')
+        self.sent.append(message['message_id'])
+
+
+def dispatcher(send, results=None, **kwargs):
+    def on_result(conn, message, status, error):
+        results.append((message['message_id'], status, error))
+    return OutboxDispatcher(':unused:', send, on_result=on_result if results is not None else None,
+                            batch_size=10, max_attempts=3, **kwargs)
+
+
+def message(db, message_id):
+    return dict(db.execute('SELECT * FROM outbox WHERE message_id = ?', (message_id,)).fetchone())
+
+
+def make_due(db, message_id):
+    db.execute('UPDATE outbox SET next_attempt_at = ? WHERE message_id = ?',
+               (datetime.now().isoformat(), message_id))
+    db.commit()
+
+
+def test_backoff_doubles_with_jitter_up_to_max(monkeypatch):
+    monkeypatch.setattr(outbox.random, 'uniform', lambda low, high: (low, high))
+    assert backoff_seconds(1) == (BACKOFF_BASE / 2, BACKOFF_BASE)
+    assert backoff_seconds(3) == (BACKOFF_BASE * 2, BACKOFF_BASE * 4)
+    assert backoff_seconds(30) == (BACKOFF_MAX / 2, BACKOFF_MAX)
+
+
+def test_backoff_is_jittered():
+    delays = {backoff_seconds(4) for _ in range(20)}
+    assert len(delays) > 1
+    assert all(BACKOFF_BASE * 4 <= delay <= BACKOFF_BASE * 8 for delay in delays)
+
+
+def test_delivers_due_messages(db):
+    results = []
+    message_id = enqueue_message(db, 'job1', 's1', 'http://hook', '{}')
+    send = Sender()
+    assert dispatcher(send, results).run_once(db) == 1
+    assert send.sent == [message_id]
+    row = message(db, message_id)
+    assert (row['status'], row['attempts'], row['last_error']) == ('sent', 1, None)
+    assert row['sent_at'] == row['updated_at']
+    assert results == [(message_id, 'sent', None)]
+
+
+def test_failed_attempt_is_retried_after_backoff(db):
+    results = []
+    message_id = enqueue_message(db, 'job1', 's1', 'http://hook', '{}')
+    outbound = dispatcher(Sender(failures=1), results)
+    before = datetime.now()
+    outbound.run_once(db)
+
+    row = message(db, message_id)
+    assert (row['status'], row['attempts'], row['last_error']) == ('pending', 1, 'Make.com unreachable')
+    retry_at = datetime.fromisoformat(row['next_attempt_at'])
+    assert before + timedelta(seconds=BACKOFF_BASE / 2) <= retry_at
+    assert retry_at <= datetime.now() + timedelta(seconds=BACKOFF_BASE)
+    assert results == []
+
+    # Not due yet
+    assert outbound.run_once(db) == 0
+    make_due(db, message_id)
+    assert outbound.run_once(db) == 1
+    assert message(db, message_id)['status'] == 'sent'
+    assert results == [(message_id, 'sent', None)]
+
+
+def test_dead_letters_after_max_attempts(db):
+    results = []
+    message_id = enqueue_message(db, 'job1', 's1', 'http://hook', '{}')
+    outbound = dispatcher(Sender(failures=10), results)
+    for _ in range(3):
+        outbound.run_once(db)
+        make_due(db, message_id)
+
+    row = message(db, message_id)
+    assert (row['status'], row['attempts']) == ('dead', 3)
+    assert results == [(message_id, 'dead', 'Make.com unreachable')]
+    assert outbound.run_once(db) == 0
+    assert [m['message_id'] for m in list_dead(db)] == [message_id]
+    assert 'payload' not in list_dead(db)[0]
+
+
+def test_replay_dead_resets_attempts(db):
+    dead = []
+    for job_id in ('job1', 'job2'):
+        message_id = enqueue_message(db, job_id, 's1', 'http://hook', '{}')
+        db.execute("UPDATE outbox SET status = 'dead', attempts = 3 WHERE message_id = ?", (message_id,))
+        dead.append(message_id)
+    db.commit()
+
+    assert replay_dead(db, []) == []
+    assert replay_dead(db, [dead[1]]) == [(dead[1], 'job2')]
+    row = message(db, dead[1])
+    assert (row['status'], row['attempts']) == ('pending', 0)
+    assert message(db, dead[0])['status'] == 'dead'
+
+    assert replay_dead(db) == [(dead[0], 'job1')]
+    send = Sender()
+    assert dispatcher(send).run_once(db) == 2
+    assert sorted(send.sent) == sorted(dead)
+
+
+def test_stale_sending_message_is_reclaimed(db):
+    message_id = enqueue_message(db, 'job1', 's1', 'http://hook', '{}')
+    outbound = dispatcher(Sender())
+    # A dispatcher claimed the message and died mid-send
+    outbound._claim(db)
+    assert outbound.run_once(db) == 0
+
+    stale = (datetime.now() - timedelta(seconds=LEASE_SECONDS + 5)).isoformat()
+    db.execute('UPDATE outbox SET updated_at = ? WHERE message_id = ?', (stale, message_id))
+    db.commit()
+    assert outbound.run_once(db) == 1
+    row = message(db, message_id)
+    assert (row['status'], row['attempts']) == ('sent', 2)
+
+
+def test_purge_sent_uses_delivery_time(db):
+    old, recent, pending = (enqueue_message(db, f'job{i}', 's1', 'http://hook', '{}') for i in range(3))
+    dispatcher(Sender()).run_once(db)
+    db.execute("UPDATE outbox SET status = 'pending' WHERE message_id = ?", (pending,))
+    # Sent a week ago, although the message was scheduled (next_attempt_at) just now
+    week_ago = (datetime.now() - timedelta(days=7)).isoformat()
+    db.execute('UPDATE outbox SET sent_at = ?, next_attempt_at = ? WHERE message_id = ?',
+               (week_ago, datetime.now().isoformat(), old))
+    # Sent just now, although it was first scheduled a week ago
+    db.execute('UPDATE outbox SET next_attempt_at = ? WHERE message_id = ?', (week_ago, recent))
+    db.commit()
+
+    assert purge_sent(db, datetime.now() - timedelta(days=1)) == 1
+    remaining = {row[0] for row in db.execute('SELECT message_id FROM outbox')}
+    assert remaining == {recent, pending}
+
+
+def test_sent_at_is_added_to_existing_table(tmp_path):
+    db = connect(str(tmp_path / 'old.db'))
+    db.execute('''
+        CREATE TABLE outbox (
+            message_id TEXT PRIMARY KEY, job_id TEXT, session_id TEXT, url TEXT, payload TEXT, status TEXT,
+            attempts INTEGER DEFAULT 0, next_attempt_at TEXT, last_error TEXT, created_at TEXT, updated_at TEXT
+        )
+    ''')
+    db.execute("INSERT INTO outbox (message_id, status, updated_at) VALUES ('m1', 'sent', ?)",
+               ((datetime.now() - timedelta(days=7)).isoformat(),))
+    init_outbox_table(db)
+    # Rows sent before the column existed fall back to updated_at
+    assert purge_sent(db, datetime.now() - timedelta(days=1)) == 1
+    db.close()
+
+
+def test_one_message_per_job(db):
+    first = enqueue_message(db, 'job1', 's1', 'http://hook', '{"try": 1}')
+    send = Sender()
+    dispatcher(send).run_once(db)
+    # The job was re-run after a crash and queued its webhook again
+    assert enqueue_message(db, 'job1', 's1', 'http://hook', '{"try": 2}') == first
+    assert dispatcher(send).run_once(db) == 0
+    assert send.sent == [first]
+    row = message(db, first)
+    assert (row['status'], row['payload']) == ('sent', '{"try": 1}')
+    assert db.execute('SELECT COUNT(*) FROM outbox').fetchone()[0] == 1
+
+
+def test_repeat_messages_in_existing_table_are_dropped(tmp_path):
+    db = connect(str(tmp_path / 'old.db'))
+    init_outbox_table(db)
+    db.execute('DROP INDEX idx_outbox_job')
+    for message_id in ('m1', 'm2'):
+        db.execute("INSERT INTO outbox (message_id, job_id, status) VALUES (?, 'job1', 'sent')", (message_id,))
+    init_outbox_table(db)
+    assert [row[0] for row in db.execute('SELECT message_id FROM outbox')] == ['m1']
+    db.close()
@@ -0,0 +1,97 @@
+"""Tests for the pdf_generator overlay engines against the original ReportLab merge path"""
+
+import io
+
+import pytest
+from pypdf import PdfReader, PdfWriter
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+from pdf_generator import OVERLAY_ENGINES, TemplateCache, build_ccew_writer, generate_ccew_pdf
+from overlay_stream import overlay_fragments
+
+FORM_DATA = {
+    'serial_no': '3015',
+    'install_suburb': 'Sydney',
+    'customer_first_name': 'Zoë',       # non-ASCII goes through the WinAnsi encoding
+    'installation_type': 'residential',
+    'energy_provider': 'Ausgrid',       # drawn over a white box
+}
+
+
+def text_runs(pdf):
+    """Sorted (page, text, x, y) for every shown string in a PDF"""
+    runs = []
+    for page_num, page in enumerate(PdfReader(io.BytesIO(pdf)).pages):
+        def visit(text, cm, tm, font_dict, font_size):
+            if text.strip():
+                x = tm[4] * cm[0] + cm[4]
+                y = tm[5] * cm[3] + cm[5]
+                runs.append((page_num, text.strip(), round(x, 1), round(y, 1)))
+        page.extract_text(visitor_text=visit)
+    return sorted(runs)
+
+
+def one_page_pdf(words, font='Helvetica'):
+    packet = io.BytesIO()
+    can = canvas.Canvas(packet, pagesize=A4)
+    can.setFont(font, 12)
+    can.drawString(100, 700, words)
+    can.save()
+    return packet.getvalue()
+
+
+@pytest.fixture(scope='module')
+def reportlab_runs():
+    return text_runs(generate_ccew_pdf(FORM_DATA, engine='reportlab'))
+
+
+def test_reportlab_path_draws_the_form_data(reportlab_runs):
+    blank = text_runs(generate_ccew_pdf({}, engine='reportlab'))
+    added = sorted(set(reportlab_runs) - set(blank))
+    # One run per value, plus the residential tick
+    assert sorted(run[1] for run in added) == sorted(['3015', 'Sydney', 'X', 'Zoë', 'Ausgrid'])
+
+
+@pytest.mark.parametrize('engine', OVERLAY_ENGINES)
+def test_engine_matches_reportlab_text_and_positions(engine, reportlab_runs):
+    assert text_runs(generate_ccew_pdf(FORM_DATA, engine=engine)) == reportlab_runs
+
+
+def test_unknown_engine_is_rejected():
+    with pytest.raises(ValueError):
+        build_ccew_writer(FORM_DATA, engine='canvas')
+
+
+def test_acroform_falls_back_to_stream_on_fieldless_template(monkeypatch, reportlab_runs):
+    # The shipped template has no AcroForm fields, so nothing may be filled
+    calls = []
+    monkeypatch.setattr('pdf_generator.fill_acroform', lambda *args, **kwargs: calls.append(args))
+    writer = build_ccew_writer(FORM_DATA, engine='acroform')
+    assert calls == []
+    assert '/AcroForm' not in writer._root_object
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    assert text_runs(buffer.getvalue()) == reportlab_runs
+
+
+def test_font_name_clash_leaves_page_untouched():
+    # ReportLab names Courier /F2 here, where our overlay puts Symbol
+    writer = PdfWriter()
+    page = writer.add_page(PdfReader(io.BytesIO(one_page_pdf('TEMPLATE', font='Courier'))).pages[0])
+    before = page.get_contents().get_data()
+    assert overlay_fragments.apply(page, writer, FORM_DATA, 0) is False
+    assert page.get_contents().get_data() == before
+    assert page['/Resources']['/Font']['/F2']['/BaseFont'] == '/Courier'
+
+
+def test_stream_engine_falls_back_to_merge_on_font_clash(tmp_path, monkeypatch):
+    template = tmp_path / 'clash.pdf'
+    template.write_bytes(one_page_pdf('TEMPLATE', font='Courier'))
+    monkeypatch.setattr('pdf_generator.template_cache', TemplateCache())
+
+    runs = {engine: text_runs(generate_ccew_pdf(FORM_DATA, template_path=str(template), engine=engine))
+            for engine in ('stream', 'merge')}
+    assert runs['stream'] == runs['merge']
+    assert (0, 'TEMPLATE', 100.0, 700.0) in runs['stream']
+    assert '3015' in [run[1] for run in runs['stream']]
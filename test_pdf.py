@@ -1,7 +1,6 @@
 import sys
 sys.path.insert(0, '/home/ubuntu/ccew-api-v3')
 from pdf_generator import generate_ccew_pdf
-import base64
 
 # Test data with all fields populated
 test_data = {
@@ -51,8 +50,7 @@ test_data = {
 }
 
 print("Generating PDF...")
-pdf_base64 = generate_ccew_pdf(test_data)
-pdf_bytes = base64.b64decode(pdf_base64)
+pdf_bytes = generate_ccew_pdf(test_data)
 
 output_path = '/home/ubuntu/test_ccew.pdf'
 with open(output_path, 'wb') as f:
@@ -0,0 +1,66 @@
+"""Tests for pdf_store.PDFStore"""
+
+import os
+import sqlite3
+
+import pytest
+
+from pdf_store import PDFStore
+
+
+@pytest.fixture
+def db():
+    db = sqlite3.connect(':memory:')
+    db.row_factory = sqlite3.Row
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def store(tmp_path, db):
+    store = PDFStore(str(tmp_path / 'pdfs'), max_bytes=250)
+    store.init(db)
+    return store
+
+
+def add(store, db, content, job_id, session_id='s1', filename='CCEW_1.pdf'):
+    tmp_path = store.temp_path()
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+    return store.add(db, tmp_path, job_id, session_id, filename)
+
+
+def test_add_is_content_addressed(store, db):
+    digest = add(store, db, b'%PDF-a' * 10, 'job1')
+    path = store.object_path(digest)
+    assert path == os.path.join(store.root, 'objects', digest[:2], f'{digest}.pdf')
+    assert store.get(db, digest) == path
+    assert os.listdir(store.tmp_dir) == []
+    assert store.ref(db, 'job1') == {'hash': digest, 'filename': 'CCEW_1.pdf', 'session_id': 's1'}
+
+
+def test_identical_renders_are_deduplicated(store, db):
+    first = add(store, db, b'%PDF-a' * 10, 'job1')
+    second = add(store, db, b'%PDF-a' * 10, 'job2')
+    assert first == second
+    assert store.stats(db)['objects'] == 1
+    assert store.deduplicated == 1
+    assert store.latest(db, session_id='s1') == first
+    assert store.latest(db, filename='CCEW_1.pdf') == first
+
+
+def test_evicts_least_recently_used(store, db):
+    old = add(store, db, b'a' * 100, 'job1')
+    used = add(store, db, b'b' * 100, 'job2')
+    store.get(db, old)                        # old is now the most recently used
+    new = add(store, db, b'c' * 100, 'job3')  # 300 bytes > 250: one object must go
+    assert store.get(db, used) is None
+    assert not os.path.exists(store.object_path(used))
+    assert store.ref(db, 'job2') is None
+    assert store.get(db, old) and store.get(db, new)
+    assert store.stats(db)['bytes'] == 200
+
+
+def test_newest_object_is_kept_even_if_oversized(store, db):
+    digest = add(store, db, b'x' * 400, 'job1')
+    assert store.get(db, digest) is not None
@@ -0,0 +1,136 @@
+"""Tests for reaper.Reaper and the batched expiry in session_store"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import reaper
+from job_queue import enqueue_job, get_job, init_jobs_table, set_job_status
+from outbox import enqueue_message, init_outbox_table
+from reaper import Reaper
+from session_store import SQLiteSessionStore, delete_in_batches
+
+NOW = datetime(2025, 6, 1, 12, 0)
+TTLS = {'pending': timedelta(days=14), 'submitted': timedelta(days=90)}
+
+
+class ChunkedStore(SQLiteSessionStore):
+    """SQLiteSessionStore that vacuums a few pages at a time and counts the passes"""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.vacuums = 0
+
+    def vacuum(self, pages=1000):
+        self.vacuums += 1
+        return super().vacuum(pages=20)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ChunkedStore(str(tmp_path / 'sessions.db'))
+    store.init()
+    db = store.connection()
+    init_jobs_table(db)
+    init_outbox_table(db)
+    db.commit()
+    yield store
+    store.pool.close_all()
+
+
+def add_session(store, session_id, status, age, payload=None):
+    store.save(session_id, payload or {}, {})
+    db = store.connection()
+    db.execute('UPDATE sessions SET status = ?, created_at = ? WHERE session_id = ?',
+               (status, (NOW - age).isoformat(), session_id))
+    db.commit()
+
+
+def session_ids(store, table='sessions'):
+    return {row[0] for row in store.connection().execute(f'SELECT session_id FROM {table}')}
+
+
+def test_expire_uses_each_status_ttl(store):
+    add_session(store, 'old_pending', 'pending', timedelta(days=15))
+    add_session(store, 'new_pending', 'pending', timedelta(days=13))
+    add_session(store, 'mid_submitted', 'submitted', timedelta(days=15))
+    add_session(store, 'old_submitted', 'submitted', timedelta(days=91))
+    add_session(store, 'other_status', 'archived', timedelta(days=365))
+
+    assert store.expire(TTLS, now=NOW) == 2
+    kept = {'new_pending', 'mid_submitted', 'other_status'}
+    assert session_ids(store) == kept
+    # Cold payloads of expired sessions go with them
+    assert session_ids(store, 'session_payloads') == kept
+
+
+def test_delete_in_batches_commits_every_batch(store):
+    for i in range(7):
+        add_session(store, f's{i}', 'pending', timedelta(days=i))
+    db = store.connection()
+    statements = []
+    db.set_trace_callback(statements.append)
+    try:
+        deleted = delete_in_batches(db, 'sessions', 'created_at < ?', ((NOW - timedelta(days=1)).isoformat(),),
+                                    batch_size=2, pause=0)
+    finally:
+        db.set_trace_callback(None)
+    assert deleted == 5
+    assert session_ids(store) == {'s0', 's1'}
+    # 2 + 2 + 1: the short batch ends the loop
+    assert sum(statement.startswith('DELETE') for statement in statements) == 3
+    assert sum(statement == 'COMMIT' for statement in statements) == 3
+
+
+def test_run_once_purges_finished_jobs_and_sent_messages(store):
+    db = store.connection()
+    jobs = {name: enqueue_job(db, name, {}, 'http://host/') for name in ('old', 'recent', 'unfinished')}
+    for name in ('old', 'recent'):
+        set_job_status(db, jobs[name], 'sent')
+    messages = {name: enqueue_message(db, jobs[name], name, 'http://hook', '{}') for name in jobs}
+    old = (NOW - timedelta(days=31)).isoformat()
+    recent = (NOW - timedelta(days=29)).isoformat()
+    db.execute('UPDATE jobs SET created_at = ?', (old,))
+    db.execute("UPDATE jobs SET created_at = ? WHERE job_id = ?", (recent, jobs['recent']))
+    db.execute("UPDATE outbox SET status = 'sent', sent_at = ?, updated_at = ?", (recent, recent))
+    db.execute('UPDATE outbox SET sent_at = ? WHERE message_id = ?', (old, messages['old']))
+    # Sent before outbox.sent_at existed: only updated_at says when
+    db.execute('UPDATE outbox SET sent_at = NULL, updated_at = ? WHERE message_id = ?',
+               (old, messages['unfinished']))
+    db.commit()
+
+    stats = Reaper(store, job_ttl=timedelta(days=30)).run_once(now=NOW)
+    assert (stats['jobs'], stats['outbox']) == (1, 2)
+    assert get_job(db, jobs['old']) is None
+    assert get_job(db, jobs['recent'])['status'] == 'sent'
+    assert get_job(db, jobs['unfinished'])['status'] == 'queued'
+    assert session_ids(store, 'outbox') == {'recent'}
+
+
+def test_vacuum_loop_runs_until_nothing_is_freed(store):
+    db = store.connection()
+    assert db.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+    for i in range(50):
+        add_session(store, f's{i}', 'pending', timedelta(days=30), payload={'blob': 'x' * 4000})
+    pages_before = db.execute('PRAGMA page_count').fetchone()[0]
+
+    stats = Reaper(store).run_once(now=NOW)
+    assert stats['sessions'] == 50
+    assert stats['pages_freed'] > 20
+    # Several 20-page chunks, then one pass that frees nothing
+    assert store.vacuums == -(-stats['pages_freed'] // 20) + 1
+    assert db.execute('PRAGMA freelist_count').fetchone()[0] == 0
+    assert db.execute('PRAGMA page_count').fetchone()[0] == pages_before - stats['pages_freed']
+
+
+def test_only_passes_that_remove_something_log(store, monkeypatch):
+    logged = []
+    monkeypatch.setattr(reaper.logger, 'info', lambda msg, extra: logged.append(extra['fields']))
+    stats = Reaper(store).run_once(now=NOW)
+    assert stats == {'sessions': 0, 'jobs': 0, 'outbox': 0, 'pages_freed': 0}
+    assert store.vacuums == 1
+    assert logged == []
+
+    add_session(store, 's1', 'pending', timedelta(days=30))
+    stats = Reaper(store).run_once(now=NOW)
+    assert logged == [stats]
@@ -0,0 +1,29 @@
+"""Tests for regenerate_pdfs.iter_submissions"""
+
+import pytest
+
+from regenerate_pdfs import iter_submissions
+from session_store import SQLiteSessionStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SQLiteSessionStore(str(tmp_path / 'sessions.db'))
+    store.init()
+    yield store
+    store.pool.close_all()
+
+
+def test_undecodable_rows_are_skipped_and_reported(store):
+    for session_id in ('s1', 's2', 's3'):
+        store.save(session_id, {}, {'serial_no': session_id})
+        store.update(session_id, {'nmi': session_id})
+    db = store.connection()
+    db.execute("UPDATE sessions SET mobile_data = ? WHERE session_id = 's2'", (b'\x7fgarbage',))
+    db.commit()
+
+    skipped = []
+    plans = list(iter_submissions(store.path, skipped=skipped))
+    assert [plan.serial_no for plan in plans] == ['s1', 's3']
+    assert [session_id for session_id, _ in skipped] == ['s2']
+    assert 'Unknown session encoding' in skipped[0][1]
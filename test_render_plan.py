@@ -0,0 +1,48 @@
+"""Tests for render_plan.build_render_plan"""
+
+import pickle
+import random
+
+from field_coordinates import PAGE_COUNT, RenderPlan, iter_page_ops
+from form_schema import FORM_KEYS, pdf_sections
+from pdf_generator import get_pdf_filename
+from render_plan import build_render_plan
+from simpro_mapping import extract_prefilled
+
+
+def nested_ops(form_data):
+    """Draw ops through the nested dict the layout index understands"""
+    nested = {**form_data, **pdf_sections(form_data)}
+    return [sorted(iter_page_ops(nested, page)) for page in range(PAGE_COUNT)]
+
+
+def random_form(rng):
+    form = extract_prefilled({'job_id': rng.randint(1, 9999), 'technician_name': 'Bob Builder'})
+    for key in FORM_KEYS:
+        form[key] = rng.choice(['', '', '', 'yes', 'Yes', 'No', 'Residential', f'v{rng.randint(0, 9)}'])
+    return form
+
+
+def test_matches_nested_path():
+    rng = random.Random(7)
+    for _ in range(200):
+        form = random_form(rng)
+        plan = build_render_plan(form)
+        assert [sorted(ops) for ops in plan.pages] == nested_ops(form)
+
+
+def test_meters_fill_consecutive_rows():
+    plan = build_render_plan({'meter_2_i': 'yes', 'meter_2_number': 'M2', 'meter_7_number': 'M7', 'meter_7_tariff': '11'})
+    cells = {op.field: op for op in plan.pages[1] if op.field.startswith('meters.')}
+    assert cells['meters.1.meter_no'].text == 'M2'
+    assert cells['meters.2.meter_no'].text == 'M7'
+    assert cells['meters.2.tariff'].text == 'T11'
+    assert cells['meters.1.type_i'].y == cells['meters.1.meter_no'].y
+
+
+def test_plan_is_render_ready():
+    plan = build_render_plan({'serial_no': '3015', 'install_suburb': 'Sydney'})
+    assert isinstance(pickle.loads(pickle.dumps(plan)), RenderPlan)
+    assert list(iter_page_ops(plan, 0)) == list(plan.pages[0])
+    assert list(iter_page_ops(plan, PAGE_COUNT)) == []
+    assert get_pdf_filename(plan) == 'CCEW_3015.pdf'
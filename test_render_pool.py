@@ -0,0 +1,88 @@
+"""Tests for render_pool.RenderPool back-pressure, timeouts and crash recovery"""
+
+import os
+import time
+
+import pytest
+
+from render_pool import RenderPool, RenderPoolBusy, RenderPoolError, RenderTimeout
+
+
+# Jobs run in spawned worker processes, so they must be importable module functions
+
+def slow_job(delay):
+    time.sleep(delay)
+    return delay
+
+
+def slow_write_job(path, delay):
+    time.sleep(delay)
+    with open(path, 'wb') as f:
+        f.write(b'%PDF-late')
+    return path
+
+
+def crash_job():
+    os._exit(1)
+
+
+@pytest.fixture
+def pool():
+    pool = RenderPool(workers=1, max_queue=0, timeout=10)
+    yield pool
+    pool.shutdown()
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+
+
+def test_full_queue_raises_busy(pool):
+    future = pool.submit(slow_job, 0.5)
+    with pytest.raises(RenderPoolBusy):
+        pool.submit(slow_job, 0)
+    assert pool._wait(future, None) == 0.5
+    # The finished job gave its slot back
+    wait_for(lambda: pool._slots._value == 1)
+    assert pool._wait(pool.submit(slow_job, 0), None) == 0
+
+
+def test_timed_out_job_keeps_its_slot(pool):
+    pool._wait(pool.submit(slow_job, 0), None)     # start the worker
+    future = pool.submit(slow_job, 1)
+    with pytest.raises(RenderTimeout):
+        pool._wait(future, 0.1)
+    # The worker is still rendering, so the slot is not free yet
+    with pytest.raises(RenderPoolBusy):
+        pool.submit(slow_job, 0)
+    wait_for(future.done)
+    wait_for(lambda: pool._slots._value == 1)
+    assert pool._wait(pool.submit(slow_job, 0), None) == 0
+
+
+def test_timed_out_file_is_removed_when_job_finishes(pool, tmp_path):
+    pool._wait(pool.submit(slow_job, 0), None)
+    path = str(tmp_path / 'late.pdf')
+    future = pool.submit(slow_write_job, path, 0.5)
+    with pytest.raises(RenderTimeout):
+        pool._wait_for_file(future, path, 0.1)
+    wait_for(future.done)
+    wait_for(lambda: not os.path.exists(path))
+
+
+def test_crashed_pool_is_reset(pool):
+    with pytest.raises(RenderPoolError) as excinfo:
+        pool._wait(pool.submit(crash_job), None)
+    assert not isinstance(excinfo.value, (RenderPoolBusy, RenderTimeout))
+    assert pool._executor is None
+    # The next job gets a fresh pool
+    assert pool._wait(pool.submit(slow_job, 0), None) == 0
+
+
+def test_in_process_rendering_skips_the_pool():
+    pool = RenderPool(workers=0, max_queue=0)
+    assert pool.render({'serial_no': '1'}).startswith(b'%PDF')
+    assert pool._executor is None
@@ -0,0 +1,120 @@
+"""Tests for session_store.CachedSessionStore over a temporary SQLite store"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from session_store import CachedSessionStore, SQLiteSessionStore
+
+
+class RecordingStore(SQLiteSessionStore):
+    """SQLiteSessionStore that records the blobs each get() reads"""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.reads = []
+
+    def get(self, session_id, fields=()):
+        self.reads.append(tuple(fields))
+        return super().get(session_id, fields)
+
+
+@pytest.fixture
+def backend(tmp_path):
+    backend = RecordingStore(str(tmp_path / 'sessions.db'))
+    backend.init()
+    yield backend
+    backend.pool.close_all()
+
+
+@pytest.fixture
+def cache(backend):
+    return CachedSessionStore(backend, max_entries=2)
+
+
+def save(store, session_id):
+    return store.save(session_id, {'job_id': session_id}, {'serial_no': session_id})
+
+
+def test_saved_session_is_served_from_memory(cache, backend):
+    save(cache, 's1')
+    session = cache.get('s1', ('prefilled_data',))
+    assert session['prefilled_data'] == {'serial_no': 's1'}
+    assert session['status'] == 'pending'
+    assert backend.reads == []
+    assert (cache.hits, cache.misses) == (1, 0)
+
+
+def test_miss_reads_backend_once(cache, backend):
+    save(backend, 's1')
+    assert cache.get('s1', ('prefilled_data',))['prefilled_data'] == {'serial_no': 's1'}
+    assert cache.get('s1', ('prefilled_data',))['prefilled_data'] == {'serial_no': 's1'}
+    assert backend.reads == [('prefilled_data',)]
+    assert cache.stats() == {'entries': 1, 'max_entries': 2, 'hits': 1, 'misses': 1, 'hit_rate': 0.5}
+
+
+def test_unknown_session_is_not_cached(cache, backend):
+    assert cache.get('nope') is None
+    assert cache.get('nope') is None
+    assert cache.misses == 2
+    assert cache.stats()['entries'] == 0
+
+
+def test_partial_entry_fetches_only_missing_blobs(cache, backend):
+    save(cache, 's1')
+    # The cached copy from save() never holds the raw SimPro payload
+    session = cache.get('s1', ('prefilled_data', 'simpro_data'))
+    assert backend.reads == [('simpro_data',)]
+    assert session['simpro_data'] == {'job_id': 's1'}
+    assert session['prefilled_data'] == {'serial_no': 's1'}
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    # Now the entry holds both
+    cache.get('s1', ('simpro_data', 'prefilled_data'))
+    assert len(backend.reads) == 1
+    assert cache.hits == 1
+
+
+def test_update_writes_through_and_refreshes_entry(cache, backend):
+    save(cache, 's1')
+    cache.update('s1', {'nmi': '123'})
+    session = cache.get('s1', ('mobile_data',))
+    assert (session['status'], session['mobile_data']) == ('submitted', {'nmi': '123'})
+    assert backend.reads == []
+    stored = backend.get('s1', ('mobile_data',))
+    assert (stored['status'], stored['mobile_data']) == ('submitted', {'nmi': '123'})
+
+
+def test_update_of_uncached_session_is_not_cached(cache, backend):
+    save(backend, 's1')
+    cache.update('s1', {'nmi': '123'})
+    assert cache.stats()['entries'] == 0
+    assert cache.get('s1', ('mobile_data',))['mobile_data'] == {'nmi': '123'}
+
+
+def test_least_recently_used_entry_is_evicted(cache, backend):
+    for session_id in ('s1', 's2'):
+        save(cache, session_id)
+    cache.get('s1', ('prefilled_data',))    # s2 is now the least recently used
+    save(cache, 's3')
+    assert cache.stats()['entries'] == 2
+    cache.get('s1', ('prefilled_data',))
+    cache.get('s3', ('prefilled_data',))
+    assert backend.reads == []
+    cache.get('s2', ('prefilled_data',))
+    assert backend.reads == [('prefilled_data',)]
+
+
+def test_expire_clears_cache(cache, backend):
+    save(cache, 's1')
+    later = datetime.now() + timedelta(days=365)
+    assert cache.expire(now=later) == 1
+    assert cache.stats()['entries'] == 0
+    assert cache.get('s1') is None
+
+
+def test_duplicate_idempotency_key_is_not_cached(cache, backend):
+    assert cache.save('s1', {}, {'serial_no': '1'}, idempotency_key='job:1')
+    assert not cache.save('s2', {}, {'serial_no': '2'}, idempotency_key='job:1')
+    assert cache.get('s2') is None
+    assert cache.find('job:1') == 's1'
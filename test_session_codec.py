@@ -0,0 +1,103 @@
+"""Tests for session_codec and the migrate_sessions re-encoder"""
+
+import json
+
+import pytest
+
+import session_codec
+from migrate_sessions import migrate, migrate_table
+from session_codec import CODECS, MSGPACK_VERSION, ZLIB_VERSION, check_codec, codec_of, decode, encode
+from session_store import SQLiteSessionStore
+
+VALUE = {'serial_no': '3015', 'customer_first_name': 'Zoë', 'meters': [{'number': 'M1', 'dials': 5}],
+         'load_within_capacity': True, 'notes': None}
+
+
+def available(codec):
+    try:
+        check_codec(codec)
+    except ValueError:
+        return pytest.param(codec, marks=pytest.mark.skip(reason=f'{codec} package not installed'))
+    return codec
+
+
+@pytest.mark.parametrize('codec', [available(codec) for codec in CODECS])
+def test_round_trip(codec):
+    stored = encode(VALUE, codec)
+    assert codec_of(stored) == codec
+    assert decode(stored) == VALUE
+
+
+def test_version_byte_selects_decoder():
+    assert isinstance(encode(VALUE, 'json'), str)
+    stored = encode(VALUE, 'zlib')
+    assert stored[0] == ZLIB_VERSION
+    assert decode(stored) == VALUE
+    with pytest.raises(ValueError, match='version 9'):
+        decode(bytes([9]) + stored[1:])
+
+
+def test_msgpack_rows_need_msgpack(monkeypatch):
+    monkeypatch.setattr(session_codec, 'msgpack', None)
+    with pytest.raises(ValueError, match='msgpack'):
+        decode(bytes([MSGPACK_VERSION, 0x80]))
+    with pytest.raises(ValueError, match='msgpack'):
+        check_codec('msgpack')
+
+
+def test_legacy_json_rows_decode():
+    text = json.dumps(VALUE)
+    # Rows written before the codecs, as TEXT or as bytes, all carry no version byte
+    assert decode(text) == VALUE
+    assert decode(text.encode('utf-8')) == VALUE
+    assert decode(b'[1, 2]') == [1, 2]
+    assert codec_of(text) == codec_of(text.encode('utf-8')) == 'json'
+    assert decode(None) is None
+
+
+def test_unknown_codec_is_rejected():
+    with pytest.raises(ValueError, match='Unknown session codec'):
+        check_codec('bson')
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SQLiteSessionStore(str(tmp_path / 'sessions.db'), codec='json')
+    store.init()
+    yield store
+    store.pool.close_all()
+
+
+def test_migrate_table_rewrites_only_other_codecs(store):
+    for i in range(5):
+        store.save(f's{i}', {'job_id': i}, {'serial_no': str(i)})
+    db = store.connection()
+    # s1 is already zlib, s2 half converted and s3 has a NULL column
+    db.execute('UPDATE sessions SET simpro_data = ?, prefilled_data = ?, mobile_data = ? WHERE session_id = ?',
+               (encode({}, 'zlib'), encode({'serial_no': '1'}, 'zlib'), encode({}, 'zlib'), 's1'))
+    db.execute("UPDATE sessions SET mobile_data = ? WHERE session_id = 's2'", (encode({}, 'zlib'),))
+    db.execute("UPDATE sessions SET mobile_data = NULL WHERE session_id = 's3'")
+    db.commit()
+
+    columns = ('simpro_data', 'prefilled_data', 'mobile_data')
+    assert migrate_table(db, 'sessions', columns, 'zlib', batch_size=2) == (5, 4)
+    for row in db.execute('SELECT * FROM sessions'):
+        assert {codec_of(row[c]) for c in columns if row[c] is not None} == {'zlib'}
+    assert db.execute("SELECT mobile_data FROM sessions WHERE session_id = 's3'").fetchone()[0] is None
+    assert store.get('s4', ('prefilled_data', 'simpro_data'))['prefilled_data'] == {'serial_no': '4'}
+
+    # A rerun finds nothing left to do
+    assert migrate_table(db, 'sessions', columns, 'zlib', batch_size=2) == (5, 0)
+
+
+def test_migrate_covers_every_table_and_can_go_back(store):
+    store.save('s1', {'job_id': 1}, {'serial_no': '1'})
+    store.update('s1', {'nmi': '123'})
+    assert migrate(store, 'zlib') == {'sessions': (1, 1), 'session_payloads': (1, 1)}
+    assert migrate(store, 'zlib') == {'sessions': (1, 0), 'session_payloads': (1, 0)}
+    assert migrate(store, 'json') == {'sessions': (1, 1), 'session_payloads': (1, 1)}
+    session = store.get('s1', ('simpro_data', 'prefilled_data', 'mobile_data'))
+    assert (session['simpro_data'], session['prefilled_data'], session['mobile_data']) == \
+        ({'job_id': 1}, {'serial_no': '1'}, {'nmi': '123'})
+    raw = store.connection().execute('SELECT prefilled_data FROM sessions').fetchone()[0]
+    assert isinstance(raw, str)
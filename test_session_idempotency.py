@@ -0,0 +1,72 @@
+"""Tests for idempotent session saves in session_store.SQLiteSessionStore"""
+
+import threading
+
+import pytest
+
+from session_store import SQLiteSessionStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SQLiteSessionStore(str(tmp_path / 'sessions.db'))
+    store.init()
+    yield store
+    store.pool.close_all()
+
+
+def count(store, table):
+    return store.connection().execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+
+
+def test_repeated_key_returns_existing_session(store):
+    assert store.save('s1', {'job_id': 1}, {'serial_no': '1'}, idempotency_key='job:1') is True
+    assert store.save('s2', {'job_id': 1}, {'serial_no': 'retry'}, idempotency_key='job:1') is False
+    assert store.find('job:1') == 's1'
+    # The losing insert wrote nothing, not even its cold payload
+    assert store.get('s2') is None
+    assert store.get('s1')['prefilled_data'] == {'serial_no': '1'}
+    assert (count(store, 'sessions'), count(store, 'session_payloads')) == (1, 1)
+
+
+def test_sessions_without_key_are_never_deduplicated(store):
+    assert store.save('s1', {}, {}) is True
+    assert store.save('s2', {}, {}) is True
+    assert store.find(None) is None
+    assert count(store, 'sessions') == 2
+
+
+def test_save_many_skips_taken_keys(store):
+    store.save('s0', {}, {}, idempotency_key='job:0')
+    saved = store.save_many([
+        ('s1', {'job_id': 0}, {}, 'job:0'),     # taken by an earlier call
+        ('s2', {'job_id': 2}, {}, 'job:2'),
+        ('s3', {'job_id': 2}, {}, 'job:2'),     # repeated within the batch
+        ('s4', {'job_id': 4}, {}, None),
+    ])
+    assert saved == {'s2', 's4'}
+    assert store.find('job:0') == 's0'
+    assert store.find('job:2') == 's2'
+    assert store.get('s2', ('simpro_data',))['simpro_data'] == {'job_id': 2}
+    assert (count(store, 'sessions'), count(store, 'session_payloads')) == (3, 3)
+
+
+def test_concurrent_saves_keep_one_session(store):
+    # Each thread saves on its own pooled connection; exactly one insert wins
+    barrier = threading.Barrier(4)
+    results = {}
+
+    def save(session_id):
+        barrier.wait()
+        results[session_id] = store.save(session_id, {}, {}, idempotency_key='key:retry')
+
+    threads = [threading.Thread(target=save, args=(f's{i}',)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    winners = [session_id for session_id, saved in results.items() if saved]
+    assert len(winners) == 1
+    assert store.find('key:retry') == winners[0]
+    assert count(store, 'sessions') == 1
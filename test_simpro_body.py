@@ -0,0 +1,39 @@
+"""Tests for simpro_body.parse_body"""
+
+import json
+
+import pytest
+
+import simpro_body
+from simpro_body import parse_body
+
+JOB = {'job_id': 3015, 'site_name': 'Test "Building"', 'notes': 'line 1\nline 2 \\ end',
+       'custom_fields_array': [{'CustomField': {'Name': 'Install Suburb'}, 'Value': 'Sydney'}]}
+
+
+def test_plain_json():
+    assert parse_body(json.dumps(JOB).encode('utf-8')) == JOB
+
+
+def test_double_encoded():
+    assert parse_body(json.dumps(json.dumps(JOB))) == JOB
+    assert parse_body(b'  ' + json.dumps(json.dumps(JOB)).encode('utf-8') + b'\n') == JOB
+
+
+def test_legacy_unescape_fallback():
+    # Raw newline inside the outer string: not valid JSON, but the old unescape coped
+    body = '"{\\"job_id\\": 1,\n \\"site_name\\": \\"A\\"}"'
+    assert parse_body(body) == {'job_id': 1, 'site_name': 'A'}
+
+
+def test_json_module_fallback(monkeypatch):
+    # orjson rejects NaN; the json module accepts it
+    assert parse_body(b'{"reading": NaN}')['reading'] != 0
+    monkeypatch.setattr(simpro_body, 'orjson', None)
+    assert parse_body(json.dumps(JOB)) == JOB
+
+
+@pytest.mark.parametrize('body', [b'', b'{"job_id": ', b'"not json"', b'"', b'\xff'])
+def test_invalid(body):
+    with pytest.raises(ValueError):
+        parse_body(body)
@@ -0,0 +1,60 @@
+"""Tests for simpro_fields.custom_field_values"""
+
+from benchmark_custom_fields import legacy_get_custom_field, legacy_normalize, wide_payload
+from simpro_fields import custom_field_values
+
+
+def test_nested_custom_field_shape():
+    raw = [{'CustomField': {'ID': 1, 'Name': 'Install Suburb'}, 'Value': 'Sydney'}]
+    assert custom_field_values(raw) == {'Install Suburb': 'Sydney'}
+
+
+def test_flat_name_value_shape():
+    raw = [{'Name': 'Install Suburb', 'Value': 'Sydney'}, {'Name': 'Install Postcode'}]
+    assert custom_field_values(raw) == {'Install Suburb': 'Sydney', 'Install Postcode': ''}
+
+
+def test_mixed_shapes_and_junk():
+    raw = [
+        {'CustomField': {'Name': 'A'}, 'Value': '1'},
+        {'Name': 'B', 'Value': '2'},
+        {'CustomField': {'Name': 'C'}},  # no Value: neither shape
+        'not a field',
+        None,
+    ]
+    assert custom_field_values(raw) == {'A': '1', 'B': '2'}
+
+
+def test_dict_format():
+    raw = {
+        'CustomField1': {'Name': 'A', 'Value': '1'},
+        'CustomField2': {'CustomField': {'Name': 'B'}, 'Value': '2'},
+        'Other': 'ignored',
+    }
+    assert custom_field_values(raw) == {'A': '1', 'B': '2'}
+
+
+def test_first_duplicate_wins():
+    raw = [{'Name': 'A', 'Value': 'first'}, {'Name': 'A', 'Value': 'second'}]
+    assert custom_field_values(raw) == {'A': 'first'}
+
+
+def test_missing_or_invalid_input():
+    assert custom_field_values(None) == {}
+    assert custom_field_values('') == {}
+    assert custom_field_values([]) == {}
+
+
+def test_wide_payload_matches_legacy_lookup():
+    raw = wide_payload(2000) + [{'Name': 'Field 5', 'Value': 'duplicate'}, {'Name': 'Flat', 'Value': 'x'}]
+    values = custom_field_values(raw)
+    assert len(values) == 2001
+    for name in ['Field 0', 'Field 5', 'Field 1999', 'Flat', 'Missing']:
+        assert values.get(name, '') == legacy_get_custom_field(legacy_normalize(raw), name)
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"ok  {name}")
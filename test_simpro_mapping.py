@@ -0,0 +1,55 @@
+"""Tests for the SimPro -> prefilled_data mapping in simpro_mapping"""
+
+import pytest
+
+from simpro_mapping import (
+    COMPANY_DATA, Mapping, compile_mapping, extract_prefilled, missing_mandatory_fields,
+    validate_simpro_payload,
+)
+
+JOB = {
+    'job_id': 3015,
+    'site_name': 'Test Building',
+    'technician_name': 'Bob Van Builder',
+    'custom_fields_array': [
+        {'CustomField': {'Name': 'Install Suburb'}, 'Value': 'Sydney'},
+        {'Name': 'Tech Licence Number', 'Value': 'L123456'},
+    ],
+}
+
+
+def test_extracts_sources_custom_fields_and_constants():
+    prefilled = extract_prefilled(JOB)
+    assert prefilled['serial_no'] == '3015'
+    assert prefilled['property_name'] == 'Test Building'
+    assert prefilled['install_suburb'] == 'Sydney'
+    assert prefilled['install_postcode'] == ''
+    assert prefilled['installer_first_name'] == 'Bob'
+    assert prefilled['tester_last_name'] == 'Van Builder'
+    assert prefilled['signature'] == 'Bob Van Builder'
+    assert prefilled['installer_license_no'] == prefilled['tester_license_no'] == 'L123456'
+    assert prefilled['tester_street_name'] == COMPANY_DATA['street_name']
+    assert prefilled['installer_office_phone'] == COMPANY_DATA['office_phone']
+    assert 'tester_office_phone' not in prefilled
+
+
+def test_reports_missing_mandatory_fields():
+    prefilled, missing = validate_simpro_payload(JOB)
+    assert "install_postcode (from custom field 'Install Postcode')" in missing
+    assert not any(entry.startswith(('install_suburb ', 'installer_license_no ')) for entry in missing)
+    assert missing == missing_mandatory_fields(prefilled)
+
+
+def test_custom_spec_with_paths_and_required():
+    extract, required = compile_mapping([
+        Mapping('site_suburb', source='site.address.suburb', required=True),
+        Mapping('state', value='nsw', transform=str.upper),
+    ])
+    assert extract({'site': {'address': {'suburb': 'Leppington'}}}) == {'state': 'NSW', 'site_suburb': 'Leppington'}
+    assert extract({'site': 'unknown'}) == {'state': 'NSW', 'site_suburb': ''}
+    assert missing_mandatory_fields({'state': 'NSW'}, required) == ["site_suburb (from 'site.address.suburb')"]
+
+
+def test_rejects_ambiguous_mapping():
+    with pytest.raises(ValueError):
+        compile_mapping([Mapping('x', source='a', value='b')])
@@ -0,0 +1,103 @@
+"""Tests for pdf_generator.TemplateCache"""
+
+import io
+import os
+
+import pytest
+from pypdf import PdfReader, PdfWriter
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+from pdf_generator import TemplateCache
+
+
+def one_page_pdf(words):
+    packet = io.BytesIO()
+    can = canvas.Canvas(packet, pagesize=A4)
+    can.drawString(100, 700, words)
+    can.save()
+    return packet.getvalue()
+
+
+def write_template(path, words, mtime_ns=None):
+    with open(path, 'wb') as f:
+        f.write(one_page_pdf(words))
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def text(page):
+    return page.extract_text().strip()
+
+
+def page_text(cache, path):
+    return text(cache.get_reader(path).pages[0])
+
+
+@pytest.fixture
+def template(tmp_path):
+    path = str(tmp_path / 'template.pdf')
+    write_template(path, 'FIRST', mtime_ns=1_000_000_000_000_000_000)
+    return path
+
+
+def test_template_is_parsed_once(template):
+    cache = TemplateCache()
+    assert page_text(cache, template) == 'FIRST'
+    assert cache.page_count(template) == 1
+    assert cache.has_fields(template) is False
+    assert cache.parses == 1
+
+
+def test_rewritten_template_is_reparsed(template):
+    cache = TemplateCache()
+    cache.get_reader(template)
+    write_template(template, 'SECOND VERSION', mtime_ns=1_000_000_001_000_000_000)
+    assert page_text(cache, template) == 'SECOND VERSION'
+    assert cache.parses == 2
+
+
+def test_same_size_rewrite_is_caught_by_hash(template):
+    cache = TemplateCache()
+    size = os.path.getsize(template)
+    cache.get_reader(template)
+    # Same length text, so only the SHA-256 tells the versions apart
+    write_template(template, 'OTHER', mtime_ns=1_000_000_001_000_000_000)
+    assert os.path.getsize(template) == size
+    assert page_text(cache, template) == 'OTHER'
+    assert cache.parses == 2
+
+
+def test_touched_template_is_not_reparsed(template):
+    cache = TemplateCache()
+    cache.get_reader(template)
+    # New mtime, same bytes: the hash matches and the parsed template is kept
+    os.utime(template, ns=(1_000_000_002_000_000_000,) * 2)
+    assert page_text(cache, template) == 'FIRST'
+    assert cache.get_reader(template) is cache.get_reader(template)
+    assert cache.parses == 1
+
+
+def test_unchanged_mtime_and_size_is_served_from_cache(template):
+    cache = TemplateCache()
+    cache.get_reader(template)
+    stat = os.stat(template)
+    write_template(template, 'OTHER', mtime_ns=stat.st_mtime_ns)
+    # Nothing in the stat changed, so the file is not even hashed
+    assert page_text(cache, template) == 'FIRST'
+    assert cache.parses == 1
+
+
+def test_copies_are_independent_of_each_other_and_the_cache(template):
+    cache = TemplateCache()
+    first, second = PdfWriter(), PdfWriter()
+    first_page = cache.copy_pages(first, template)[0]
+    second_page = cache.copy_pages(second, template)[0]
+    first_page.merge_page(PdfReader(io.BytesIO(one_page_pdf('OVERLAY'))).pages[0])
+
+    assert 'OVERLAY' in text(first_page)
+    assert text(second_page) == 'FIRST'
+    assert page_text(cache, template) == 'FIRST'
+    # A third request still clones the clean template
+    third = PdfWriter()
+    assert text(cache.copy_pages(third, template)[0]) == 'FIRST'
@@ -0,0 +1,82 @@
+"""
+Shared keep-alive HTTP client for the Make.com webhook
+
+One requests.Session with a bounded urllib3 pool per process, so consecutive
+webhook calls reuse an open TCP+TLS connection instead of handshaking each
+time. Connect and read timeouts are set separately: a dead host fails fast,
+a slow scenario still gets its read budget.
+
+Configuration (environment):
+    CCEW_WEBHOOK_POOL_SIZE        connections kept open per host (default: 4)
+    CCEW_WEBHOOK_CONNECT_TIMEOUT  seconds to establish a connection (default: 3.05)
+    CCEW_WEBHOOK_READ_TIMEOUT     seconds to wait for the response (default: 10)
+"""
+
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class WebhookClient:
+    """Pooled requests.Session with connection reuse counters"""
+
+    def __init__(self, pool_size=None, connect_timeout=None, read_timeout=None):
+        if pool_size is None:
+            pool_size = int(os.environ.get('CCEW_WEBHOOK_POOL_SIZE', 4))
+        if connect_timeout is None:
+            connect_timeout = float(os.environ.get('CCEW_WEBHOOK_CONNECT_TIMEOUT', 3.05))
+        if read_timeout is None:
+            read_timeout = float(os.environ.get('CCEW_WEBHOOK_READ_TIMEOUT', 10))
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self._session = None
+        self._lock = threading.Lock()
+
+    def _get_session(self):
+        with self._lock:
+            if self._session is None:
+                session = requests.Session()
+                # No transparent retries: a POST to the webhook is not idempotent
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size,
+                                      max_retries=0, pool_block=False)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self._session = session
+            return self._session
+
+    def post(self, url, **kwargs):
+        """POST through the shared session, with the split default timeout"""
+        kwargs.setdefault('timeout', self.timeout)
+        return self._get_session().post(url, **kwargs)
+
+    def stats(self):
+        """
+        Connection reuse counters summed over the open pools
+
+        requests is the number of requests sent, connections the number of new
+        connections opened for them; reuse_rate is the share of requests that
+        went over an already open connection.
+        """
+        requests_sent = connections = 0
+        session = self._session
+        if session is not None:
+            for adapter in set(session.adapters.values()):
+                for key in list(adapter.poolmanager.pools.keys()):
+                    pool = adapter.poolmanager.pools.get(key)
+                    if pool is not None:
+                        requests_sent += pool.num_requests
+                        connections += pool.num_connections
+        reuse_rate = 1 - connections / requests_sent if requests_sent else 0.0
+        return {'requests': requests_sent, 'connections': connections, 'reuse_rate': round(reuse_rate, 3)}
+
+    def close(self):
+        """Close all pooled connections"""
+        with self._lock:
+            session, self._session = self._session, None
+        if session is not None:
+            session.close()
+
+
+webhook_client = WebhookClient()